@@ -0,0 +1,190 @@
+"""
+   Benchmarks for workflowTracker, run on synthetic data so that no network or checkout is needed
+
+   render: time and peak memory of rendering HTML page (full and lite) for a synthetic table. If json2html and
+           BeautifulSoup are installed, the old json2html + prettify rendering is measured as well
+   pipeline: generate a synthetic analysis-config, start a local stand-in for Github and run stages B-G of
+             workflow_tracker.py one by one, reporting time, throughput and peak memory of each stage
+"""
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import gsiBenchmark
+import gsiOlive
+import gsiRepository as rP
+import htmlRenderer
+import workflow_tracker
+from gsiBenchmark.mock_github import MockGithub
+
+ORGANIZATION = "benchmark"
+
+
+"""
+   Old rendering: json2html builds the table, the page is re-parsed with BeautifulSoup to prettify it
+"""
+def legacy_render(vetted_data: dict, path: str):
+    from json2html import json2html
+    from bs4 import BeautifulSoup as Bs
+    rewrapped = []
+    for wf in vetted_data.keys():
+        row = htmlRenderer._rewrap(wf, vetted_data[wf])
+        row[4] = f'<a href=\"{row[4]}\">{row[4]}</a>' if row[4].strip() else " "
+        rewrapped.append(dict(zip(htmlRenderer.COLUMNS, row)))
+    table = json2html.convert(json=rewrapped, table_attributes="id=\"info-table\" class=\"styled-table\"", escape=False)
+    page = htmlRenderer.PAGE_HEAD + table + "<div><h3>Updated on" + htmlRenderer.today_date() + "</h3></div></body></html>"
+    with open(path, "w") as op:
+        op.write(Bs(page, "html.parser").prettify())
+
+
+def bench_render(n_workflows: int):
+    vetted_data = gsiBenchmark.synthetic_vetted_data(n_workflows)
+    renderers = [("streaming", lambda p: htmlRenderer.render2file(vetted_data, p)),
+                 ("streaming, pretty", lambda p: htmlRenderer.render2file(vetted_data, p, True)),
+                 ("lite page + sidecar", lambda p: htmlRenderer.render_lite(vetted_data, p))]
+    try:
+        import json2html, bs4
+        renderers.append(("json2html + prettify", lambda p: legacy_render(vetted_data, p)))
+    except ImportError:
+        print("INFO: json2html or bs4 is not installed, skipping the old renderer")
+    print(f'Rendering {n_workflows} workflows')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, render in renderers:
+            page = os.path.join(tmp_dir, "page.html")
+            _, elapsed, peak = gsiBenchmark.measure(render, page)
+            page_size = os.path.getsize(page)
+            if os.path.isfile(htmlRenderer.lite.sidecar_path(page)):
+                page_size += os.path.getsize(htmlRenderer.lite.sidecar_path(page))
+                os.remove(htmlRenderer.lite.sidecar_path(page))
+            print(f'{name:>22}: {elapsed:8.3f} s, peak memory {peak / 1024 / 1024:8.2f} MB, '
+                  f'page {page_size / 1024 / 1024:.2f} MB')
+
+
+"""
+   Run stages B-G of workflow_tracker.py once, return a list of (stage, seconds, items, peak bytes)
+"""
+def run_pipeline(settings: dict, out_dir: str, verbose: bool = False) -> list:
+    stages = []
+    repo_dir = settings['repo']['local_olive_dir']
+    instances = list(settings['instances'].values())
+    use_cache = 'cache' in settings.keys()
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        wf_names, elapsed, peak = gsiBenchmark.measure(workflow_tracker.load_workflow_names, repo_dir, instances)
+        stages.append(("B workflow names", elapsed, sum(len(n) for n in wf_names.values()), peak))
+
+        def olive_stage():
+            parse_cache = gsiOlive.OliveParseCache(os.path.join(settings['cache']['dir'], "olive_parse_cache.json")) \
+                if use_cache else None
+            olive_data = workflow_tracker.load_olive_data(repo_dir, instances, parse_cache)
+            if parse_cache is not None:
+                parse_cache.save()
+            return olive_data, gsiOlive.match_olives(olive_data, wf_names)
+        (olive_data, olive_info), elapsed, peak = gsiBenchmark.measure(olive_stage)
+        stages.append(("C olives", elapsed, sum(len(o) for o in olive_data.values() if o), peak))
+
+        def repo_list_stage():
+            response_cache = rP.ResponseCache(settings['cache']['dir'], 200 * 1024 * 1024) if use_cache else None
+            handler = workflow_tracker.get_repo_handler(settings['repo'], response_cache)
+            return handler, handler.get_repo_list()
+        (handler, repo_list), elapsed, peak = gsiBenchmark.measure(repo_list_stage)
+        stages.append(("D repository list", elapsed, len(repo_list), peak))
+
+        discovery = rP.DiscoveryIndex(os.path.join(settings['cache']['dir'], "discovery_index.json")) \
+            if use_cache else None
+        (repo_info, _), elapsed, peak = gsiBenchmark.measure(workflow_tracker.collect_repos, handler, repo_list,
+                                                             olive_info, settings['collection']['workers'], None,
+                                                             discovery)
+        stages.append(("E repositories", elapsed, len(repo_list), peak))
+        if discovery is not None:
+            discovery.save(repo_list.keys())
+        handler.tag_index.save()
+
+        (vetted_data, _), elapsed, peak = gsiBenchmark.measure(workflow_tracker.join_all, olive_info, repo_info)
+        stages.append(("F join", elapsed, len(vetted_data), peak))
+
+        def output_stage():
+            vetted_od = dict(sorted(vetted_data.items()))
+            with open(os.path.join(out_dir, "gsi_workflows.json"), "w") as wfj:
+                json.dump(vetted_od, wfj)
+            htmlRenderer.render2file(vetted_od, os.path.join(out_dir, "gsi_workflows.html"))
+        _, elapsed, peak = gsiBenchmark.measure(output_stage)
+        stages.append(("G output", elapsed, len(vetted_data), peak))
+        if handler.cache is not None:
+            handler.cache.prune()
+    return stages
+
+
+def bench_pipeline(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo_dir = os.path.join(tmp_dir, "analysis-config")
+        workflows = gsiBenchmark.generate_analysis_config(repo_dir, args.workflows, args.olives)
+        mock = MockGithub(ORGANIZATION, workflows, args.latency, args.rate_limit,
+                          reset_window=args.reset_window).start()
+        settings = {'repo': {'local_olive_dir': repo_dir, 'organization': ORGANIZATION, 'token': "benchmark",
+                             'api_url': mock.url, 'backend': args.backend, 'collector': args.collector,
+                             'timeout': 30, 'max_rate': args.max_rate, 'max_wait': 0},
+                    'collection': {'workers': args.workers, 'olive_workers': args.olive_workers},
+                    'instances': {'instance_a': "research", 'instance_b': "clinical"},
+                    'prefixes': {'call_prefix_a': "call_ready"},
+                    'aliases': {}}
+        if args.cache:
+            settings['cache'] = {'dir': os.path.join(tmp_dir, "cache"), 'max_mb': 200}
+        workflow_tracker.settings = settings
+        print(f'{args.workflows} workflows, {args.olives} olives per workflow and instance, latency {args.latency} s, '
+              f'rate limit {args.rate_limit}, {args.collector} collector, workers {args.workers}, olive workers {args.olive_workers}')
+        results = []
+        try:
+            for run in range(1, args.repeat + 1):
+                requests, limited = mock.requests, mock.limited
+                stages = run_pipeline(settings, tmp_dir, args.verbose)
+                print(f'Run {run}')
+                for stage, elapsed, items, peak in stages:
+                    print(f'  {stage:<18} {elapsed:8.3f} s {items:8d} items {items / elapsed if elapsed > 0 else 0:10.1f}/s'
+                          f'  peak memory {peak / 1024 / 1024:8.2f} MB')
+                print(f'  {"total":<18} {sum(s[1] for s in stages):8.3f} s, {mock.requests - requests} requests '
+                      f'({mock.limited - limited} rate limited)')
+                results.append({'run': run, 'requests': mock.requests - requests,
+                                'stages': [{'stage': s, 'seconds': e, 'items': i, 'peak_bytes': p}
+                                           for s, e, i, p in stages]})
+        finally:
+            mock.stop()
+    if args.output:
+        with open(args.output, "w") as rf:
+            json.dump({'parameters': {k: v for k, v in vars(args).items() if k not in ('benchmark', 'output')},
+                       'runs': results}, rf, indent=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run workflowTracker benchmarks on synthetic data')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    render_parser = subparsers.add_parser('render', help='Render HTML page for a synthetic table')
+    render_parser.add_argument('-n', '--workflows', help='Number of workflows', type=int, default=5000)
+    pipeline_parser = subparsers.add_parser('pipeline', help='Run stages B-G against synthetic data and mock Github')
+    pipeline_parser.add_argument('-n', '--workflows', help='Number of workflows (and repositories)', type=int,
+                                 default=200)
+    pipeline_parser.add_argument('--olives', help='Olives per workflow and instance', type=int, default=2)
+    pipeline_parser.add_argument('--latency', help='Latency of every mock Github response, seconds', type=float,
+                                 default=0.0)
+    pipeline_parser.add_argument('--rate-limit', help='Number of requests mock Github allows', type=int, default=None)
+    pipeline_parser.add_argument('--reset-window', help='Seconds until the rate limit of mock Github resets',
+                                 type=int, default=3600)
+    pipeline_parser.add_argument('--collector', help='Collector, rest or graphql', choices=['rest', 'graphql'],
+                                 default="rest")
+    pipeline_parser.add_argument('--workers', help='Workers collecting repositories', type=int, default=8)
+    pipeline_parser.add_argument('--max-rate', help='Requests per second and token sent to Github (0 is no pacing)',
+                                 type=float, default=0)
+    pipeline_parser.add_argument('--olive-workers', help='Processes parsing olives', type=int, default=1)
+    pipeline_parser.add_argument('--backend', help='Transport, http or curl', choices=['http', 'curl'], default="http")
+    pipeline_parser.add_argument('--cache', help='Use response and parse caches (they persist between repeats)',
+                                 action='store_true')
+    pipeline_parser.add_argument('--repeat', help='Number of runs', type=int, default=1)
+    pipeline_parser.add_argument('-o', '--output', help='Write results into a json file', default=None)
+    pipeline_parser.add_argument('-v', '--verbose', help='Show output of the stages', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark == 'render':
+        bench_render(args.workflows)
+    elif args.benchmark == 'pipeline':
+        bench_pipeline(args)
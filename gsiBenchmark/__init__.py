@@ -0,0 +1,92 @@
+"""
+   Functions for benchmarking parts of workflowTracker on synthetic data
+"""
+import json
+import os
+import random
+import time
+import tracemalloc
+from git import Git
+
+
+"""
+   Generate synthetic data in the format of gsi_workflows.json with n workflows
+"""
+def synthetic_vetted_data(n_workflows: int, seed: int = 42) -> dict:
+    rnd = random.Random(seed)
+    vetted_data = {}
+    for i in range(n_workflows):
+        wf = f'workflow{i:05d}'
+        entry = {'latest_tag': f'{rnd.randint(1, 5)}.{rnd.randint(0, 9)}.{rnd.randint(0, 9)}',
+                 'url': f'https://github.com/oicr-gsi/{wf}',
+                 'data_modules': sorted({f'hg38-{wf}-index/{rnd.randint(1, 9)}' for _ in range(rnd.randint(1, 4))}),
+                 'code_modules': sorted({f'tool{rnd.randint(0, 200)}/{rnd.randint(1, 9)}.{rnd.randint(0, 9)}'
+                                         for _ in range(rnd.randint(1, 8))})}
+        for inst in ("research", "clinical"):
+            if rnd.random() < 0.8:
+                entry[inst] = {'olives': sorted({f'vidarr-{wf}-<{inst}>&{k}.shesmu' for k in range(rnd.randint(1, 30))}),
+                               'tags': sorted({f'{rnd.randint(1, 5)}.{rnd.randint(0, 9)}.0' for _ in range(rnd.randint(1, 6))})}
+        vetted_data[wf] = entry
+    return dict(sorted(vetted_data.items()))
+
+
+"""
+   Run function, return its result, wall time in seconds and peak memory allocated by Python (in bytes)
+"""
+def measure(func, *args, **kwargs) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+"""
+   Names of synthetic workflows, their repos and olives use these
+"""
+def synthetic_workflow_names(n_workflows: int) -> list:
+    return [f'wf{i:05d}' for i in range(n_workflows)]
+
+
+"""
+   Generate a synthetic analysis-config tree with .vidarrworkflow files and .shesmu olives for each instance
+   and commit it into a new git repository. Each olive runs its workflow (with a prefix, as real olives do)
+   and one more workflow, and sets modules in a With block. Returns the list of workflow names
+"""
+def generate_analysis_config(root: str, n_workflows: int, olives_per_workflow: int = 2,
+                             instances: tuple = ("research", "clinical"), seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    workflows = synthetic_workflow_names(n_workflows)
+    for inst in instances:
+        wf_dir = os.path.join(root, "vidarr", inst, "workflows")
+        olive_dir = os.path.join(root, "shesmu", inst)
+        os.makedirs(wf_dir, exist_ok=True)
+        os.makedirs(olive_dir, exist_ok=True)
+        for i, wf in enumerate(workflows):
+            with open(os.path.join(wf_dir, f'{wf}_call_ready.vidarrworkflow'), "w") as wff:
+                wff.write(json.dumps({'language': "WDL_1_0", 'outputs': {}, 'parameters': {}}))
+            for k in range(olives_per_workflow):
+                other = workflows[rnd.randrange(n_workflows)]
+                lines = ["Version 1;", "Input cerberus_fp;", "", "Olive", "  Where workflow_run_accession != \"\""]
+                for j in range(rnd.randint(1, 3)):
+                    lines.append(f'  Run {wf}_call_ready_v{rnd.randint(1, 4)}_{rnd.randint(0, 9)}_{j}')
+                    lines.append("  With {")
+                    lines.append(f'    modules = "{wf.lower()}/{rnd.randint(0, 3)}.{rnd.randint(0, 9)} '
+                                 f'samtools/1.{rnd.randint(9, 16)} hg38-{wf.lower()}-index/{rnd.randint(1, 3)}",')
+                    lines.append(f'    reference = "hg38"')
+                    lines.append("  }")
+                lines.append(f'  Run {other}_v{rnd.randint(1, 4)}_{rnd.randint(0, 9)}_0')
+                lines.append("  With { memory = 16 };")
+                with open(os.path.join(olive_dir, f'vidarr-{wf}-{k}.shesmu'), "w") as of:
+                    of.write("\n".join(lines) + "\n")
+    g = Git(root)
+    g.init("-q")
+    g.add("-A")
+    g.commit("-q", "-m", "Synthetic analysis-config",
+             env={"GIT_AUTHOR_NAME": "benchmark", "GIT_AUTHOR_EMAIL": "benchmark@localhost",
+                  "GIT_COMMITTER_NAME": "benchmark", "GIT_COMMITTER_EMAIL": "benchmark@localhost"})
+    return workflows
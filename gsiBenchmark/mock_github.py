@@ -0,0 +1,174 @@
+"""
+   Local stand-in for the Github endpoints githubRepo and graphqlRepo call: list of organization repositories,
+   file contents and tags (REST), pages of repositories and batches of files (the two queries of graphqlRepo,
+   POST /graphql). Every workflow gets a repository with vidarrbuild.json and a wdl file with modules. Latency
+   is added to every response, the rate limit is enforced the way Github does it (X-RateLimit-* headers, 403
+   when exhausted, conditional requests answered with 304 are free, the budget is restored when the window
+   resets). REST and GraphQL requests share one budget, a GraphQL query costs one request
+"""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockGithub:
+    def __init__(self, organization: str, workflows: list, latency: float = 0.0, rate_limit: int | None = None,
+                 seed: int = 42, reset_window: int = 3600):
+        self.organization = organization
+        self.workflows = workflows
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_window = reset_window
+        self.reset_at = int(time.time()) + reset_window
+        self.requests = 0
+        self.not_modified = 0
+        self.limited = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.server = None
+        rnd = random.Random(seed)
+        self.tags = {wf: sorted({f'{rnd.randint(0, 4)}.{rnd.randint(0, 9)}.{rnd.randint(0, 9)}'
+                                 for _ in range(rnd.randint(1, 12))}) for wf in workflows}
+        self.modules = {wf: f'samtools/1.{rnd.randint(9, 16)} {wf}/{rnd.randint(0, 3)}.0 '
+                            f'hg38-{wf}-index/{rnd.randint(1, 3)}' for wf in workflows}
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    """ Return content of a file in a repository, None if there is no such file """
+    def content(self, repo: str, file: str) -> str | None:
+        if file == "vidarrbuild.json":
+            return json.dumps({'names': [f'{repo}_call_ready'], 'wdl': f'{repo}.wdl'})
+        if file == f'{repo}.wdl':
+            return f'version 1.0\n\ntask run{repo} {{\n  input {{\n' \
+                   f'    String modules = "{self.modules[repo]}"\n  }}\n}}\n'
+        return None
+
+    """ Return (status, json body) for a path, None for unknown endpoints """
+    def respond(self, path: str, query: dict) -> tuple:
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "orgs" and parts[2] == "repos":
+            page, per_page = int(query.get('page', 1)), int(query.get('per_page', 30))
+            names = self.workflows[(page - 1) * per_page:page * per_page]
+            return 200, [{'name': wf, 'html_url': f'https://github.com/{self.organization}/{wf}',
+                          'pushed_at': "2024-01-01T00:00:00Z"} for wf in names]
+        if len(parts) < 4 or parts[0] != "repos" or parts[2] not in self.tags.keys():
+            return 404, {'message': "Not Found"}
+        repo = parts[2]
+        if parts[3] == "tags":
+            return 200, [{'name': t} for t in self.tags[repo]]
+        if parts[3] == "contents":
+            file = "/".join(parts[4:])
+            content = self.content(repo, file)
+            if content is None:
+                return 404, {'message': "Not Found"}
+            return 200, {'name': file, 'encoding': "base64", 'content': base64.b64encode(content.encode()).decode()}
+        return 404, {'message': "Not Found"}
+
+    """ Return the json body for a GraphQL query of graphqlRepo, told apart by its variables: a page of
+        repositories ($org, $first, $after) or a batch of files (repository $n<i> and expression $e<i> per alias) """
+    def respond_graphql(self, variables: dict) -> dict:
+        if 'org' in variables.keys():
+            start = int(variables['after']) if variables.get('after') else 0
+            names = self.workflows[start:start + int(variables['first'])]
+            nodes = [{'name': wf, 'url': f'https://github.com/{self.organization}/{wf}',
+                      'pushedAt': "2024-01-01T00:00:00Z",
+                      'build': {'text': self.content(wf, "vidarrbuild.json")},
+                      'refs': {'pageInfo': {'hasNextPage': False}, 'nodes': [{'name': t} for t in self.tags[wf]]}}
+                     for wf in names]
+            end = start + len(names)
+            return {'data': {'organization': {'repositories': {
+                'pageInfo': {'hasNextPage': end < len(self.workflows), 'endCursor': str(end)}, 'nodes': nodes}}}}
+        data = {}
+        errors = []
+        for key in sorted(k for k in variables.keys() if k.startswith("n")):
+            alias = f'r{key[1:]}'
+            repo = variables[key]
+            if repo not in self.tags.keys():
+                data[alias] = None
+                errors.append({'type': "NOT_FOUND", 'path': [alias],
+                               'message': f'Could not resolve to a Repository with the name \'{repo}\'.'})
+                continue
+            content = self.content(repo, variables[f'e{key[1:]}'].split(":", 1)[1])
+            data[alias] = {'object': {'text': content} if content is not None else None}
+        return {'data': data, 'errors': errors} if errors else {'data': data}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path, _, query_string = self.path.partition("?")
+                query = dict(q.split("=", 1) for q in query_string.split("&") if "=" in q)
+                self.reply(*mock.respond(path, query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length))
+                except ValueError:
+                    request = None
+                if self.path.partition("?")[0] != "/graphql":
+                    self.reply(404, {'message': "Not Found"})
+                elif not isinstance(request, dict):
+                    self.reply(400, {'message': "Problems parsing JSON"})
+                else:
+                    self.reply(200, mock.respond_graphql(request.get('variables') or {}))
+
+            def reply(self, status: int, data):
+                if mock.latency > 0:
+                    time.sleep(mock.latency)
+                body = json.dumps(data).encode()
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                with mock.lock:
+                    mock.requests += 1
+                    now = time.time()
+                    if mock.rate_limit is not None and now >= mock.reset_at:
+                        mock.remaining = mock.rate_limit
+                        mock.reset_at = int(now) + mock.reset_window
+                    if status == 200 and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                        mock.not_modified += 1
+                    elif mock.rate_limit is not None:
+                        if mock.remaining <= 0:
+                            status = 403
+                            body = json.dumps({'message': "API rate limit exceeded"}).encode()
+                            mock.limited += 1
+                        else:
+                            mock.remaining -= 1
+                    mock.bytes_sent += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status in (200, 304):
+                    self.send_header("ETag", etag)
+                if mock.rate_limit is not None:
+                    self.send_header("X-RateLimit-Limit", str(mock.rate_limit))
+                    self.send_header("X-RateLimit-Remaining", str(max(0, mock.remaining)))
+                    self.send_header("X-RateLimit-Reset", str(mock.reset_at))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
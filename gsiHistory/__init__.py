@@ -0,0 +1,157 @@
+"""
+   Functions for building a deployment timeline of workflows across analysis-config commits.
+   The olive-derived state (extract_olive_info output per instance) is updated commit by commit,
+   only olives touched by a commit are re-parsed and re-matched. Transitions of tags are recorded per workflow
+"""
+import contextlib
+import io
+from git import Git
+import gsiOlive
+import gsiSource
+import gsiWorkflow
+
+SUBDIRS = ("vidarr", "shesmu")
+NULL_SHA = "0" * 40
+
+
+"""
+   Walk commits in a range (first-parent history, oldest first), yield (commit, date, changes) where changes
+   is a list of (path, blob sha or None for deleted files). A single git log process lists everything
+"""
+def walk_commits(repo_dir: str, rev_range: str):
+    log = Git(repo_dir).log("--reverse", "--first-parent", "--diff-merges=first-parent", "--no-renames",
+                            "--raw", "--no-abbrev", "--format=commit %H %cI", rev_range, "--", *SUBDIRS)
+    commit = None
+    for line in log.split("\n"):
+        if line.startswith("commit "):
+            if commit is not None:
+                yield commit
+            fields = line.split()
+            commit = (fields[1], fields[2], [])
+        elif line.startswith(":") and commit is not None:
+            info, path = line.split("\t", 1)
+            new_sha = info.split()[3]
+            commit[2].append((path, None if new_sha == NULL_SHA else new_sha))
+    if commit is not None:
+        yield commit
+
+
+"""
+   Keeps olive-derived state of analysis-config and moves it from commit to commit. Run names of every olive
+   are matched once, a commit only re-matches the olives it touches (all olives of an instance if its list of
+   workflows changed), so the cost of a commit follows the size of its diff rather than the size of the tree
+"""
+class DeploymentHistory:
+    def __init__(self, repo_dir: str, instances: list, aliases: dict, prefixes: list,
+                 parse_cache: gsiOlive.OliveParseCache = None):
+        self.repo_dir = repo_dir
+        self.instances = instances
+        self.aliases = aliases
+        self.prefixes = prefixes
+        self.parse_cache = parse_cache
+        self.source = None
+        self.listed = False
+        self.wf_names = {}
+        self.olive_files = {}
+        self.matchers = {}
+        self.parsed = {}
+        self.matches = {}
+        self.instance_tags = {}
+        self.tags = {}
+        self.timeline = {}
+
+    """ Start from the tree at base commit (or from nothing) """
+    def start(self, base: str | None, date: str | None):
+        self.source = gsiSource.GitObjectSource(self.repo_dir, base, SUBDIRS)
+        if self.parse_cache is not None:
+            self.parse_cache.blob_shas = self.source.blob_shas
+        if base is not None:
+            self.update(self.source.commit, date, [])
+
+    """ Workflows matched by Run names of an olive, kept until the olive or the workflows of instance change """
+    def match(self, inst: str, path: str) -> set:
+        if path not in self.matches[inst].keys():
+            oli = self.parsed[path]
+            matched = set()
+            if isinstance(oli, dict) and 'names' in oli.keys():
+                for name in oli['names']:
+                    matched.update(self.matchers[inst].match(name))
+            self.matches[inst][path] = matched
+        return self.matches[inst][path]
+
+    """ Apply changes of a commit, re-parse and re-match touched olives and record tag transitions """
+    def update(self, commit: str, date: str, changes: list):
+        touched = set()
+        ''' Only added or deleted files change lists of workflows and olives, edits do not '''
+        relist = not self.listed
+        for rel_path, sha in changes:
+            path = "/".join([self.repo_dir, rel_path])
+            relist = relist or sha is None or path not in self.source.blob_shas.keys()
+            self.source.apply_change(rel_path, sha)
+            self.parsed.pop(path, None)
+            for matches in self.matches.values():
+                matches.pop(path, None)
+            touched.add(path)
+        ''' Listing and parsing report on every file, this is too much for every commit '''
+        with contextlib.redirect_stdout(io.StringIO()):
+            if relist:
+                wf_names = gsiWorkflow.extract_wf_names(self.repo_dir, self.instances, self.prefixes, self.source) or {}
+                for inst in set(self.wf_names.keys()) | set(wf_names.keys()):
+                    if inst not in wf_names.keys():
+                        self.matchers.pop(inst, None)
+                        self.matches.pop(inst, None)
+                    elif wf_names[inst] != self.wf_names.get(inst):
+                        self.matchers[inst] = gsiOlive.WorkflowMatcher(wf_names[inst])
+                        self.matches[inst] = {}
+                self.wf_names = wf_names
+                self.olive_files = gsiOlive.collect_olives(self.repo_dir, self.instances, self.aliases, self.source) or {}
+                self.listed = True
+            to_parse = sorted({f for inst in self.olive_files.keys() for f in self.olive_files[inst]
+                               if f not in self.parsed.keys()})
+            if len(to_parse) > 0:
+                self.parsed.update(zip(to_parse, gsiOlive.parse_olives(to_parse, 1, self.parse_cache, self.source)))
+        ''' Tags of a workflow are those of all olives matched to it, as match_olives merges them '''
+        for inst in list(self.instance_tags.keys()):
+            if inst not in self.wf_names.keys() or inst not in self.olive_files.keys():
+                self.instance_tags.pop(inst)
+        for inst in self.wf_names.keys():
+            if inst not in self.olive_files.keys():
+                continue
+            if relist or inst not in self.instance_tags.keys() or not touched.isdisjoint(self.olive_files[inst]):
+                wf_tags = {}
+                for path in self.olive_files[inst]:
+                    for wf in self.match(inst, path):
+                        wf_tags.setdefault(wf, set()).update(self.parsed[path]['tags'])
+                self.instance_tags[inst] = wf_tags
+        new_tags = {(wf, inst): tags for inst in self.instance_tags.keys() for wf, tags in self.instance_tags[inst].items()}
+        for wf, inst in sorted(set(self.tags.keys()) | set(new_tags.keys())):
+            old = self.tags.get((wf, inst), set())
+            new = new_tags.get((wf, inst), set())
+            if old != new:
+                self.timeline.setdefault(wf, []).append({'commit': commit,
+                                                         'date': date,
+                                                         'instance': inst,
+                                                         'added': sorted(new - old),
+                                                         'removed': sorted(old - new)})
+        self.tags = new_tags
+
+
+"""
+   Build timeline of tag/instance transitions for a commit range (A..B or a single ref for the whole history).
+   With A..B the state at A is recorded first, so the timeline shows what was deployed at the start of the range
+"""
+def build_timeline(repo_dir: str, rev_range: str, instances: list, aliases: dict, prefixes: list,
+                   parse_cache: gsiOlive.OliveParseCache = None) -> dict:
+    history = DeploymentHistory(repo_dir, instances, aliases, prefixes, parse_cache)
+    base = None
+    base_date = None
+    if ".." in rev_range and rev_range.split("..", 1)[0]:
+        base = rev_range.split("..", 1)[0]
+        base_date = Git(repo_dir).show("-s", "--format=%cI", f'{base}^{{commit}}')
+    history.start(base, base_date)
+    commits = 0
+    for commit, date, changes in walk_commits(repo_dir, rev_range):
+        history.update(commit, date, changes)
+        commits += 1
+    print(f'INFO: Processed {commits} commits, timeline has {len(history.timeline)} workflows')
+    return history.timeline
@@ -0,0 +1,175 @@
+"""
+   Instrumentation for workflowTracker runs. Stages, HTTP requests, parsed files and rate limit headers
+   are recorded in a process-wide registry (safe to use from worker threads) and written at the end of
+   a run as a json file and/or a Prometheus textfile collector file (node_exporter --collector.textfile)
+"""
+import json
+import threading
+import time
+import gsiState
+
+PREFIX = "workflow_tracker"
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+"""
+   Start with an empty registry, called at the start of a run
+"""
+def reset():
+    with _lock:
+        _metrics.clear()
+        _metrics.update({'started': time.time(), 'finished': None, 'stages': {}, 'current_stage': None,
+                         'http_requests': {}, 'http_bytes': 0, 'http_seconds': 0.0,
+                         'rate_limit': {}, 'files_parsed': {}, 'counters': {}, 'repo_seconds': {}})
+
+
+reset()
+
+
+"""
+   Mark the start of a stage, the previous stage (if any) ends here. Stages follow each other,
+   like the A-G blocks of the main script
+"""
+def stage(name: str | None):
+    now = time.time()
+    with _lock:
+        current = _metrics['current_stage']
+        if current is not None:
+            _metrics['stages'][current[0]] = _metrics['stages'].get(current[0], 0.0) + now - current[1]
+        _metrics['current_stage'] = (name, now) if name is not None else None
+
+
+"""
+   End the last stage and the run
+"""
+def finish():
+    stage(None)
+    with _lock:
+        _metrics['finished'] = time.time()
+
+
+"""
+   Record a HTTP response: status, size of the body as received, time it took and rate limit headers
+"""
+def record_response(status: int, headers: dict, n_bytes: int, seconds: float):
+    with _lock:
+        _metrics['http_requests'][str(status)] = _metrics['http_requests'].get(str(status), 0) + 1
+        _metrics['http_bytes'] += n_bytes
+        _metrics['http_seconds'] += seconds
+        if 'x-ratelimit-remaining' in headers.keys():
+            try:
+                remaining = int(headers['x-ratelimit-remaining'])
+            except ValueError:
+                return
+            rate_limit = _metrics['rate_limit']
+            rate_limit['last_remaining'] = remaining
+            rate_limit['min_remaining'] = min(remaining, rate_limit.get('min_remaining', remaining))
+            for key in ('limit', 'reset', 'used'):
+                if f'x-ratelimit-{key}' in headers.keys() and headers[f'x-ratelimit-{key}'].isdigit():
+                    rate_limit[key] = int(headers[f'x-ratelimit-{key}'])
+
+
+"""
+   Count parsed files of a kind (olive, wdl)
+"""
+def files_parsed(kind: str, n_files: int = 1):
+    with _lock:
+        _metrics['files_parsed'][kind] = _metrics['files_parsed'].get(kind, 0) + n_files
+
+
+"""
+   Increment a general counter
+"""
+def count(name: str, value: int = 1):
+    with _lock:
+        _metrics['counters'][name] = _metrics['counters'].get(name, 0) + value
+
+
+"""
+   Record time spent collecting data for a repository
+"""
+def repo_time(repo: str, seconds: float):
+    with _lock:
+        _metrics['repo_seconds'][repo] = seconds
+
+
+"""
+   Return recorded metrics as a json-friendly dict
+"""
+def snapshot() -> dict:
+    with _lock:
+        finished = _metrics['finished'] if _metrics['finished'] is not None else time.time()
+        repo_seconds = _metrics['repo_seconds']
+        return {'started': _metrics['started'],
+                'finished': finished,
+                'run_seconds': finished - _metrics['started'],
+                'stage_seconds': dict(_metrics['stages']),
+                'http': {'requests': dict(_metrics['http_requests']),
+                         'requests_total': sum(_metrics['http_requests'].values()),
+                         'bytes': _metrics['http_bytes'],
+                         'seconds': _metrics['http_seconds']},
+                'rate_limit': dict(_metrics['rate_limit']),
+                'files_parsed': dict(_metrics['files_parsed']),
+                'counters': dict(_metrics['counters']),
+                'repos': {'count': len(repo_seconds),
+                          'seconds_total': sum(repo_seconds.values()),
+                          'seconds_max': max(repo_seconds.values()) if repo_seconds else 0.0,
+                          'seconds': dict(sorted(repo_seconds.items()))}}
+
+
+"""
+   Format metrics for the Prometheus textfile collector. Per-repo latencies are summarized,
+   so the number of series does not grow with the number of repositories
+"""
+def to_prometheus(metrics: dict) -> str:
+    lines = []
+
+    def add(name: str, kind: str, help_text: str, samples: list):
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+        for labels, value in samples:
+            label_text = ",".join([f'{k}="{v}"' for k, v in labels.items()])
+            lines.append(f'{PREFIX}_{name}{{{label_text}}} {value}' if label_text else f'{PREFIX}_{name} {value}')
+
+    add("last_run_timestamp_seconds", "gauge", "Time the last run finished", [({}, metrics['finished'])])
+    add("run_seconds", "gauge", "Wall time of the last run", [({}, metrics['run_seconds'])])
+    add("stage_seconds", "gauge", "Wall time of each stage of the last run",
+        [({'stage': s}, v) for s, v in metrics['stage_seconds'].items()])
+    add("http_requests", "gauge", "HTTP requests sent in the last run, by status",
+        [({'status': s}, v) for s, v in metrics['http']['requests'].items()])
+    add("http_response_bytes", "gauge", "Bytes of HTTP responses received in the last run",
+        [({}, metrics['http']['bytes'])])
+    add("http_seconds", "gauge", "Time spent waiting for HTTP responses in the last run",
+        [({}, metrics['http']['seconds'])])
+    if 'min_remaining' in metrics['rate_limit'].keys():
+        add("rate_limit_remaining_min", "gauge", "Lowest X-RateLimit-Remaining seen in the last run",
+            [({}, metrics['rate_limit']['min_remaining'])])
+    if 'limit' in metrics['rate_limit'].keys():
+        add("rate_limit", "gauge", "X-RateLimit-Limit seen in the last run", [({}, metrics['rate_limit']['limit'])])
+    add("files_parsed", "gauge", "Files parsed in the last run, by kind",
+        [({'kind': k}, v) for k, v in metrics['files_parsed'].items()])
+    add("repos", "gauge", "Repositories processed in the last run", [({}, metrics['repos']['count'])])
+    add("repo_seconds_total", "gauge", "Time spent on all repositories in the last run",
+        [({}, metrics['repos']['seconds_total'])])
+    add("repo_seconds_max", "gauge", "Time spent on the slowest repository in the last run",
+        [({}, metrics['repos']['seconds_max'])])
+    for name, value in metrics['counters'].items():
+        add(name, "gauge", f'{name.replace("_", " ").capitalize()} in the last run', [({}, value)])
+    return "\n".join(lines) + "\n"
+
+
+"""
+   Write metrics as json and/or Prometheus textfile. Files are replaced atomically, so a collector
+   never reads a partial file
+"""
+def write_metrics(json_path: str | None = None, prometheus_path: str | None = None):
+    metrics = snapshot()
+    try:
+        if json_path:
+            gsiState.write_atomic(json_path, json.dumps(metrics, indent=1))
+        if prometheus_path:
+            gsiState.write_atomic(prometheus_path, to_prometheus(metrics))
+    except OSError as err:
+        print(f'WARNING: Failed to write metrics: {err}')
@@ -1,25 +1,29 @@
 """
    Functions for handling Olive data
 """
+import collections
+import concurrent.futures
 import glob
-import itertools
+import json
 import os
 import re
-import subprocess
+import gsiMetrics
+import gsiState
 import gsiWorkflow
 
 """
-   Find olives, return dict with lists of files
+   Find olives, return dict with lists of files. Files are listed from a source (gsiSource.GitObjectSource)
+   if it is passed, otherwise from the working tree
 """
-def collect_olives(repo_dir: str, instances_list: list, aliases: dict) -> dict:
+def collect_olives(repo_dir: str, instances_list: list, aliases: dict, source=None) -> dict:
     if repo_dir and os.path.isdir(repo_dir):
         olive_hash = {}
         for inst in instances_list:
             subdir = "/".join([repo_dir, "shesmu", inst])
-            olive_files = glob.glob("/".join([subdir, "vidarr*.shesmu"]))
+            olive_files = source.glob(subdir, "vidarr*.shesmu") if source else glob.glob("/".join([subdir, "vidarr*.shesmu"]))
             if len(olive_files) == 0 and inst in aliases.keys():
                 subdir = "/".join([repo_dir, "shesmu", aliases[inst]])
-                olive_files = glob.glob("/".join([subdir, "vidarr*.shesmu"]))
+                olive_files = source.glob(subdir, "vidarr*.shesmu") if source else glob.glob("/".join([subdir, "vidarr*.shesmu"]))
             print(f'INFO: We have {len(olive_files)} .shesmu files for {inst}')
             if len(olive_files) > 0:
                 olive_hash[inst] = []
@@ -48,36 +52,259 @@ def merge_info(existing_hash: dict, new_hash: dict) -> dict:
    from vidarr names.
 """
 def extract_olive_info(olive_files: dict, workflow_names: dict) -> dict:
-    olive_info = {}
+    olive_data = {}
     '''Do not proceed if there are no data'''
     if not isinstance(olive_files, dict) or len(olive_files) == 0:
-        return olive_info
+        return {}
     if not isinstance(workflow_names, dict) or len(workflow_names) == 0:
-        return olive_info
+        return {}
 
     for instance in workflow_names.keys():
         if instance in olive_files.keys():
-            olive_data = parse_olives(olive_files[instance])
+            olive_data[instance] = parse_olives(olive_files[instance])
         else:
             print(f'WARNING: There are no Olive files for instance [{instance}]')
+    return match_olives(olive_data, workflow_names)
+
+"""
+   Index for matching olive Run names to workflows: an Aho-Corasick automaton over workflow names.
+   A workflow matches a name if the name is the workflow itself or contains the workflow followed
+   by one of the boundary characters (_ - .). All workflows found in a name are reported in one pass
+"""
+class WorkflowMatcher:
+    BOUNDARY = "_-."
+
+    def __init__(self, workflows):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for wf in workflows:
+            if not wf:
+                continue
+            state = 0
+            for ch in wf:
+                if ch not in self.goto[state].keys():
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state].append(wf)
+        ''' Breadth-first pass sets failure links, outputs of a state include outputs of its failure state '''
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback].keys():
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.out[next_state] = self.out[next_state] + self.out[self.fail[next_state]]
+
+    """ Return set of workflows matching name """
+    def match(self, name: str) -> set:
+        found = set()
+        state = 0
+        for i, ch in enumerate(name):
+            while state and ch not in self.goto[state].keys():
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for wf in self.out[state]:
+                end = i + 1
+                if end < len(name) and name[end] in self.BOUNDARY or len(wf) == len(name):
+                    found.add(wf)
+        return found
+
+
+"""
+   Match parsed olives (lists of dicts returned by parse_olives, keyed by instance) to workflows.
+   Workflows are visited in sorted order and every match gets its own copy of the olive data,
+   so the result does not depend on the set ordering and the input is not modified
+"""
+def match_olives(olive_data: dict, workflow_names: dict) -> dict:
+    olive_info = {}
+    for instance in workflow_names.keys():
+        if instance not in olive_data.keys() or olive_data[instance] is None:
             continue
-        for wf, oli in itertools.product(workflow_names[instance], olive_data):
-            ''' Match with Olive, get a dict with wf tags and modules '''
+        ''' Resolve Run names of each olive to workflows, then merge olives for each workflow in olive order '''
+        matcher = WorkflowMatcher(workflow_names[instance])
+        wf_olives = {}
+        for oli in olive_data[instance]:
             if isinstance(oli, dict) and 'names' in oli.keys():
+                matched = set()
                 for name in oli['names']:
-                    matched_name = re.search(wf, name)
-                    if matched_name is not None:
-                        matched_again = re.search(wf + "[_\-.]", name)
-                        if matched_again is not None or len(wf) == len(name):
-                            if wf not in olive_info.keys():
-                                olive_info[wf] = {}
-                            olive_info[wf][instance] = merge_info(olive_info[wf][instance], oli) if instance in olive_info[wf].keys() else oli
-                            break
-        if wf not in olive_info.keys() or instance not in olive_info[wf].keys():
-            print(f'WARNING: It was not possible to match instances for Workflow [{wf}]and Olive')
+                    matched.update(matcher.match(name))
+                for wf in matched:
+                    wf_olives.setdefault(wf, []).append(oli)
+        for wf in sorted(workflow_names[instance]):
+            if wf not in wf_olives.keys():
+                print(f'WARNING: It was not possible to match instances for Workflow [{wf}] and Olive')
+                continue
+            if wf not in olive_info.keys():
+                olive_info[wf] = {}
+            for oli in wf_olives[wf]:
+                oli_copy = dict(oli, olives=list(oli['olives']))
+                olive_info[wf][instance] = merge_info(olive_info[wf][instance], oli_copy) if instance in olive_info[wf].keys() else oli_copy
 
     return olive_info
 
+
+"""
+   Convert parsed Olive data into json-friendly dict (sets become sorted lists) and back
+"""
+def olive_to_json(olive: dict) -> dict:
+    return {k: sorted(v) if isinstance(v, set) else v for k, v in olive.items()}
+
+
+def olive_from_json(olive: dict) -> dict:
+    return {k: v if k == 'olives' else set(v) for k, v in olive.items()}
+
+"""
+   Persistent cache of parsed olives keyed by git blob SHA of the .shesmu file. Unchanged files are
+   served from the cache, so only new or modified blobs are parsed. Bump PARSER_VERSION whenever
+   parse_olive_text (or module parsing in gsiWorkflow) changes, this invalidates the cache
+"""
+PARSER_VERSION = 1
+
+
+class OliveParseCache:
+    def __init__(self, path: str, max_entries: int = 20000):
+        self.path = os.path.expanduser(os.path.expandvars(path))
+        self.max_entries = max_entries
+        self.blob_shas = {}
+        self.entries = {}
+        self.used = set()
+        try:
+            with open(self.path, "r") as cf:
+                cached = json.load(cf)
+            if cached.get('version') == PARSER_VERSION:
+                self.entries = cached['entries']
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+
+    """ Return parsed olive for a file if its blob was parsed before """
+    def get(self, m_olive: str) -> dict | None:
+        sha = self.blob_shas.get(m_olive)
+        if sha is None or sha not in self.entries.keys():
+            return None
+        self.used.add(sha)
+        return olive_from_json(dict(self.entries[sha], olives=[m_olive]))
+
+    """ Remember parsed olive, data do not depend on the path so it is not stored """
+    def put(self, m_olive: str, olive: dict):
+        sha = self.blob_shas.get(m_olive)
+        if sha is None:
+            return
+        self.used.add(sha)
+        self.entries[sha] = {k: v for k, v in olive_to_json(olive).items() if k != 'olives'}
+
+    """ Write the cache, entries used in this run are kept first """
+    def save(self):
+        kept = [sha for sha in self.entries.keys() if sha in self.used]
+        kept.extend([sha for sha in self.entries.keys() if sha not in self.used][:max(0, self.max_entries - len(kept))])
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        gsiState.write_json(self.path, {'version': PARSER_VERSION,
+                                        'entries': {sha: self.entries[sha] for sha in kept}})
+
+
+"""
+   Keep only olives whose text mentions any of the names. An olive can run a workflow only if its Run
+   line contains the workflow name, so this is a cheap pre-filter for parsing olives of a few workflows
+"""
+def filter_olives(olive_files: list, names: set, source=None) -> list:
+    kept = []
+    for m_olive in olive_files:
+        if source:
+            text = source.read(m_olive)
+        else:
+            with open(m_olive, "r", encoding="utf-8", errors="replace") as of:
+                text = of.read()
+        if any(name in text for name in names):
+            kept.append(m_olive)
+    return kept
+
+
+"""
+   Patterns for Run lines, compiled once
+"""
+RUN_TAG = re.compile(r"v(\d+_\d+_*\d*\w*)$")
+RUN_NAME = re.compile(r"(\S+)_v\d+_\d+_*\d*\w*$")
+
+
+"""
+   Pick lines the same way grep did: lines with 'Run ' and lines with 'module' in any case.
+   Like grep output (which we used to strip), the block of selected lines is stripped as a whole
+"""
+def _select_lines(lines: list) -> list:
+    if len(lines) == 0:
+        return []
+    return "\n".join(lines).strip().split("\n")
+
+
+"""
+   Parse text of a single Olive in one pass: return a dict with names, tags and modules
+"""
+def parse_olive_text(m_olive: str, text: str) -> dict:
+    run_lines = []
+    module_lines = []
+    for line in text.split("\n"):
+        if "Run " in line:
+            run_lines.append(line)
+        if "module" in line.lower():
+            module_lines.append(line)
+    run_lines = _select_lines(run_lines)
+    module_lines = _select_lines(module_lines)
+    if len(run_lines) == 0:
+        print(f'WARNING: No Run lines in the Olive {m_olive}')
+    if len(module_lines) == 0:
+        print(f'WARNING: No Module lines in the Olive {m_olive}')
+
+    vetted_tags = []
+    vetted_names = []
+    for rl in run_lines:
+        next_tag = RUN_TAG.search(rl)
+        next_name = RUN_NAME.search(rl)
+        if next_tag is not None:
+            vetted_tags.append(next_tag.group(1).replace("_", "."))
+        if next_name is not None:
+            vetted_names.append(next_name.group(1))
+
+    module_list = gsiWorkflow.parse_module_strings(module_lines)
+    return {'olives': [m_olive],
+            'tags': set(vetted_tags),
+            'names': set(vetted_names),
+            'data_modules': set(module_list['data_modules']),
+            'code_modules': set(module_list['code_modules'])}
+
+
+"""
+   Run names of olives, read without parsing the rest of them. Lines are picked as parse_olive_text picks them,
+   so names are the ones a full parse returns
+"""
+def olive_run_names(olive_files: list, source=None) -> set:
+    names = set()
+    for m_olive in olive_files:
+        if source:
+            text = source.read(m_olive)
+        else:
+            with open(m_olive, "r", encoding="utf-8", errors="replace") as of:
+                text = of.read()
+        for rl in _select_lines([line for line in text.split("\n") if "Run " in line]):
+            next_name = RUN_NAME.search(rl)
+            if next_name is not None:
+                names.add(next_name.group(1))
+    return names
+
+
+"""
+   Read and parse a single Olive file
+"""
+def parse_olive_file(m_olive: str) -> dict:
+    with open(m_olive, "r", encoding="utf-8", errors="replace") as of:
+        return parse_olive_text(m_olive, of.read())
+
+
 """
    Parse Olive: return a dict with modules and tags
    
@@ -87,45 +314,38 @@ def extract_olive_info(olive_files: dict, workflow_names: dict) -> dict:
      data_modules = set
      code_modules = set
    }
+   With workers > 1 files are spread across a pool of processes, with a cache only files
+   whose blobs are not in the cache are parsed. With a source, files are read from the source
 """
-def parse_olives(olive_files: list) -> dict:
+def parse_olives(olive_files: list, workers: int = 1, cache: OliveParseCache | None = None, source=None) -> list | None:
     """ Return a list of Olive data structure(s) """
-    parsed_olives = []
-    ''' extract versions of the Workflow, names and modules'''
-    for m_olive in olive_files:
-        vetted_tags = []
-        vetted_names = []
-        try:
-            run_lines = subprocess.check_output(f"grep 'Run ' '{m_olive}'", shell=True).decode().strip()
-            run_lines = run_lines.split("\n")
-            if not isinstance(run_lines, list):
-                run_lines = [run_lines]
-        except subprocess.CalledProcessError:
-            print(f'WARNING: No Run lines in the Olive {m_olive}')
-            run_lines = []
-
-        for rl in run_lines:
-            next_tag = re.search("v(\d+_\d+_*\d*\w*)$", rl)
-            next_name = re.search("(\S+)_v\d+_\d+_*\d*\w*$", rl)
-            if next_tag is not None:
-                vetted_tags.append(next_tag.group(1).replace("_", "."))
-            if next_name is not None:
-                vetted_names.append(next_name.group(1))
-
-        try:
-            module_lines = subprocess.check_output(f"grep -i module '{m_olive}'", shell=True).decode().strip()
-            module_lines = module_lines.split("\n")
-            if not isinstance(module_lines, list):
-                module_lines = [module_lines]
-        except subprocess.CalledProcessError:
-            print(f'WARNING: No Module lines in the Olive {m_olive}')
-            module_lines = []
-        module_list = gsiWorkflow.parse_module_strings(module_lines)
-        parsed_olives.append({'olives': [m_olive],
-                              'tags': set(vetted_tags),
-                              'names': set(vetted_names),
-                              'data_modules': set(module_list['data_modules']),
-                              'code_modules': set(module_list['code_modules'])})
+    parsed = {}
+    if cache is not None:
+        for m_olive in olive_files:
+            cached = cache.get(m_olive)
+            if cached is not None:
+                parsed[m_olive] = cached
+    to_parse = [m_olive for m_olive in olive_files if m_olive not in parsed.keys()]
+    texts = [source.read(m_olive) for m_olive in to_parse] if source else None
+    if workers > 1 and len(to_parse) > 1:
+        chunk_size = max(1, len(to_parse) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            if texts is not None:
+                results = executor.map(parse_olive_text, to_parse, texts, chunksize=chunk_size)
+            else:
+                results = executor.map(parse_olive_file, to_parse, chunksize=chunk_size)
+            parsed.update(zip(to_parse, results))
+    elif texts is not None:
+        parsed.update([(m_olive, parse_olive_text(m_olive, text)) for m_olive, text in zip(to_parse, texts)])
+    else:
+        parsed.update([(m_olive, parse_olive_file(m_olive)) for m_olive in to_parse])
+    gsiMetrics.files_parsed("olive", len(to_parse))
+    if cache is not None:
+        for m_olive in to_parse:
+            cache.put(m_olive, parsed[m_olive])
+        gsiMetrics.count("olives_cached", len(olive_files) - len(to_parse))
+        print(f'INFO: Parsed {len(to_parse)} of {len(olive_files)} olives, the rest is cached')
+    parsed_olives = [parsed[m_olive] for m_olive in olive_files]
     if len(parsed_olives) > 0:
         return parsed_olives
     else:
@@ -3,16 +3,40 @@
    it should initialize and respond to different requests
 """
 import re
-from dataclasses import dataclass
-import subprocess
+from dataclasses import dataclass, field
 import json
 import base64
+import gsiMetrics
+from gsiRepository.transport import get_transport
+from gsiRepository.cache import ResponseCache
+from gsiRepository.discovery import DiscoveryIndex
+from gsiRepository.tags import TagIndex, version_key
+from gsiRepository.scheduler import RequestScheduler, DEFAULT_MAX_RATE, PRIORITY_CRITICAL, PRIORITY_NORMAL
+
+TAG_PATTERN = re.compile(r"\d+\.\d+\.\d+")
+MAX_TAG_PAGES = 50
 
 @dataclass
 class githubRepo:
     organization: str
     token: str
     max_repos: int = 1000
+    backend: str = "http"
+    timeout: float = 30.0
+    cache: ResponseCache | None = None
+    api_url: str = "https://api.github.com"
+    tokens: list = field(default_factory=list, repr=False)
+    max_rate: float | None = DEFAULT_MAX_RATE
+    max_wait: float = 3600.0
+    transport: object = field(default=None, init=False, repr=False, compare=False)
+    scheduler: RequestScheduler = field(default=None, init=False, repr=False, compare=False)
+    tag_index: TagIndex = field(default_factory=TagIndex, repr=False, compare=False)
+    pushed_at: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.transport = get_transport(self.backend, self.timeout)
+        tokens = [self.token] + [t for t in self.tokens if t != self.token]
+        self.scheduler = RequestScheduler(tokens, self.max_rate, self.max_wait)
 
     """ Return shortest, prefix-free name for a workflow """
     @staticmethod
@@ -24,21 +48,32 @@ class githubRepo:
                 raw_name = raw_name.rstrip("_")
         return raw_name.lower()
 
-    """ Format curl command """
-    def get_curl_command(self, request: str, req_type="repos") -> str:
-        curl_cmd = f'curl -L \
-        -H "Accept: application/vnd.github+json" \
-        -H "Authorization: Bearer {self.token}" \
-        -H "X-GitHub-Api-Version: 2022-11-28" \
-        https://api.github.com/{req_type}/{self.organization}/{request}'
-        return curl_cmd
+    """ Headers sent with every request """
+    def get_headers(self, token: str | None = None) -> dict:
+        return {"Accept": "application/vnd.github+json",
+                "Authorization": f'Bearer {token if token is not None else self.token}',
+                "X-GitHub-Api-Version": "2022-11-28"}
 
-    """ Get a simple dict keyed by repo name with urls """
+    """ Send request to Github API using configured transport when the scheduler gives it a turn and a token,
+        return response body. If there is a cache, send conditional request and serve cached body if nothing changed """
+    def send_request(self, request: str, req_type="repos", priority: int = PRIORITY_NORMAL) -> str:
+        url = f'{self.api_url}/{req_type}/{self.organization}/{request}'
+        cached = self.cache.lookup(url) if self.cache is not None else None
+        conditional = cached.conditional_headers() if cached is not None else {}
+        response = self.scheduler.execute(
+            lambda token: self.transport.request(url, self.get_headers(token) | conditional), priority)
+        if cached is not None and response.status == 304:
+            gsiMetrics.count("cache_not_modified")
+            return cached.body.decode().strip()
+        if self.cache is not None and response.status == 200:
+            self.cache.store(url, response.body, response.headers)
+        return response.body.decode().strip()
+
+    """ Get a simple dict keyed by repo name with urls, remember when each repo was last pushed to """
     def get_repo_list(self) -> dict:
         repos = {}
         for i in range(1, int(self.max_repos/100)):
-            repo_request = self.get_curl_command(f'repos?page={i}\&per_page=100', "orgs")
-            rp_string = subprocess.check_output(repo_request, shell=True).decode().strip()
+            rp_string = self.send_request(f'repos?page={i}&per_page=100', "orgs", PRIORITY_CRITICAL)
             rp_data = json.loads(rp_string)
             if len(rp_data) < 1 or not isinstance(rp_data, list):
                 break
@@ -46,54 +81,59 @@ class githubRepo:
             for rw in rp_data:
                 if isinstance(rw, dict) and 'name' in rw.keys() and 'html_url' in rw.keys():
                     repos[rw['name']] = rw['html_url']
+                    self.pushed_at[rw['name']] = rw.get('pushed_at')
         return repos
 
-    """ Get file content as an array of strings """
-    def get_file_content(self, workflow_repo: str, file: str) -> bytes | None:
-        file_request = self.get_curl_command(f'{workflow_repo}/contents/{file}')
-        f_string = subprocess.check_output(file_request, shell=True).decode().strip()
+    """ Get file content (at ref, default branch if ref is None) and whether the answer is definite: the file
+        was found or Github says it does not exist (a failed request is not definite) """
+    def get_file(self, workflow_repo: str, file: str, ref: str | None = None) -> tuple:
+        f_string = self.send_request(f'{workflow_repo}/contents/{file}' + (f'?ref={ref}' if ref else ""),
+                                     priority=PRIORITY_CRITICAL if file == "vidarrbuild.json" else PRIORITY_NORMAL)
         f_data = json.loads(f_string)
         if 'content' in f_data.keys():
-            return base64.b64decode(f_data["content"])
+            return base64.b64decode(f_data["content"]), True
         else:
-            return None
+            return None, f_data.get('message') == "Not Found"
+
+    """ Get file content as an array of strings """
+    def get_file_content(self, workflow_repo: str, file: str) -> bytes | None:
+        return self.get_file(workflow_repo, file)[0]
 
-    """ Get all tags from a Repository """
+    """ Get all tags from a Repository, reading all pages of them. A failed request raises ValueError,
+        so that an incomplete list of tags is never taken for the complete one """
     def get_repo_tags(self, workflow_repo: str) -> list:
-        tags_request = self.get_curl_command(f'{workflow_repo}/tags')
-        t_string = subprocess.check_output(tags_request, shell=True).decode().strip()
-        t_data = json.loads(t_string)
         tags = []
-        for t in t_data:
-            if isinstance(t, dict) and 'name' in t.keys():
-                tag_check = re.search("\d+\.\d+\.\d+", t['name'])
-                if tag_check is not None:
-                    tags.append(t['name'])
+        for i in range(1, MAX_TAG_PAGES + 1):
+            t_string = self.send_request(f'{workflow_repo}/tags?page={i}&per_page=100')
+            t_data = json.loads(t_string)
+            if not isinstance(t_data, list):
+                raise ValueError(f'Could not read tags of [{workflow_repo}]')
+            for t in t_data:
+                if isinstance(t, dict) and 'name' in t.keys():
+                    tag_check = TAG_PATTERN.search(t['name'])
+                    if tag_check is not None:
+                        tags.append(t['name'])
+            if len(t_data) < 100:
+                break
         return tags
 
-    """ Get the latest tag from a Repository, be aware of possible letters at the end """
-    def get_latest_tag(self, workflow_repo: str) -> str | None:
-        tags = self.get_repo_tags(workflow_repo)
-        if len(tags) > 0:
-            latest = ['0', '0', '0']
-            for t in tags:
-                nums = t.split(".")
-                try:
-                    res = [int(latest[x]) - int(nums[x]) for x in range(0, len(latest))]
-                except ValueError:
-                    print("WARNING: We do not compare tags containing letters")
-                    res = [0, 0, 0]
-                for check in res:
-                    if check == 0:
-                        continue
-                    elif check < 0:
-                        latest = nums
-                        break
-                    else:
-                        break
-            return ".".join(latest)
+    """ Make sure tags of a Repository are in the tag index, they are read only if it was pushed to since """
+    def index_tags(self, workflow_repo: str):
+        pushed_at = self.pushed_at.get(workflow_repo)
+        if not self.tag_index.known(workflow_repo, pushed_at):
+            self.tag_index.put(workflow_repo, pushed_at, self.get_repo_tags(workflow_repo))
         else:
-            return None
+            gsiMetrics.count("tags_known")
+
+    """ Get the latest tag from a Repository, letters at the end and a "v" at the start are understood """
+    def get_latest_tag(self, workflow_repo: str) -> str | None:
+        self.index_tags(workflow_repo)
+        return self.tag_index.latest(workflow_repo)
+
+    """ True if the tag is the latest version in a Repository """
+    def is_latest_tag(self, workflow_repo: str, tag: str) -> bool:
+        self.index_tags(workflow_repo)
+        return self.tag_index.is_latest(workflow_repo, tag)
 
     """ 
        Function for making a data for matching workflows to repos, calls a couple of functions and writes to dict
@@ -112,3 +152,6 @@ class githubRepo:
                 except:
                     print(f'Failed to retrieve data for repo {repo}')
 
+
+from gsiRepository.graphql import graphqlRepo
+from gsiRepository.mirror import mirrorRepo
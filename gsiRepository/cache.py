@@ -0,0 +1,108 @@
+"""
+   On-disk cache for Github API responses. Entries are keyed by request URL and keep ETag and
+   Last-Modified values, which are sent back as conditional headers. Github does not count
+   304 (Not Modified) responses against the rate limit, so unchanged data costs almost nothing
+"""
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+import gsiState
+
+
+"""
+   Cached response: body plus validators
+"""
+@dataclass
+class CacheEntry:
+    url: str
+    body: bytes
+    etag: str | None = None
+    last_modified: str | None = None
+
+    """ Headers for a conditional request """
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = os.path.expanduser(os.path.expandvars(cache_dir))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    """ Path to the files for url, .json keeps metadata and .body keeps the response """
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    """ Atomically write data to path """
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        gsiState.write_atomic(path, data)
+
+    """ Return cached entry for url or None """
+    def lookup(self, url: str) -> CacheEntry | None:
+        path = self._path(url)
+        try:
+            with open(path + ".json", "r") as mf:
+                meta = json.load(mf)
+            with open(path + ".body", "rb") as bf:
+                body = bf.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        ''' Touch the entry so that eviction removes least recently used ones first '''
+        try:
+            os.utime(path + ".body")
+        except OSError:
+            pass
+        return CacheEntry(url, body, meta.get('etag'), meta.get('last_modified'))
+
+    """ Store response if it has validators, otherwise it can not be re-validated """
+    def store(self, url: str, body: bytes, headers: dict):
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if not etag and not last_modified:
+            return
+        path = self._path(url)
+        self._write(path + ".body", body)
+        self._write(path + ".json", json.dumps({'url': url,
+                                                'etag': etag,
+                                                'last_modified': last_modified}).encode())
+
+    """ Remove least recently used entries until the cache fits into max_bytes """
+    def prune(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for root, dirs, files in os.walk(self.cache_dir):
+                for f in files:
+                    if not f.endswith(".body"):
+                        continue
+                    body_path = os.path.join(root, f)
+                    try:
+                        st = os.stat(body_path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, body_path))
+                    total += st.st_size
+            entries.sort()
+            for mtime, size, body_path in entries:
+                if total <= self.max_bytes:
+                    break
+                for stale in (body_path, body_path.removesuffix(".body") + ".json"):
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+                total -= size
@@ -0,0 +1,50 @@
+"""
+   Discovery index: vidarrbuild.json of every repository in the organization (None for repositories which do not
+   have it) keyed by pushed_at of the repository. Most repositories are not workflows, or build workflows no olive
+   runs, and a repository can not change without being pushed to, so these are checked again only when pushed_at
+   changes. Only definite answers (the file or Not Found) are recorded, failed requests are tried again next time
+"""
+import json
+import os
+import threading
+import gsiState
+
+INDEX_VERSION = 1
+
+
+class DiscoveryIndex:
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(os.path.expandvars(path))
+        self.entries = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as df:
+                index = json.load(df)
+            if index.get('version') == INDEX_VERSION:
+                self.entries = index['entries']
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+
+    """ True if the repository was checked when it had this pushed_at """
+    def known(self, repo: str, pushed_at: str | None) -> bool:
+        with self._lock:
+            return pushed_at is not None and repo in self.entries.keys() and \
+                self.entries[repo]['pushed_at'] == pushed_at
+
+    """ Return recorded vidarrbuild.json (parsed), None if the repository does not have one """
+    def build(self, repo: str) -> dict | None:
+        with self._lock:
+            return self.entries[repo]['build']
+
+    def put(self, repo: str, pushed_at: str | None, build: dict | None):
+        if pushed_at is None:
+            return
+        with self._lock:
+            self.entries[repo] = {'pushed_at': pushed_at, 'build': build}
+
+    """ Write the index, repositories which are not in the organization any more are dropped """
+    def save(self, repos=None):
+        with self._lock:
+            entries = self.entries if repos is None else {r: e for r, e in self.entries.items() if r in repos}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            gsiState.write_json(self.path, {'version': INDEX_VERSION, 'entries': entries})
@@ -0,0 +1,149 @@
+"""
+   GraphQL-backed collector for githubRepo. The list of repositories, vidarrbuild.json and tags
+   are fetched for a whole page of repositories with one query, wdl files referenced in
+   vidarrbuild.json are fetched in batches afterwards. Data are then served by the same methods
+   REST implementation has, so the main script does not need to know which one is used. Only what a
+   query actually returned is served from prefetched data, anything else (a failed query, a repository
+   or file with an error) is requested through REST
+"""
+import http.client
+import json
+from dataclasses import dataclass, field
+from gsiRepository import githubRepo, TAG_PATTERN, PRIORITY_CRITICAL
+
+REPO_PAGE_QUERY = """
+query($org: String!, $first: Int!, $after: String) {
+  organization(login: $org) {
+    repositories(first: $first, after: $after, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        url
+        pushedAt
+        build: object(expression: "HEAD:vidarrbuild.json") { ... on Blob { text } }
+        refs(refPrefix: "refs/tags/", first: 100) { pageInfo { hasNextPage } nodes { name } }
+      }
+    }
+  }
+}
+"""
+
+
+@dataclass
+class graphqlRepo(githubRepo):
+    page_size: int = 50
+    files: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    tags: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    """ Send a GraphQL query, return (data part of the response, paths of fields with errors, as tuples).
+        data is None if the query failed (an error status, a response which is not json) """
+    def send_query(self, query: str, variables: dict) -> tuple:
+        payload = json.dumps({'query': query, 'variables': variables}).encode()
+        try:
+            response = self.scheduler.execute(lambda token: self.transport.request(f'{self.api_url}/graphql',
+                                                                                   self.get_headers(token),
+                                                                                   method="POST", data=payload),
+                                              PRIORITY_CRITICAL, "graphql")
+        except (OSError, http.client.HTTPException) as err:
+            print(f'WARNING: GraphQL query failed: {err}')
+            return None, set()
+        if response.status != 200 or "json" not in response.headers.get('content-type', "application/json"):
+            print(f'WARNING: GraphQL query failed with status {response.status}')
+            return None, set()
+        try:
+            result = json.loads(response.body.decode())
+        except ValueError:
+            print("WARNING: GraphQL response is not valid json")
+            return None, set()
+        if not isinstance(result, dict):
+            return None, set()
+        failed = set()
+        for error in result.get('errors') or []:
+            print(f'WARNING: GraphQL error: {error.get("message")}')
+            if error.get('path'):
+                failed.add(tuple(error['path']))
+        return result.get('data'), failed
+
+    """ Get a simple dict keyed by repo name with urls, vidarrbuild.json, wdl and tags are prefetched.
+        If a page can not be read, the list comes from REST """
+    def get_repo_list(self) -> dict:
+        repos = {}
+        after = None
+        while len(repos) < self.max_repos:
+            data, failed = self.send_query(REPO_PAGE_QUERY, {'org': self.organization, 'first': self.page_size,
+                                                             'after': after})
+            if data is None or not data.get('organization') and len(failed) > 0:
+                print("WARNING: Could not list repositories with GraphQL, using REST")
+                return super().get_repo_list()
+            if not data.get('organization'):
+                break
+            page = data['organization']['repositories']
+            for n, rw in enumerate(page['nodes']):
+                if not rw:
+                    continue
+                repos[rw['name']] = rw['url']
+                self.pushed_at[rw['name']] = rw['pushedAt']
+                if any(path[:4] == ('organization', 'repositories', 'nodes', n) for path in failed):
+                    continue
+                if rw.get('refs') and not rw['refs']['pageInfo']['hasNextPage']:
+                    self.tags[rw['name']] = [t['name'] for t in rw['refs']['nodes']]
+                if rw.get('build') is None:
+                    self.files[(rw['name'], "vidarrbuild.json")] = None
+                elif rw['build'].get('text') is not None:
+                    self.files[(rw['name'], "vidarrbuild.json")] = rw['build']['text'].encode()
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.prefetch_files(self.get_wdl_paths())
+        return repos
+
+    """ Find wdl files referenced in prefetched vidarrbuild.json files """
+    def get_wdl_paths(self) -> list:
+        wdl_paths = []
+        for (repo, file), content in self.files.items():
+            if file != "vidarrbuild.json" or content is None:
+                continue
+            try:
+                wf_info = json.loads(content)
+                wdl_paths.append((repo, wf_info['wdl']))
+            except (ValueError, TypeError, KeyError):
+                continue
+        return wdl_paths
+
+    """ Fetch files at HEAD for a list of (repo, path) tuples, page_size files per query. Files of a failed query
+        or of a repository with an error are not stored, a file which does not exist is stored as None """
+    def prefetch_files(self, file_list: list):
+        for start in range(0, len(file_list), self.page_size):
+            batch = file_list[start:start + self.page_size]
+            params = []
+            fields = []
+            variables = {'owner': self.organization}
+            for i, (repo, path) in enumerate(batch):
+                params.append(f'$n{i}: String!, $e{i}: String!')
+                fields.append(f'r{i}: repository(owner: $owner, name: $n{i}) '
+                              f'{{ object(expression: $e{i}) {{ ... on Blob {{ text }} }} }}')
+                variables[f'n{i}'] = repo
+                variables[f'e{i}'] = f'HEAD:{path}'
+            query = f'query($owner: String!, {", ".join(params)}) {{ {" ".join(fields)} }}'
+            data, failed = self.send_query(query, variables)
+            if data is None:
+                continue
+            for i, (repo, path) in enumerate(batch):
+                if any(path[0] == f'r{i}' for path in failed) or not data.get(f'r{i}'):
+                    continue
+                if data[f'r{i}'].get('object') is None:
+                    self.files[(repo, path)] = None
+                elif data[f'r{i}']['object'].get('text') is not None:
+                    self.files[(repo, path)] = data[f'r{i}']['object']['text'].encode()
+
+    """ Get file content, use prefetched data when available """
+    def get_file(self, workflow_repo: str, file: str, ref: str | None = None) -> tuple:
+        if ref is None and (workflow_repo, file) in self.files.keys():
+            return self.files[(workflow_repo, file)], True
+        return super().get_file(workflow_repo, file, ref)
+
+    """ Get tags from a Repository, use prefetched data when available """
+    def get_repo_tags(self, workflow_repo: str) -> list:
+        if workflow_repo in self.tags.keys():
+            return [t for t in self.tags[workflow_repo] if TAG_PATTERN.search(t) is not None]
+        return super().get_repo_tags(workflow_repo)
@@ -0,0 +1,107 @@
+"""
+   Mirror-backed collector for githubRepo. Workflow repositories are kept as bare mirror clones in a local
+   directory and refreshed with incremental fetches (in parallel), vidarrbuild.json, wdl files and tags are
+   then read with git plumbing from the mirrors. The list of repositories still comes from the REST API,
+   repositories not pushed to since the last sync are not fetched at all. If a repository can not be
+   mirrored (it is private, for instance), its data are requested from the API as before
+"""
+import base64
+import concurrent.futures
+import os
+from dataclasses import dataclass, field
+from git import Git
+from git.exc import GitCommandError
+import gsiMetrics
+from gsiRepository import githubRepo, TAG_PATTERN
+
+"""
+   pushed_at of the repository at the last sync is kept in the config of its mirror
+"""
+PUSHED_AT_KEY = "tracker.pushedat"
+
+
+@dataclass
+class mirrorRepo(githubRepo):
+    mirror_dir: str = "$HOME/.cache/workflowTracker/mirrors"
+    fetch_workers: int = 8
+    sync_filter: object = field(default=None, repr=False, compare=False)
+    synced: set = field(default_factory=set, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.mirror_dir = os.path.expanduser(os.path.expandvars(self.mirror_dir))
+
+    """ Environment for git: the token goes into an extra http header via GIT_CONFIG_* variables,
+        so it is neither on the command line nor stored in the mirror config """
+    def git_env(self) -> dict:
+        credentials = base64.b64encode(f'x-access-token:{self.token}'.encode()).decode()
+        return {"GIT_TERMINAL_PROMPT": "0",
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.https://github.com/.extraheader",
+                "GIT_CONFIG_VALUE_0": f'Authorization: Basic {credentials}'}
+
+    def mirror_path(self, repo: str) -> str:
+        return os.path.join(self.mirror_dir, f'{repo}.git')
+
+    """ Clone or fetch a single mirror, return True if the mirror is usable """
+    def sync_mirror(self, repo: str, repo_url: str) -> bool:
+        path = self.mirror_path(repo)
+        pushed_at = self.pushed_at.get(repo)
+        try:
+            if not os.path.isdir(path):
+                Git(self.mirror_dir).clone("--mirror", "--quiet", f'{repo_url}.git', path, env=self.git_env())
+                gsiMetrics.count("mirror_clones")
+            else:
+                g = Git(path)
+                try:
+                    last_pushed_at = g.config("--get", PUSHED_AT_KEY)
+                except GitCommandError:
+                    last_pushed_at = None
+                if pushed_at is not None and last_pushed_at == pushed_at:
+                    return True
+                g.fetch("--prune", "--quiet", "origin", env=self.git_env())
+                gsiMetrics.count("mirror_fetches")
+            if pushed_at is not None:
+                Git(path).config(PUSHED_AT_KEY, pushed_at)
+            return True
+        except GitCommandError:
+            print(f'WARNING: Could not mirror [{repo}], using Github API for it')
+            return False
+
+    """ Get the list of repositories from the API, then bring mirrors up to date in parallel. With sync_filter
+        (a callable), only mirrors of repositories it accepts are synced (a shard syncs its own part) """
+    def get_repo_list(self) -> dict:
+        repos = super().get_repo_list()
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        to_sync = [repo for repo in repos.keys() if self.sync_filter is None or self.sync_filter(repo)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.fetch_workers)) as executor:
+            results = executor.map(lambda repo: self.sync_mirror(repo, repos[repo]), to_sync)
+            self.synced = {repo for repo, ok in zip(to_sync, results) if ok}
+        return repos
+
+    """ Get file content at ref (HEAD if ref is None) from the mirror. The answer is definite if the file was
+        read or the tree at ref does not have it, a missing ref or a broken mirror is not a definite answer """
+    def get_file(self, workflow_repo: str, file: str, ref: str | None = None) -> tuple:
+        if workflow_repo not in self.synced:
+            return super().get_file(workflow_repo, file, ref)
+        g = Git(self.mirror_path(workflow_repo))
+        try:
+            return g.cat_file("blob", f'{ref or "HEAD"}:{file}', stdout_as_string=False), True
+        except GitCommandError:
+            pass
+        try:
+            listed = g.ls_tree(ref or "HEAD", "--", file)
+        except GitCommandError:
+            print(f'WARNING: Could not read {ref or "HEAD"} in the mirror of [{workflow_repo}]')
+            return None, False
+        if listed.split(" ")[1:2] == ["blob"]:
+            print(f'WARNING: Could not read {file} in the mirror of [{workflow_repo}]')
+            return None, False
+        return None, True
+
+    """ Get tags from the mirror """
+    def get_repo_tags(self, workflow_repo: str) -> list:
+        if workflow_repo not in self.synced:
+            return super().get_repo_tags(workflow_repo)
+        refs = Git(self.mirror_path(workflow_repo)).for_each_ref("--format=%(refname:short)", "refs/tags")
+        return [t for t in refs.split("\n") if t and TAG_PATTERN.search(t) is not None]
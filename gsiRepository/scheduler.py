@@ -0,0 +1,209 @@
+"""
+   Request scheduler for githubRepo. Every token has a budget taken from X-RateLimit-* headers (requests left
+   until the window resets) and a token bucket pacing its requests below the secondary rate limit, so requests
+   go out as fast as Github allows and not faster. Requests wait in a priority queue, critical ones (the list of
+   repositories, vidarrbuild.json) go first. With several tokens, each request uses the token with most budget
+   left. Rate limited responses (429, 403 with an exhausted budget, Retry-After or a rate limit message) are
+   retried after the wait Github asks for, on another token if one is available
+"""
+import heapq
+import itertools
+import json
+import re
+import threading
+import time
+import gsiMetrics
+
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+
+"""
+   Github allows 900 points per minute for REST requests (a GET costs one point) on top of the hourly limit,
+   a secondary limit without Retry-After asks for at least a minute of waiting
+"""
+DEFAULT_MAX_RATE = 15.0
+SECONDARY_BACKOFF = 60.0
+RATE_LIMIT_MESSAGE = re.compile(r'rate limit', re.IGNORECASE)
+
+
+"""
+   Message of an error response, Github sends {"message": ...} but proxies may answer with plain text
+"""
+def error_message(body: bytes | None) -> str:
+    if not body:
+        return ""
+    text = body.decode(errors="replace")
+    try:
+        result = json.loads(text)
+    except ValueError:
+        return text
+    return str(result.get('message', "")) if isinstance(result, dict) else text
+
+
+"""
+   Classic token bucket: capacity tokens at most, refilled at rate tokens per second
+"""
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.time()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self.refill(now)
+        return 0.0 if self.level >= 1 else (1 - self.level) / self.rate
+
+    def take(self, now: float):
+        self.refill(now)
+        self.level -= 1
+
+
+"""
+   Budget of a single token for a single resource (core, graphql). remaining is None until Github reports it
+"""
+class TokenBudget:
+    def __init__(self, token: str, max_rate: float | None = None):
+        self.token = token
+        self.remaining = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.bucket = TokenBucket(max_rate, max(1.0, max_rate)) if max_rate else None
+
+    """ Requests which may still be sent in this window """
+    def available(self, now: float) -> float:
+        if self.remaining is None or (self.reset_at is not None and now >= self.reset_at):
+            return float("inf")
+        return self.remaining - self.in_flight
+
+    """ Seconds until Github accepts requests with this token again """
+    def blocked_for(self, now: float) -> float:
+        wait = max(0.0, self.blocked_until - now)
+        if self.available(now) < 1:
+            wait = max(wait, self.reset_at - now if self.reset_at is not None else SECONDARY_BACKOFF)
+        return wait
+
+    """ Seconds until a request may be sent with this token, pacing included """
+    def wait_time(self, now: float) -> float:
+        wait = self.blocked_for(now)
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.wait_time(now))
+        return wait
+
+    """ Take budget from response headers: what Github counts is more accurate than our own count """
+    def update(self, headers: dict):
+        try:
+            if 'x-ratelimit-remaining' in headers.keys():
+                self.remaining = int(headers['x-ratelimit-remaining'])
+            if 'x-ratelimit-reset' in headers.keys():
+                self.reset_at = float(headers['x-ratelimit-reset'])
+        except ValueError:
+            pass
+
+
+class RequestScheduler:
+    def __init__(self, tokens: list, max_rate: float | None = DEFAULT_MAX_RATE, max_wait: float = 3600.0,
+                 max_retries: int = 5):
+        self.tokens = [t for t in tokens if t] or [""]
+        self.max_rate = max_rate
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.budgets = {}
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def budget(self, token: str, resource: str) -> TokenBudget:
+        if (token, resource) not in self.budgets.keys():
+            self.budgets[(token, resource)] = TokenBudget(token, self.max_rate)
+        return self.budgets[(token, resource)]
+
+    """ Pick the token which may be used first (the one with most budget left of these), return (budget, wait) """
+    def _pick(self, resource: str, now: float) -> tuple:
+        ranked = sorted([(self.budget(t, resource).wait_time(now), -self.budget(t, resource).available(now), n)
+                         for n, t in enumerate(self.tokens)])
+        wait, _, n = ranked[0]
+        return self.budget(self.tokens[n], resource), wait
+
+    """ Wait for a turn (in order of priority) and budget, return the budget of the token to use. If all tokens
+        are blocked for longer than max_wait, the request is let through and Github's answer is returned """
+    def acquire(self, priority: int = PRIORITY_NORMAL, resource: str = "core") -> TokenBudget:
+        ticket = (priority, next(self._sequence))
+        waited = False
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket:
+                    now = time.time()
+                    budget, wait = self._pick(resource, now)
+                    if wait <= 0 or budget.blocked_for(now) > self.max_wait:
+                        heapq.heappop(self._waiting)
+                        budget.in_flight += 1
+                        if budget.bucket is not None:
+                            budget.bucket.take(now)
+                        self._condition.notify_all()
+                        break
+                    waited = True
+                    self._condition.wait(min(wait, 5.0))
+                else:
+                    self._condition.wait(5.0)
+        if waited:
+            gsiMetrics.count("rate_limit_waits")
+        return budget
+
+    """ Update budget from a response, return seconds to wait before a retry, None if it was not rate limited """
+    def release(self, budget: TokenBudget, status: int, headers: dict, attempt: int,
+                message: str = "") -> float | None:
+        now = time.time()
+        with self._condition:
+            budget.in_flight -= 1
+            budget.update(headers)
+            retry_after = None
+            if status in (403, 429) and 'retry-after' in headers.keys():
+                try:
+                    retry_after = max(1.0, float(headers['retry-after']))
+                except ValueError:
+                    retry_after = SECONDARY_BACKOFF
+            elif status in (403, 429) and budget.remaining == 0:
+                retry_after = max(1.0, budget.reset_at - now) if budget.reset_at is not None else SECONDARY_BACKOFF
+            elif status == 429 or status == 403 and RATE_LIMIT_MESSAGE.search(message):
+                ''' Secondary limit without Retry-After (403 with budget left, only the message tells): wait at
+                    least a minute, longer with every attempt, other tokens may be used meanwhile '''
+                retry_after = SECONDARY_BACKOFF * 2 ** attempt
+            if retry_after is not None:
+                budget.blocked_until = max(budget.blocked_until, now + retry_after)
+            self._condition.notify_all()
+        return retry_after
+
+    """ Send a request with send(token) when a token is available, retry rate limited requests. The last
+        response is returned if retries run out or all tokens are blocked for longer than max_wait """
+    def execute(self, send, priority: int = PRIORITY_NORMAL, resource: str = "core"):
+        attempt = 0
+        while True:
+            budget = self.acquire(priority, resource)
+            try:
+                response = send(budget.token)
+            except:
+                with self._condition:
+                    budget.in_flight -= 1
+                    self._condition.notify_all()
+                raise
+            message = error_message(response.body) if response.status in (403, 429) else ""
+            retry_after = self.release(budget, response.status, response.headers, attempt, message)
+            if retry_after is None:
+                return response
+            with self._condition:
+                now = time.time()
+                wait = min(self.budget(t, resource).blocked_for(now) for t in self.tokens)
+            if attempt >= self.max_retries or wait > self.max_wait:
+                print(f'WARNING: Rate limit of Github API reached, giving up after {attempt + 1} attempt(s)')
+                return response
+            attempt += 1
+            gsiMetrics.count("rate_limit_retries")
+            if wait > 0:
+                print(f'INFO: Rate limit of Github API reached, retrying in {int(wait) + 1} seconds')
@@ -0,0 +1,97 @@
+"""
+   Tag index for workflow repositories. Tags are parsed once into sortable version keys: a "v" (or any other)
+   prefix is ignored, numbers are compared as numbers, pre-release suffixes (alpha, beta, rc, dev, pre, preview,
+   snapshot) sort before the release and any other suffix (2.0.1a, 2.0.1-hotfix) after it. Tags of each
+   repository are kept with the pushed_at of the repository they were read at (pushing a tag updates it), so
+   unchanged repositories are not asked for tags again, and the latest tag is found when tags are stored, so
+   queries for it take constant time
+"""
+import json
+import os
+import re
+import threading
+import gsiState
+
+INDEX_VERSION = 1
+VERSION = re.compile(r'(\d+(?:\.\d+)+)(.*)$')
+PRE_RELEASE = re.compile(r'(?<![a-z])(alpha|beta|rc|dev|pre|preview|snapshot)(?![a-z])', re.IGNORECASE)
+NATURAL = re.compile(r'(\d+)')
+
+
+"""
+   Sortable key of a tag: (numbers, 0 for pre-release / 1 for release / 2 for letter suffix, suffix, tag)
+"""
+def version_key(tag: str) -> tuple:
+    match = VERSION.search(tag)
+    if match is None:
+        return (), 0, (), tag
+    numbers = tuple(int(n) for n in match.group(1).split("."))
+    numbers = numbers + (0,) * max(0, 3 - len(numbers))
+    suffix = match.group(2)
+    rank = 1 if not suffix else 0 if PRE_RELEASE.search(suffix) else 2
+    suffix_key = tuple((0, int(part), "") if part.isdigit() else (1, 0, part.lower())
+                       for part in NATURAL.split(suffix) if part)
+    return numbers, rank, suffix_key, tag
+
+
+class TagIndex:
+    def __init__(self, path: str | None = None):
+        self.path = os.path.expanduser(os.path.expandvars(path)) if path else None
+        self.entries = {}
+        self.latest_keys = {}
+        self._lock = threading.Lock()
+        if self.path is None:
+            return
+        for repo, entry in self._read().items():
+            self._index(repo, entry['state'], entry['tags'])
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as tf:
+                index = json.load(tf)
+            return index['entries'] if index.get('version') == INDEX_VERSION else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            return {}
+
+    """ Find the latest tag, a pre-release is the latest only if there are no releases """
+    def _index(self, repo: str, state: str | None, tags: list):
+        keys = {tag: version_key(tag) for tag in tags}
+        releases = [tag for tag in tags if keys[tag][1] != 0]
+        latest = max(releases or tags, key=keys.get) if tags else None
+        self.entries[repo] = {'state': state, 'tags': tags, 'latest': latest}
+        self.latest_keys[repo] = keys[latest] if latest is not None else None
+
+    """ True if tags of the repository were read when it had this pushed_at """
+    def known(self, repo: str, state: str | None) -> bool:
+        with self._lock:
+            return state is not None and repo in self.entries.keys() and self.entries[repo]['state'] == state
+
+    def put(self, repo: str, state: str | None, tags: list):
+        with self._lock:
+            self._index(repo, state, list(tags))
+
+    def tags(self, repo: str) -> list:
+        with self._lock:
+            return list(self.entries[repo]['tags']) if repo in self.entries.keys() else []
+
+    """ Latest tag of a repository, None if it has no tags (or they were not read) """
+    def latest(self, repo: str) -> str | None:
+        with self._lock:
+            return self.entries[repo]['latest'] if repo in self.entries.keys() else None
+
+    """ True if the tag is (the same version as) the latest tag of the repository """
+    def is_latest(self, repo: str, tag: str) -> bool:
+        with self._lock:
+            latest_key = self.latest_keys.get(repo)
+        return latest_key is not None and version_key(tag)[:3] == latest_key[:3]
+
+    """ Write the index. Entries written by other runs meanwhile (shards) are kept, ours replace them """
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            entries = self._read()
+            entries.update({repo: {'state': e['state'], 'tags': e['tags']} for repo, e in self.entries.items()
+                            if e['state'] is not None})
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            gsiState.write_json(self.path, {'version': INDEX_VERSION, 'entries': entries})
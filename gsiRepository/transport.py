@@ -0,0 +1,184 @@
+"""
+   Transport layer for githubRepo. Sends requests to Github API and returns responses.
+   HttpTransport keeps persistent (keep-alive) connections in a pool and is the default,
+   CurlTransport runs curl without a shell and stays available as a fallback backend
+"""
+import gzip
+import http.client
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+import gsiMetrics
+
+MAX_REDIRECTS = 5
+
+
+"""
+   Response returned by all transports, header names are lower-case
+"""
+@dataclass
+class Response:
+    status: int
+    headers: dict = field(default_factory=dict)
+    body: bytes = b''
+
+
+"""
+   Decompress body if the server sent it compressed
+"""
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+"""
+   In-process HTTP client: connections are kept alive and re-used between requests (and threads),
+   responses are requested with gzip compression
+"""
+class HttpTransport:
+    def __init__(self, timeout: float = 30.0, pool_size: int = 8):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    """ Open a new connection """
+    def _connect(self, scheme: str, host: str):
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, timeout=self.timeout)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    """ Get an idle connection for host or open a new one """
+    def _acquire(self, scheme: str, host: str):
+        with self._lock:
+            pool = self._pools.setdefault((scheme, host), queue.LifoQueue())
+        try:
+            return pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(scheme, host), False
+
+    """ Return connection to the pool, close it if the pool is full """
+    def _release(self, scheme: str, host: str, conn):
+        pool = self._pools[(scheme, host)]
+        if pool.qsize() < self.pool_size:
+            pool.put(conn)
+        else:
+            conn.close()
+
+    """ Send a single request without following redirects """
+    def _send(self, url: str, headers: dict, method: str, data: bytes | None) -> Response:
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path + ("?" + parsed.query if parsed.query else "")
+        conn, reused = self._acquire(parsed.scheme, parsed.netloc)
+        start = time.time()
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            ''' Server closed idle keep-alive connection, try once more with a fresh one '''
+            conn = self._connect(parsed.scheme, parsed.netloc)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except:
+                conn.close()
+                raise
+        except:
+            conn.close()
+            raise
+        resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+        gsiMetrics.record_response(resp.status, resp_headers, len(body), time.time() - start)
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(parsed.scheme, parsed.netloc, conn)
+        return Response(resp.status, resp_headers, _decode_body(body, resp_headers.get('content-encoding', '')))
+
+    """ Send request, follow redirects like curl -L does """
+    def request(self, url: str, headers: dict, method: str = "GET", data: bytes | None = None) -> Response:
+        headers = dict(headers)
+        headers['Accept-Encoding'] = 'gzip'
+        host = urllib.parse.urlsplit(url).netloc
+        for _ in range(MAX_REDIRECTS):
+            response = self._send(url, headers, method, data)
+            if response.status not in (301, 302, 303, 307, 308) or 'location' not in response.headers:
+                return response
+            url = urllib.parse.urljoin(url, response.headers['location'])
+            if urllib.parse.urlsplit(url).netloc != host:
+                ''' Do not leak credentials to other hosts '''
+                headers.pop('Authorization', None)
+            if response.status == 303:
+                method, data = "GET", None
+        return response
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                while not pool.empty():
+                    pool.get_nowait().close()
+
+
+"""
+   Fallback transport, runs curl for every request. No shell is involved and headers
+   (including the token) are passed on stdin, so they do not show up on the command line
+"""
+class CurlTransport:
+    def __init__(self, timeout: float = 30.0, curl: str = "curl"):
+        self.timeout = timeout
+        self.curl = curl
+
+    def request(self, url: str, headers: dict, method: str = "GET", data: bytes | None = None) -> Response:
+        header_lines = "".join([f'{k}: {v}\n' for k, v in headers.items()])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            body_file = os.path.join(tmp_dir, "body")
+            cmd = [self.curl, "-s", "-L", "--compressed", "--max-time", str(self.timeout),
+                   "-X", method, "-H", "@-", "-D", "-", "-o", body_file]
+            if data is not None:
+                data_file = os.path.join(tmp_dir, "data")
+                with open(data_file, "wb") as df:
+                    df.write(data)
+                cmd.extend(["--data-binary", "@" + data_file])
+            cmd.append(url)
+            start = time.time()
+            raw_headers = subprocess.run(cmd, input=header_lines.encode(), stdout=subprocess.PIPE,
+                                         check=True).stdout.decode(errors='replace')
+            elapsed = time.time() - start
+            with open(body_file, "rb") as bf:
+                body = bf.read()
+        ''' With -L curl dumps headers of every hop, we need only the last block '''
+        status = 0
+        resp_headers = {}
+        for line in raw_headers.splitlines():
+            if line.startswith("HTTP/"):
+                status = int(line.split()[1])
+                resp_headers = {}
+            elif ":" in line:
+                key, value = line.split(":", 1)
+                resp_headers[key.strip().lower()] = value.strip()
+        gsiMetrics.record_response(status, resp_headers, len(body), elapsed)
+        return Response(status, resp_headers, body)
+
+    def close(self):
+        pass
+
+
+"""
+   Return transport for the configured backend
+"""
+def get_transport(backend: str = "http", timeout: float = 30.0):
+    if backend == "curl":
+        return CurlTransport(timeout)
+    if backend != "http":
+        print(f'WARNING: Unknown backend [{backend}], using http')
+    return HttpTransport(timeout)
@@ -0,0 +1,207 @@
+"""
+   Long-running tracker service. Refresh jobs (analysis-config, Github repositories) run on their own
+   schedules in a single background thread, the joined data are kept in memory as an immutable snapshot
+   and served over HTTP. Responses carry ETag and Last-Modified headers and conditional GETs are answered
+   with 304, the HTML page (and gzip-compressed bodies) are generated once per data version, on demand
+"""
+import email.utils
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import htmlRenderer
+
+
+"""
+   Immutable view of the data served by the service
+"""
+class Snapshot:
+    def __init__(self, data: dict, updated: float):
+        self.data = data
+        self.json = json.dumps(data).encode()
+        self.etag = '"' + hashlib.sha256(self.json).hexdigest()[:32] + '"'
+        self.updated = updated
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    """ Return body for a kind of document (json or html), optionally gzip-compressed. Bodies are built once """
+    def body(self, kind: str, compressed: bool = False) -> bytes:
+        with self._lock:
+            if (kind, False) not in self._bodies.keys():
+                self._bodies[(kind, False)] = self.json if kind == "json" else \
+                    htmlRenderer.convert2page(self.data, pretty=False).encode()
+            if compressed and (kind, True) not in self._bodies.keys():
+                self._bodies[(kind, True)] = gzip.compress(self._bodies[(kind, False)], 6)
+            return self._bodies[(kind, compressed)]
+
+
+"""
+   A refresh job: callable run every interval seconds. The callable returns True if the data changed
+"""
+class Job:
+    def __init__(self, name: str, interval: float, run):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_run = 0.0
+        self.last_run = None
+        self.last_seconds = None
+        self.last_error = None
+
+
+class TrackerService:
+    def __init__(self, jobs: list, build, on_update=None):
+        self.jobs = jobs
+        self.build = build
+        self.on_update = on_update
+        self.snapshot = None
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._thread = None
+
+    """ Run jobs which are due, rebuild the snapshot if any of them changed the data """
+    def run_due(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        changed = False
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            start = time.time()
+            try:
+                changed = job.run() or changed
+                job.last_error = None
+            except Exception as err:
+                job.last_error = str(err)
+                print(f'ERROR: Refresh of {job.name} failed: {err}')
+            job.last_run = start
+            job.last_seconds = time.time() - start
+            job.next_run = start + job.interval
+        if changed or self.snapshot is None:
+            self.update(self.build())
+        return changed
+
+    """ Swap in new data, if they differ from the data being served """
+    def update(self, data: dict):
+        snapshot = Snapshot(data, time.time())
+        if self.snapshot is not None and self.snapshot.etag == snapshot.etag:
+            return
+        self.snapshot = snapshot
+        print(f'INFO: Serving {len(data)} workflows, version {snapshot.etag}')
+        if self.on_update is not None:
+            self.on_update(data)
+
+    def loop(self):
+        while not self._stop.is_set():
+            self.run_due()
+            next_run = min(job.next_run for job in self.jobs) if self.jobs else time.time() + 60
+            self._stop.wait(max(1.0, next_run - time.time()))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {'started': self.started,
+                'version': self.snapshot.etag.strip('"') if self.snapshot else None,
+                'updated': self.snapshot.updated if self.snapshot else None,
+                'workflows': len(self.snapshot.data) if self.snapshot else 0,
+                'jobs': {job.name: {'interval': job.interval, 'last_run': job.last_run,
+                                    'last_seconds': job.last_seconds, 'next_run': job.next_run,
+                                    'last_error': job.last_error} for job in self.jobs}}
+
+
+"""
+   Paths served and the kind of document for each of them
+"""
+ROUTES = {'/': "html", '/gsi_workflows.html': "html", '/gsi_workflows.json': "json"}
+CONTENT_TYPES = {'html': "text/html; charset=utf-8", 'json': "application/json"}
+GZIP_SUFFIX = '-gzip"'
+
+
+def make_handler(service: TrackerService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "workflowTracker"
+
+        def send_body(self, status: int, body: bytes, headers: dict, head_only: bool = False):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head_only:
+                self.wfile.write(body)
+
+        """ True if the client already has this version (in any encoding) """
+        def not_modified(self, snapshot: Snapshot) -> bool:
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                tags = [t.strip().removeprefix("W/").replace(GZIP_SUFFIX, '"') for t in if_none_match.split(",")]
+                return "*" in tags or snapshot.etag in tags
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since is not None:
+                try:
+                    since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+                return int(snapshot.updated) <= since
+            return False
+
+        def do_GET(self, head_only: bool = False):
+            path = self.path.split("?")[0]
+            if path == "/status":
+                body = json.dumps(service.status()).encode()
+                self.send_body(200, body, {'Content-Type': CONTENT_TYPES['json'], 'Cache-Control': "no-store"},
+                               head_only)
+                return
+            if path not in ROUTES.keys():
+                self.send_body(404, b"Not Found\n", {'Content-Type': "text/plain"}, head_only)
+                return
+            snapshot = service.snapshot
+            if snapshot is None:
+                self.send_body(503, b"Data are not ready yet\n", {'Content-Type': "text/plain", 'Retry-After': "10"},
+                               head_only)
+                return
+            compressed = "gzip" in self.headers.get("Accept-Encoding", "")
+            headers = {'ETag': snapshot.etag[:-1] + GZIP_SUFFIX if compressed else snapshot.etag,
+                       'Last-Modified': email.utils.formatdate(snapshot.updated, usegmt=True),
+                       'Cache-Control': "no-cache",
+                       'Vary': "Accept-Encoding"}
+            if self.not_modified(snapshot):
+                self.send_body(304, b"", headers, True)
+                return
+            kind = ROUTES[path]
+            headers['Content-Type'] = CONTENT_TYPES[kind]
+            if compressed:
+                headers['Content-Encoding'] = "gzip"
+            self.send_body(200, snapshot.body(kind, compressed), headers, head_only)
+
+        def do_HEAD(self):
+            self.do_GET(head_only=True)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+"""
+   Start refresh jobs and serve data until interrupted
+"""
+def serve(service: TrackerService, host: str = "127.0.0.1", port: int = 8080):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    service.start()
+    print(f'INFO: Serving on http://{host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("INFO: Stopping")
+    finally:
+        service.stop()
+        server.server_close()
@@ -0,0 +1,84 @@
+"""
+   Sharded runs: olive files and workflow repositories are split into N parts by a stable hash of their
+   names, every shard (a task of an array job, for instance) processes one part and writes a partial result.
+   Partials are merged into the same data a single run produces, in any order and with some shards missing
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+
+PARTIAL_VERSION = 1
+SHARD_PATTERN = re.compile(r'^(\d+)/(\d+)$')
+
+
+"""
+   Parse shard specification i/N (i is 1-based, like SGE_TASK_ID of an array job), return (i, N)
+"""
+def parse_shard(spec: str) -> tuple:
+    match = SHARD_PATTERN.match(spec.strip())
+    if match is None:
+        raise ValueError(f'Shard should be given as i/N, got [{spec}]')
+    index, total = int(match.group(1)), int(match.group(2))
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError(f'Shard index should be between 1 and {total}, got [{spec}]')
+    return index, total
+
+
+"""
+   Return 1-based shard of a key. The hash does not depend on the process (unlike hash()), the host or
+   the order keys come in, so every shard of a run agrees on the partition
+"""
+def shard_of(key: str, total: int) -> int:
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big") % total + 1
+
+
+def in_shard(key: str, index: int, total: int) -> bool:
+    return shard_of(key, total) == index
+
+
+"""
+   Partial file name for a shard: gsi_workflows.json -> gsi_workflows.shard-2-of-8.json
+"""
+def partial_path(output_json: str, index: int, total: int) -> str:
+    return f'{os.path.splitext(output_json)[0]}.shard-{index}-of-{total}.json'
+
+
+def partial_glob(output_json: str) -> list:
+    return sorted(glob.glob(f'{glob.escape(os.path.splitext(output_json)[0])}.shard-*-of-*.json'))
+
+
+"""
+   Load partials, return (partials sorted by shard index, indices of missing shards). Partials of another
+   shard count or a repeated shard (a re-submitted task) are skipped, so the result does not depend on
+   the order of files
+"""
+def load_partials(paths: list) -> tuple:
+    partials = {}
+    total = None
+    for path in sorted(paths):
+        try:
+            with open(path, "r") as pf:
+                partial = json.load(pf)
+        except (OSError, ValueError):
+            print(f'WARNING: Failed to load partial result {path}, skipping it')
+            continue
+        if not isinstance(partial, dict) or partial.get('version') != PARTIAL_VERSION:
+            print(f'WARNING: Partial result {path} was written by a different version, skipping it')
+            continue
+        index, n_shards = partial['shard']
+        if total is None:
+            total = n_shards
+        elif n_shards != total:
+            print(f'WARNING: {path} is a shard of {n_shards}, not of {total}, skipping it')
+            continue
+        if index in partials.keys():
+            print(f'WARNING: Shard {index} was loaded already, skipping {path}')
+            continue
+        partials[index] = partial
+    missing = [i for i in range(1, total + 1) if i not in partials.keys()] if total else []
+    commits = {p['commit'] for p in partials.values()}
+    if len(commits) > 1:
+        print(f'WARNING: Shards were run on different analysis-config commits: {", ".join(sorted(map(str, commits)))}')
+    return [partials[i] for i in sorted(partials.keys())], missing
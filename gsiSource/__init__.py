@@ -0,0 +1,74 @@
+"""
+   Functions for accessing files of the analysis-config repository through git
+"""
+import fnmatch
+import os
+from git import Git
+
+
+"""
+   Return blob SHAs of files under subdirs as recorded in the git index, keyed by path (joined with repo_dir
+   the same way collect_olives does it). Files with unstaged changes are left out, their content is not in the index
+"""
+def index_blob_shas(repo_dir: str, subdirs: list) -> dict:
+    shas = {}
+    try:
+        g = Git(repo_dir)
+        staged = g.ls_files("-s", "--", *subdirs)
+        modified = set(g.diff("--name-only", "--", *subdirs).split("\n"))
+    except:
+        print(f'WARNING: Could not read git index of {repo_dir}')
+        return shas
+    for line in staged.split("\n"):
+        if "\t" not in line:
+            continue
+        info, path = line.split("\t", 1)
+        if path in modified:
+            continue
+        shas["/".join([repo_dir, path])] = info.split()[1]
+    return shas
+
+
+"""
+   Read-only view of analysis-config at a given ref, served straight from the git object database.
+   Files are listed with one ls-tree and their contents are streamed through a single persistent
+   git cat-file --batch process, so there is no checkout and no I/O in the working tree. Paths look
+   like the ones glob returns for a checkout, so it can be used in place of glob-based readers.
+   Without a ref the source starts empty, apply_change() moves it along a history of changes
+"""
+class GitObjectSource:
+    def __init__(self, repo_dir: str, ref: str | None, subdirs: tuple = ("vidarr", "shesmu")):
+        self.repo_dir = repo_dir
+        self.git = Git(repo_dir)
+        self.blob_shas = {}
+        self.commit = None
+        if ref is None:
+            return
+        self.commit = self.git.rev_parse("--verify", f'{ref}^{{commit}}')
+        listing = self.git.ls_tree("-r", "-z", "--full-tree", self.commit, "--", *subdirs)
+        for entry in listing.split("\0"):
+            if "\t" not in entry:
+                continue
+            info, path = entry.split("\t", 1)
+            mode, obj_type, sha = info.split()
+            if obj_type == "blob":
+                self.blob_shas["/".join([repo_dir, path])] = sha
+
+    """ Return files in subdir (a path starting with repo_dir, as used with glob) matching pattern """
+    def glob(self, subdir: str, pattern: str) -> list:
+        subdir = subdir.rstrip("/")
+        return [path for path in self.blob_shas.keys()
+                if os.path.dirname(path) == subdir and fnmatch.fnmatchcase(os.path.basename(path), pattern)]
+
+    """ Return text of a file """
+    def read(self, path: str) -> str:
+        sha, obj_type, size, data = self.git.get_object_data(self.blob_shas[path])
+        return data.decode("utf-8", errors="replace")
+
+    """ Update the listing with a change of a file (path relative to repo), None sha means file was deleted """
+    def apply_change(self, rel_path: str, sha: str | None):
+        path = "/".join([self.repo_dir, rel_path])
+        if sha is None:
+            self.blob_shas.pop(path, None)
+        else:
+            self.blob_shas[path] = sha
@@ -0,0 +1,86 @@
+"""
+   Functions for handling state of incremental runs. The state file records per-repo data keyed
+   by pushed_at and fingerprints of the data joined for each workflow, so that the next run only
+   re-processes what has changed. Olives are re-used through the parse cache in gsiOlive.
+   All output, cache and state files are written atomically with the functions here
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+STATE_VERSION = 4
+
+"""
+   umask of the process, it can only be read by setting it, so it is read once at import and not from
+   worker threads (the service writes files from its refresh thread)
+"""
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+"""
+   Load state from a file, return an empty state if there is no (usable) state file
+"""
+def load_state(path: str) -> dict:
+    empty_state = {'version': STATE_VERSION, 'repos': {}, 'joined': {}}
+    if not path or not os.path.isfile(path):
+        return empty_state
+    try:
+        with open(path, "r") as sf:
+            state = json.load(sf)
+    except (OSError, ValueError):
+        print(f'WARNING: Failed to load state from {path}, running full update')
+        return empty_state
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        print(f'WARNING: State file {path} was written by a different version, running full update')
+        return empty_state
+    return state
+
+
+"""
+   Open a temporary file next to path and move it in place when the block completes, so readers never see
+   partial files. The file gets the permissions of a newly created one, it is removed if writing fails
+"""
+@contextlib.contextmanager
+def atomic_file(path: str, mode: str = "w"):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp_")
+    try:
+        os.fchmod(fd, 0o666 & ~UMASK)
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as tf:
+            yield tf
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+"""
+   Write text or bytes into a file atomically
+"""
+def write_atomic(path: str, data: str | bytes):
+    with atomic_file(path, "wb" if isinstance(data, bytes) else "w") as tf:
+        tf.write(data)
+
+
+"""
+   Write json data into a file atomically
+"""
+def write_json(path: str, data):
+    with atomic_file(path) as tf:
+        json.dump(data, tf)
+
+
+def save_state(path: str, state: dict):
+    state['version'] = STATE_VERSION
+    write_json(path, state)
+
+
+"""
+   Fingerprint of json-serializable data (sets are sorted), used to detect changes of joined data
+"""
+def fingerprint(*data) -> str:
+    serialized = json.dumps(data, sort_keys=True, default=sorted)
+    return hashlib.sha256(serialized.encode()).hexdigest()
@@ -0,0 +1,198 @@
+"""
+   SQLite store for results. Every run is kept as a snapshot: workflows with their latest tag and url,
+   instances, tags and olives per instance and data/code modules, all tagged with run_id. Indexes on
+   module, tag and olive make reverse lookups (module -> workflows, olive -> workflows, tag -> instances)
+   fast, two runs can be compared with plain SQL
+"""
+import datetime
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, created TEXT NOT NULL, source TEXT);
+CREATE TABLE IF NOT EXISTS workflows (run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                                      workflow TEXT NOT NULL, latest_tag TEXT, url TEXT,
+                                      PRIMARY KEY (run_id, workflow));
+CREATE TABLE IF NOT EXISTS instances (run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                                      workflow TEXT NOT NULL, instance TEXT NOT NULL,
+                                      PRIMARY KEY (run_id, workflow, instance));
+CREATE TABLE IF NOT EXISTS tags (run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                                 workflow TEXT NOT NULL, instance TEXT NOT NULL, tag TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS olives (run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                                   workflow TEXT NOT NULL, instance TEXT NOT NULL, olive TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS modules (run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+                                    workflow TEXT NOT NULL, kind TEXT NOT NULL, module TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS tags_by_tag ON tags (tag, run_id);
+CREATE INDEX IF NOT EXISTS tags_by_workflow ON tags (run_id, workflow);
+CREATE INDEX IF NOT EXISTS olives_by_olive ON olives (olive, run_id);
+CREATE INDEX IF NOT EXISTS olives_by_workflow ON olives (run_id, workflow);
+CREATE INDEX IF NOT EXISTS modules_by_module ON modules (module, run_id);
+CREATE INDEX IF NOT EXISTS modules_by_workflow ON modules (run_id, workflow);
+"""
+
+"""
+   Keys of joined data which are not instances
+"""
+WORKFLOW_KEYS = ('latest_tag', 'url', 'data_modules', 'code_modules')
+
+"""
+   Snapshot tables compared by diff_runs, with columns (besides run_id) which identify a row
+"""
+SNAPSHOT_TABLES = {'workflows': ('workflow', 'latest_tag', 'url'),
+                   'instances': ('workflow', 'instance'),
+                   'tags': ('workflow', 'instance', 'tag'),
+                   'olives': ('workflow', 'instance', 'olive'),
+                   'modules': ('workflow', 'kind', 'module')}
+
+
+"""
+   Open (and create, if needed) the store
+"""
+def open_store(path: str) -> sqlite3.Connection:
+    path = os.path.expanduser(os.path.expandvars(path))
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+"""
+   Record joined data (the content of gsi_workflows.json) as a new snapshot, return its run_id
+"""
+def record_run(conn: sqlite3.Connection, vetted_data: dict, source: str = None) -> int:
+    created = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    workflows, instances, tags, olives, modules = [], [], [], [], []
+    with conn:
+        run_id = conn.execute("INSERT INTO runs (created, source) VALUES (?, ?)", (created, source)).lastrowid
+        for wf, entry in vetted_data.items():
+            workflows.append((run_id, wf, entry.get('latest_tag'), entry.get('url')))
+            for kind in ('data', 'code'):
+                modules.extend([(run_id, wf, kind, m) for m in entry.get(f'{kind}_modules', [])])
+            for inst in entry.keys():
+                if inst in WORKFLOW_KEYS or not isinstance(entry[inst], dict):
+                    continue
+                instances.append((run_id, wf, inst))
+                tags.extend([(run_id, wf, inst, t) for t in entry[inst].get('tags', [])])
+                olives.extend([(run_id, wf, inst, o) for o in entry[inst].get('olives', [])])
+        conn.executemany("INSERT INTO workflows VALUES (?, ?, ?, ?)", workflows)
+        conn.executemany("INSERT INTO instances VALUES (?, ?, ?)", instances)
+        conn.executemany("INSERT INTO tags VALUES (?, ?, ?, ?)", tags)
+        conn.executemany("INSERT INTO olives VALUES (?, ?, ?, ?)", olives)
+        conn.executemany("INSERT INTO modules VALUES (?, ?, ?, ?)", modules)
+    return run_id
+
+
+"""
+   Return the list of runs as (run_id, created, source, number of workflows)
+"""
+def list_runs(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT r.run_id, r.created, r.source, COUNT(w.workflow) FROM runs r "
+                        "LEFT JOIN workflows w ON w.run_id = r.run_id GROUP BY r.run_id ORDER BY r.run_id").fetchall()
+
+
+def latest_run(conn: sqlite3.Connection) -> int | None:
+    return conn.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+
+
+"""
+   Condition for a value column: exact match, or a glob pattern if there are wildcards (*, ?, [)
+"""
+def _match(column: str, value: str) -> str:
+    return f'{column} GLOB ?' if any(c in value for c in "*?[") else f'{column} = ?'
+
+
+"""
+   Reverse lookups, each returns a list of tuples for a single run
+"""
+def workflows_by_module(conn: sqlite3.Connection, module: str, run_id: int) -> list:
+    return conn.execute(f'SELECT DISTINCT workflow, kind, module FROM modules WHERE {_match("module", module)} '
+                        'AND run_id = ? ORDER BY workflow, module', (module, run_id)).fetchall()
+
+
+def workflows_by_olive(conn: sqlite3.Connection, olive: str, run_id: int) -> list:
+    return conn.execute(f'SELECT DISTINCT workflow, instance, olive FROM olives WHERE {_match("olive", olive)} '
+                        'AND run_id = ? ORDER BY workflow, instance, olive', (olive, run_id)).fetchall()
+
+
+def instances_by_tag(conn: sqlite3.Connection, tag: str, run_id: int, workflow: str = None) -> list:
+    query = f'SELECT DISTINCT workflow, instance, tag FROM tags WHERE {_match("tag", tag)} AND run_id = ?'
+    params = [tag, run_id]
+    if workflow:
+        query += f' AND {_match("workflow", workflow)}'
+        params.append(workflow)
+    return conn.execute(query + ' ORDER BY workflow, instance, tag', params).fetchall()
+
+
+"""
+   All stored data for a workflow, as (what, instance or kind, value) tuples
+"""
+def workflow_info(conn: sqlite3.Connection, workflow: str, run_id: int) -> list:
+    return conn.execute("SELECT 'latest_tag', '', latest_tag FROM workflows WHERE workflow = ? AND run_id = ? "
+                        "UNION ALL SELECT 'url', '', url FROM workflows WHERE workflow = ? AND run_id = ? "
+                        "UNION ALL SELECT 'tag', instance, tag FROM tags WHERE workflow = ? AND run_id = ? "
+                        "UNION ALL SELECT 'olive', instance, olive FROM olives WHERE workflow = ? AND run_id = ? "
+                        "UNION ALL SELECT 'module', kind, module FROM modules WHERE workflow = ? AND run_id = ?",
+                        (workflow, run_id) * 5).fetchall()
+
+
+"""
+   Compare two snapshots, return (change, table, values...) tuples where change is + (only in new_run)
+   or - (only in old_run)
+"""
+def diff_runs(conn: sqlite3.Connection, old_run: int, new_run: int) -> list:
+    changes = []
+    for table, columns in SNAPSHOT_TABLES.items():
+        cols = ", ".join(columns)
+        for change, first, second in (('-', old_run, new_run), ('+', new_run, old_run)):
+            rows = conn.execute(f'SELECT {cols} FROM {table} WHERE run_id = ? EXCEPT '
+                                f'SELECT {cols} FROM {table} WHERE run_id = ? ORDER BY 1', (first, second)).fetchall()
+            changes.extend([(change, table) + tuple(r) for r in rows])
+    return changes
+
+
+"""
+   Delete all but the newest keep runs (their rows go with them), return the number of deleted runs
+"""
+def prune_runs(conn: sqlite3.Connection, keep: int) -> int:
+    with conn:
+        return conn.execute("DELETE FROM runs WHERE run_id NOT IN "
+                            "(SELECT run_id FROM runs ORDER BY run_id DESC LIMIT ?)", (keep,)).rowcount
+
+
+"""
+   Run the query subcommand, print results as tab-separated lines
+"""
+def run_query(args) -> int:
+    db_path = os.path.expanduser(os.path.expandvars(args.db))
+    if not os.path.isfile(db_path):
+        print(f'ERROR: There is no results store at {args.db}')
+        return 1
+    conn = open_store(db_path)
+    try:
+        if args.runs:
+            rows = list_runs(conn)
+        elif args.diff:
+            rows = diff_runs(conn, args.diff[0], args.diff[1])
+        else:
+            run_id = args.run if args.run is not None else latest_run(conn)
+            if run_id is None:
+                print("ERROR: There are no runs in the results store")
+                return 1
+            if args.module:
+                rows = workflows_by_module(conn, args.module, run_id)
+            elif args.olive:
+                rows = workflows_by_olive(conn, args.olive, run_id)
+            elif args.tag:
+                rows = instances_by_tag(conn, args.tag, run_id, args.workflow)
+            elif args.workflow:
+                rows = workflow_info(conn, args.workflow, run_id)
+            else:
+                print("ERROR: Nothing to query, use one of --module, --olive, --tag, --workflow, --runs or --diff")
+                return 1
+    finally:
+        conn.close()
+    for row in rows:
+        print("\t".join(["" if v is None else str(v) for v in row]))
+    return 0
@@ -6,6 +6,23 @@
 import re
 import os
 import glob
+import hashlib
+import posixpath
+import threading
+import concurrent.futures
+import gsiMetrics
+
+"""
+   Patterns for module strings and wdl files, compiled once
+"""
+MODULE_LINE = re.compile("module", re.IGNORECASE)
+MODULE_ASSIGNMENT = re.compile("module.*[:=].*\"(.+)\"", re.IGNORECASE)
+QUOTED = re.compile("\"(.+)\"")
+NOT_MODULE = re.compile('[$()|}{]')
+VERSIONED = re.compile(r'/\d')
+DATA_MODULE = re.compile(r'hg\d+|mm\d+|hs\d+|data')
+WDL_IMPORT = re.compile(r'^\s*import\s+(["\'])(.+?)\1', re.MULTILINE)
+RAW_URL = re.compile(r'^https://raw\.githubusercontent\.com/([^/]+)/([^/]+)/([^/]+)/(.+)$')
 
 """
    Vet a Workflow path. extract basename, remove extension. Get rid of prefixes
@@ -23,17 +40,18 @@ def _vet_wf_name(path: str, prefixes: list):
 
 
 """ 
-   Static method for getting Workflow names from .vidarrworkflow files
+   Static method for getting Workflow names from .vidarrworkflow files, listed from a source
+   (gsiSource.GitObjectSource) if it is passed, otherwise from the working tree
 """
 
 
-def extract_wf_names(repo_dir: str, instances_list: list, prefixes: list):
+def extract_wf_names(repo_dir: str, instances_list: list, prefixes: list, source=None):
     if repo_dir and os.path.isdir(repo_dir):
         wf_hash = {}
         for inst in instances_list:
             wf_names = []
             subdir = "/".join([repo_dir, "vidarr", inst, "workflows/"])
-            wf_files = glob.glob("/".join([subdir, "*.vidarrworkflow"]))
+            wf_files = source.glob(subdir, "*.vidarrworkflow") if source else glob.glob("/".join([subdir, "*.vidarrworkflow"]))
             print(f'INFO: We have {len(wf_files)} vidarrworkflow files for {inst}')
             for wf in wf_files:
                 wf_names.append(_vet_wf_name(wf, prefixes))
@@ -52,19 +70,18 @@ def extract_wf_names(repo_dir: str, instances_list: list, prefixes: list):
 def parse_module_strings(m_strings: list):
     data_modules = []
     code_modules = []
-    not_mods = re.compile('[$()|}{]')
     for m_string in m_strings:
-        wf_check = re.search("module.*[:=].*\"(.+)\"", m_string, re.IGNORECASE)
+        wf_check = MODULE_ASSIGNMENT.search(m_string)
         if wf_check is not None:
             next_mod_string = wf_check
         else:
-            next_mod_string = re.search("\"(.+)\"", m_string)
+            next_mod_string = QUOTED.search(m_string)
         if next_mod_string is not None:
             modules = next_mod_string.group(1).split(" ")
             for mod in modules:
                 vetted_mod = mod.replace("\"", "")
-                if not_mods.search(vetted_mod) is None and re.search(r'/\d', vetted_mod) is not None:
-                    if re.search(r'hg\d+|mm\d+|hs\d+|data', vetted_mod) is not None:
+                if NOT_MODULE.search(vetted_mod) is None and VERSIONED.search(vetted_mod) is not None:
+                    if DATA_MODULE.search(vetted_mod) is not None:
                         data_modules.append(vetted_mod)
                     else:
                         code_modules.append(vetted_mod)
@@ -76,12 +93,115 @@ def parse_module_strings(m_strings: list):
 """
 
 
-def parse_workflow(workflow: str, wf_lines: list):
-    module_lines = []
-    for w_line in wf_lines:
-        next_mod_string = re.search("module.*", w_line, re.IGNORECASE)
-        if next_mod_string is not None and re.search(r'/\d', w_line) is not None:
-            module_lines.append(w_line)
-    if len(module_lines) == 0:
+def parse_workflow(workflow: str, wf_lines: list, warn: bool = True):
+    gsiMetrics.files_parsed("wdl")
+    module_lines = [w_line for w_line in wf_lines if MODULE_LINE.search(w_line) is not None and
+                    VERSIONED.search(w_line) is not None]
+    if len(module_lines) == 0 and warn:
         print(f'WARNING: No module lines for {workflow}')
     return parse_module_strings(module_lines)
+
+
+"""
+   Git blob SHA of file content, the same git and Github report for the file
+"""
+
+
+def blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+"""
+   Module extraction for a workflow and the sub-workflows it imports. Relative imports are read from the same
+   repository (at the same ref), imports of raw.githubusercontent.com urls of the organization from the repository
+   and ref in the url, other imports are not followed. Imports of a level are fetched concurrently through
+   the repository handler (githubRepo or a subclass), parsed files are memoized by (repo, path, blob SHA), so
+   a sub-workflow imported by many workflows is fetched and parsed once per run
+"""
+
+
+class ModuleExtractor:
+    def __init__(self, gh_repo, workers: int = 4):
+        self.gh_repo = gh_repo
+        self.workers = workers
+        self.parsed = {}
+        self.fetched = {}
+        self._lock = threading.Lock()
+
+    """ Return (repo, ref, path) an import refers to, None if it can not be followed """
+    def resolve(self, repo: str, ref: str | None, path: str, imported: str) -> tuple | None:
+        if "://" in imported:
+            match = RAW_URL.match(imported)
+            if match is None or match.group(1).lower() != self.gh_repo.organization.lower():
+                return None
+            return match.group(2), match.group(3), match.group(4)
+        return repo, ref, posixpath.normpath(posixpath.join(posixpath.dirname(path), imported)).lstrip("/")
+
+    """ Fetch a file once per run, return its content. The first caller fetches, concurrent callers wait for it """
+    def fetch(self, repo: str, ref: str | None, path: str) -> bytes | None:
+        with self._lock:
+            future = self.fetched.get((repo, ref, path))
+            if future is None:
+                future = self.fetched[(repo, ref, path)] = concurrent.futures.Future()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            try:
+                future.set_result(self.gh_repo.get_file(repo, path, ref)[0])
+            except Exception as err:
+                ''' Waiting callers get the error, later ones try again '''
+                with self._lock:
+                    self.fetched.pop((repo, ref, path), None)
+                future.set_exception(err)
+        return future.result()
+
+    """ Return (modules, imports) of a file, parse it only if this blob was not parsed before """
+    def parse(self, repo: str, path: str, content: bytes) -> tuple:
+        key = (repo, path, blob_sha(content))
+        with self._lock:
+            if key in self.parsed.keys():
+                gsiMetrics.count("wdl_memo_hits")
+                return self.parsed[key]
+        text = str(content, encoding='utf-8')
+        result = (parse_workflow(f'{repo}:{path}', text.split("\n"), warn=False),
+                  [match.group(2) for match in WDL_IMPORT.finditer(text)])
+        with self._lock:
+            self.parsed[key] = result
+        return result
+
+    """ Extract modules of a workflow wdl (content read at HEAD) and of all wdl files it imports. Modules of
+        imported files follow modules of the workflow itself, which are returned as parse_workflow returns them.
+        imports lists (repo, ref, path) of all followed imports, so that callers know which repositories to watch """
+    def extract(self, repo: str, path: str, content: bytes) -> dict:
+        modules, imports = self.parse(repo, path, content)
+        merged = {kind: list(modules[kind]) for kind in ('data_modules', 'code_modules')}
+        seen = {(repo, None, path)}
+        pending = [(repo, None, path, imports)]
+        while pending:
+            targets = []
+            for f_repo, f_ref, f_path, f_imports in pending:
+                for imported in f_imports:
+                    target = self.resolve(f_repo, f_ref, f_path, imported)
+                    if target is not None and target not in seen:
+                        seen.add(target)
+                        targets.append(target)
+            if len(targets) == 0:
+                break
+            gsiMetrics.count("wdl_imports", len(targets))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(targets)))) as ex:
+                contents = list(ex.map(lambda target: self.fetch(*target), targets))
+            pending = []
+            for (t_repo, t_ref, t_path), t_content in zip(targets, contents):
+                if t_content is None:
+                    print(f'WARNING: Could not read {t_path} imported by a wdl in [{repo}]')
+                    continue
+                modules, imports = self.parse(t_repo, t_path, t_content)
+                for kind in merged.keys():
+                    merged[kind].extend([m for m in modules[kind] if m not in merged[kind]])
+                pending.append((t_repo, t_ref, t_path, imports))
+        if len(merged['data_modules']) == 0 and len(merged['code_modules']) == 0:
+            print(f'WARNING: No module lines for {repo}')
+        merged['imports'] = sorted([list(target) for target in seen if target != (repo, None, path)],
+                                   key=lambda target: [str(part) for part in target])
+        return merged
@@ -1,10 +1,24 @@
 """
    This module provides functions for converting json to html and formatting
    it either as a table or complete HTML page. All hardcoded stuff is here!
+   Rows are rendered one at a time and written straight to the output, so the page
+   is never held in memory as a whole
 """
-from json2html import *
-from bs4 import BeautifulSoup as Bs
 import datetime
+import html
+import io
+import gsiMetrics
+import gsiState
+
+COLUMNS = ["Workflow/alias", "RUO Tags", "Clinical Tags", "Latest Tag", "Repository",
+           "Software Modules", "Data Modules", "RUO Olives", "Clinical Olives"]
+
+PAGE_HEAD = "<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>Production Workflows</title>" \
+            "<style> table {border-collapse: separate; border-spacing: 0;} " \
+            "th {position: sticky; top: 0; padding: 4px; background-color: #009879; color: #ffffff; " \
+            "border-bottom: 2px solid #ddd; text-align: left;} " \
+            "td {padding: 4px; text-align: left; border-bottom: 1px solid #ddd; }</style>" \
+            "</head><body>"
 
 
 """
@@ -17,31 +31,101 @@ def today_date() -> str:
 
 
 """
-   Return JSON rendered into HTML table
+   Re-wrap data for a single workflow into a row, values are either strings or lists of strings
+"""
+def _rewrap(wf: str, entry: dict) -> list:
+    return [wf,
+            entry['research']['tags'] if 'research' in entry.keys() else [],
+            entry['clinical']['tags'] if 'clinical' in entry.keys() else [],
+            entry['latest_tag'] if entry['latest_tag'] else " ",
+            entry['url'] if entry['url'] else " ",
+            entry['code_modules'],
+            entry['data_modules'],
+            entry['research']['olives'] if 'research' in entry.keys() else [],
+            entry['clinical']['olives'] if 'clinical' in entry.keys() else []]
+
+
+"""
+   Render a single cell, lists become unordered lists. Everything is escaped,
+   the repository column becomes a link
+"""
+def _render_cell(value, link: bool = False) -> str:
+    if isinstance(value, list):
+        if len(value) == 0:
+            return "<td></td>"
+        return "<td><ul>" + "".join([f'<li>{html.escape(str(v))}</li>' for v in value]) + "</ul></td>"
+    if link and value.strip():
+        return f'<td><a href="{html.escape(value)}">{html.escape(value)}</a></td>'
+    return f'<td>{html.escape(str(value))}</td>'
+
+
+def _render_row(wf: str, entry: dict) -> str:
+    cells = _rewrap(wf, entry)
+    return "<tr>" + "".join([_render_cell(v, i == COLUMNS.index("Repository")) for i, v in enumerate(cells)]) + "</tr>"
+
+
+"""
+   Indent tags one per line, for a human-readable page
+"""
+def _prettify(fragment: str, depth: int) -> str:
+    lines = []
+    for piece in fragment.replace("><", ">\n<").split("\n"):
+        if piece.startswith("</"):
+            depth -= 1
+        lines.append(" " * depth + piece)
+        if piece.startswith("<") and not piece.startswith(("</", "<!", "<meta")) and "</" not in piece:
+            depth += 1
+    return "\n".join(lines) + "\n"
+
+
+"""
+   Write table rows to an open file, one row at a time
+"""
+def write_table(input_data: dict, out, pretty: bool = False):
+    table_head = "<table id=\"info-table\" class=\"styled-table\"><thead><tr>" + \
+                 "".join([f'<th>{html.escape(c)}</th>' for c in COLUMNS]) + "</tr></thead><tbody>"
+    out.write(_prettify(table_head, 2) if pretty else table_head)
+    for wf in input_data.keys():
+        row = _render_row(wf, input_data[wf])
+        out.write(_prettify(row, 4) if pretty else row)
+    gsiMetrics.count("report_rows", len(input_data))
+    out.write(_prettify("</tbody></table>", 4) if pretty else "</tbody></table>")
+
+
+"""
+   Write complete HTML page to an open file
 """
-def convert2page(input_data: dict):
-    html = "<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>Production Workflows</title> \
-           <style> table {border-collapse: separate; border-spacing: 0;} \
-           th {position: sticky; top: 0; padding: 4px; background-color: #009879; color: #ffffff; border-bottom: 2px solid #ddd; text-align: left;} \
-           td {padding: 4px; text-align: left; border-bottom: 1px solid #ddd; }</style> \
-           </head><body>" + convert2table(input_data) + "<div><h3>Updated on" + today_date() + "</h3></div></body></html>"
+def write_page(input_data: dict, out, pretty: bool = False):
+    out.write(_prettify(PAGE_HEAD, 0) if pretty else PAGE_HEAD)
+    write_table(input_data, out, pretty)
+    footer = "<div><h3>Updated on " + html.escape(today_date()) + "</h3></div></body></html>"
+    out.write(_prettify(footer, 2) if pretty else footer)
 
-    soup = Bs(html, "html.parser")
-    return soup.prettify()
 
 """
-   Using data from input, re-wrap the data into a hash and return HTML
+   Write HTML page into a file. The page goes to a temporary file first, which is then moved in place
+"""
+def render2file(input_data: dict, path: str, pretty: bool = False):
+    with gsiState.atomic_file(path) as op:
+        write_page(input_data, op, pretty)
+
+
 """
-def convert2table(inputs: dict) -> dict:
-    rewrapped = []
-    for wf in inputs.keys():
-        rewrapped.append({"Workflow/alias": wf,
-                        "RUO Tags": inputs[wf]['research']['tags'] if 'research' in inputs[wf].keys() else [],
-                        "Clinical Tags": inputs[wf]['clinical']['tags'] if 'clinical' in inputs[wf].keys() else [],
-                        "Latest Tag": inputs[wf]['latest_tag'] if inputs[wf]['latest_tag'] else " ",
-                        "Repository": f'<a href=\"{inputs[wf]["url"]}\">{inputs[wf]["url"]}</a>' if inputs[wf]['url'] else " ",
-                        "Software Modules": inputs[wf]['code_modules'],
-                        "Data Modules": inputs[wf]['data_modules'],
-                        "RUO Olives": inputs[wf]['research']['olives'] if 'research' in inputs[wf].keys() else [],
-                        "Clinical Olives": inputs[wf]['clinical']['olives'] if 'clinical' in inputs[wf].keys() else []})
-    return json2html.convert(json=rewrapped, table_attributes="id=\"info-table\" class=\"styled-table\"", escape=False)
+   Return JSON rendered into HTML page
+"""
+def convert2page(input_data: dict, pretty: bool = True) -> str:
+    out = io.StringIO()
+    write_page(input_data, out, pretty)
+    return out.getvalue()
+
+
+"""
+   Using data from input, re-wrap the data and return HTML table
+"""
+def convert2table(inputs: dict) -> str:
+    out = io.StringIO()
+    write_table(inputs, out)
+    return out.getvalue()
+
+
+from htmlRenderer.lite import render_lite
@@ -0,0 +1,211 @@
+"""
+   Lightweight report: a small static HTML page plus a data sidecar. The page renders only visible rows
+   (virtual scrolling), sorts and filters on the client side and shows olive and module lists on demand.
+   The sidecar is compact json, columnar with a string table, wrapped into a single assignment so that it
+   can be loaded with a script tag - this works when the page is opened from a file share (file://),
+   where browsers do not allow fetching json
+"""
+import hashlib
+import html
+import json
+import os
+import gsiMetrics
+import gsiState
+from htmlRenderer import COLUMNS, today_date, _rewrap
+
+DATA_VERSION = 1
+DATA_VARIABLE = "GSI_WORKFLOWS"
+
+LITE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>Production Workflows</title>
+<style>
+body {margin: 0; font-family: sans-serif; font-size: 14px;}
+#bar {padding: 6px; display: flex; gap: 12px; align-items: center;}
+#filter {width: 320px; padding: 4px;}
+#view {position: relative; height: calc(100vh - 80px); overflow: auto; border-top: 1px solid #ddd;}
+#spacer {position: relative;}
+.row {position: absolute; left: 0; right: 0; display: grid; grid-template-columns: __GRID__; height: 28px;
+      border-bottom: 1px solid #ddd; box-sizing: border-box;}
+.head {position: sticky; top: 0; z-index: 1; display: grid; grid-template-columns: __GRID__;
+       background-color: #009879; color: #ffffff; border-bottom: 2px solid #ddd;}
+.head div {padding: 4px; cursor: pointer; user-select: none;}
+.row div {padding: 4px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;}
+.more {cursor: pointer; color: #009879;}
+#details {position: fixed; top: 0; right: 0; width: 420px; max-height: 100vh; overflow: auto; background: #ffffff;
+          border-left: 2px solid #009879; padding: 8px; display: none; box-shadow: 0 0 8px #999;}
+#footer {padding: 6px;}
+</style>
+</head>
+<body>
+<div id="bar"><input id="filter" type="search" placeholder="Filter workflows, tags, modules, olives">
+<span id="count"></span></div>
+<div id="view"><div id="header" class="head"></div><div id="spacer"></div></div>
+<div id="details"><button id="close">Close</button><h3 id="details-title"></h3><ul id="details-list"></ul></div>
+<div id="footer"><h3>Updated on __UPDATED__</h3></div>
+<script src="__SIDECAR__"></script>
+<script>
+(function () {
+  var ROW_HEIGHT = 28, OVERSCAN = 10;
+  var data = window.__VARIABLE__;
+  var view = document.getElementById("view"), spacer = document.getElementById("spacer");
+  var header = document.getElementById("header"), count = document.getElementById("count");
+  if (!data) {
+    count.textContent = "Data file __SIDECAR__ could not be loaded";
+    return;
+  }
+  var S = data.strings, columns = data.columns, link = columns.indexOf("Repository");
+  var rows = data.rows, shown = rows.slice(), sortColumn = -1, sortOrder = 1;
+  var keys = rows.map(function (r) {
+    return r.map(function (c) {
+      return Array.isArray(c) ? c.map(function (i) { return S[i]; }).join("\\n") : S[c];
+    }).join("\\n").toLowerCase();
+  });
+  rows.forEach(function (r, i) { r.key = keys[i]; });
+
+  columns.forEach(function (name, c) {
+    var cell = document.createElement("div");
+    cell.textContent = name;
+    cell.onclick = function () {
+      sortOrder = sortColumn === c ? -sortOrder : 1;
+      sortColumn = c;
+      update();
+    };
+    header.appendChild(cell);
+  });
+
+  function sortKey(r, c) {
+    return Array.isArray(r[c]) ? r[c].length : S[r[c]];
+  }
+
+  function compare(a, b) {
+    var x = sortKey(a, sortColumn), y = sortKey(b, sortColumn);
+    if (typeof x === "number") return (x - y) * sortOrder;
+    return x.localeCompare(y, undefined, {numeric: true}) * sortOrder;
+  }
+
+  function showDetails(r, c) {
+    document.getElementById("details-title").textContent = S[r[0]] + ": " + columns[c];
+    var list = document.getElementById("details-list");
+    list.textContent = "";
+    r[c].forEach(function (i) {
+      var item = document.createElement("li");
+      item.textContent = S[i];
+      list.appendChild(item);
+    });
+    document.getElementById("details").style.display = "block";
+  }
+  document.getElementById("close").onclick = function () {
+    document.getElementById("details").style.display = "none";
+  };
+
+  function renderCell(r, c) {
+    var cell = document.createElement("div"), value = r[c];
+    if (Array.isArray(value)) {
+      if (value.length > 0) {
+        var more = document.createElement("span");
+        more.className = "more";
+        more.textContent = value.length === 1 ? S[value[0]] : S[value[0]] + " (+" + (value.length - 1) + ")";
+        more.onclick = function () { showDetails(r, c); };
+        cell.appendChild(more);
+      }
+    } else if (c === link && S[value].trim()) {
+      var a = document.createElement("a");
+      a.href = S[value];
+      a.textContent = S[value];
+      cell.appendChild(a);
+    } else {
+      cell.textContent = S[value];
+    }
+    cell.title = Array.isArray(value) ? value.length + " item(s), click to show" : S[value];
+    return cell;
+  }
+
+  function render() {
+    var first = Math.max(0, Math.floor(view.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    var last = Math.min(shown.length, Math.ceil((view.scrollTop + view.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    var fragment = document.createDocumentFragment();
+    for (var n = first; n < last; n++) {
+      var row = document.createElement("div");
+      row.className = "row";
+      row.style.top = (n * ROW_HEIGHT) + "px";
+      for (var c = 0; c < columns.length; c++) row.appendChild(renderCell(shown[n], c));
+      fragment.appendChild(row);
+    }
+    spacer.textContent = "";
+    spacer.appendChild(fragment);
+  }
+
+  function update() {
+    var query = document.getElementById("filter").value.trim().toLowerCase();
+    shown = query ? rows.filter(function (r) { return r.key.indexOf(query) >= 0; }) : rows.slice();
+    if (sortColumn >= 0) shown.sort(compare);
+    spacer.style.height = (shown.length * ROW_HEIGHT) + "px";
+    count.textContent = shown.length + " of " + rows.length + " workflows";
+    render();
+  }
+
+  var pending = false;
+  view.addEventListener("scroll", function () {
+    if (pending) return;
+    pending = true;
+    window.requestAnimationFrame(function () { pending = false; render(); });
+  });
+  window.addEventListener("resize", render);
+  document.getElementById("filter").addEventListener("input", update);
+  update();
+})();
+</script>
+</body>
+</html>
+"""
+
+GRID = "minmax(160px, 1.5fr) repeat(3, minmax(80px, 1fr)) minmax(160px, 2fr) repeat(4, minmax(120px, 1.5fr))"
+
+
+"""
+   Convert data into columnar form: every string is stored once in a string table, rows hold
+   indices (or lists of indices) into this table
+"""
+def compact_data(input_data: dict) -> dict:
+    strings = []
+    index = {}
+
+    def intern(value: str) -> int:
+        if value not in index.keys():
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    rows = []
+    for wf in input_data.keys():
+        rows.append([[intern(str(v)) for v in value] if isinstance(value, list) else intern(str(value))
+                     for value in _rewrap(wf, input_data[wf])])
+    return {'version': DATA_VERSION, 'columns': COLUMNS, 'strings': strings, 'rows': rows}
+
+
+"""
+   Return name of the data sidecar for a page: gsi_workflows.html -> gsi_workflows.data.js
+"""
+def sidecar_path(page_path: str) -> str:
+    return os.path.splitext(page_path)[0] + ".data.js"
+
+
+"""
+   Write the lightweight page and its data sidecar. The sidecar is written first and the page refers to it
+   with a content hash, so a browser never combines a new page with stale data from its cache
+"""
+def render_lite(input_data: dict, page_path: str):
+    data_path = sidecar_path(page_path)
+    payload = json.dumps(compact_data(input_data), separators=(",", ":"), ensure_ascii=False)
+    gsiMetrics.count("report_rows", len(input_data))
+    sidecar = f'window.{DATA_VARIABLE}={payload};\n'
+    gsiState.write_atomic(data_path, sidecar)
+    digest = hashlib.sha256(sidecar.encode()).hexdigest()[:12]
+    page = LITE_PAGE.replace("__GRID__", GRID)\
+                    .replace("__VARIABLE__", DATA_VARIABLE)\
+                    .replace("__UPDATED__", html.escape(today_date()))\
+                    .replace("__SIDECAR__", html.escape(f'{os.path.basename(data_path)}?v={digest}'))
+    gsiState.write_atomic(page_path, page)
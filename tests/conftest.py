@@ -0,0 +1,68 @@
+"""
+   Tests import the tracker's packages from the root of the repository. Fixtures build a synthetic
+   analysis-config (see gsiBenchmark) and settings for running workflow_tracker.py against it
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import gsiBenchmark
+from gsiBenchmark.mock_github import MockGithub
+
+ORGANIZATION = "tests"
+
+
+"""
+   Synthetic analysis-config with 12 workflows, shared by the tests of a module
+"""
+@pytest.fixture(scope="module")
+def analysis_config(tmp_path_factory) -> tuple:
+    repo_dir = str(tmp_path_factory.mktemp("analysis-config"))
+    return repo_dir, gsiBenchmark.generate_analysis_config(repo_dir, 12)
+
+
+@pytest.fixture(scope="module")
+def mock_github(analysis_config):
+    mock = MockGithub(ORGANIZATION, analysis_config[1]).start()
+    yield mock
+    mock.stop()
+
+
+"""
+   Settings for the synthetic analysis-config and mock Github, as a dict of TOML tables
+"""
+def make_settings(repo_dir: str, api_url: str | None = None, cache_dir: str | None = None) -> dict:
+    settings = {'repo': {'local_olive_dir': repo_dir, 'main': "master"},
+                'collection': {'workers': 4},
+                'instances': {'instance_a': "research", 'instance_b': "clinical"},
+                'prefixes': {'call_prefix_a': "call_ready"},
+                'aliases': {}}
+    if api_url is not None:
+        settings['repo'].update({'organization': ORGANIZATION, 'token': "tests", 'api_url': api_url,
+                                 'collector': "rest", 'max_rate': 0, 'max_wait': 0})
+    if cache_dir is not None:
+        settings['cache'] = {'dir': cache_dir, 'max_mb': 20}
+    return settings
+
+
+def write_settings(path: str, settings: dict) -> str:
+    with open(path, "w") as sf:
+        for table, values in settings.items():
+            sf.write(f'[{table}]\n')
+            for key, value in values.items():
+                sf.write(f'{key}={json.dumps(value)}\n')
+    return path
+
+
+"""
+   Run workflow_tracker.py with settings in a working directory, return the completed process
+"""
+def run_tracker(work_dir: str, settings: dict, *args) -> subprocess.CompletedProcess:
+    settings_path = write_settings(os.path.join(work_dir, "settings.toml"), settings)
+    return subprocess.run([sys.executable, os.path.join(ROOT, "workflow_tracker.py"), "-s", settings_path, *args],
+                          cwd=work_dir, capture_output=True, text=True, timeout=300)
@@ -0,0 +1,44 @@
+"""
+   Atomic writes of output, cache and state files
+"""
+import os
+import stat
+import threading
+import pytest
+import gsiState
+
+
+def test_text_bytes_and_json(tmp_path):
+    gsiState.write_atomic(str(tmp_path / "page.html"), "<html>é</html>")
+    gsiState.write_atomic(str(tmp_path / "body"), b"\x00\x01")
+    gsiState.write_json(str(tmp_path / "data.json"), {'a': [1, 2]})
+    assert (tmp_path / "page.html").read_text(encoding="utf-8") == "<html>é</html>"
+    assert (tmp_path / "body").read_bytes() == b"\x00\x01"
+    assert (tmp_path / "data.json").read_text() == '{"a": [1, 2]}'
+
+
+def test_permissions_follow_umask(tmp_path):
+    gsiState.write_atomic(str(tmp_path / "page.html"), "text")
+    assert stat.S_IMODE(os.stat(tmp_path / "page.html").st_mode) == 0o666 & ~gsiState.UMASK
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    gsiState.write_json(path, {'version': 1})
+    with pytest.raises(TypeError):
+        gsiState.write_json(path, {'version': object()})
+    assert (tmp_path / "data.json").read_text() == '{"version": 1}'
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_writes_from_threads_leave_umask_alone(tmp_path):
+    threads = [threading.Thread(target=gsiState.write_atomic, args=(str(tmp_path / f'{n}.txt'), str(n)))
+               for n in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    umask = os.umask(0)
+    os.umask(umask)
+    assert umask == gsiState.UMASK
+    assert sorted(os.listdir(tmp_path)) == sorted(f'{n}.txt' for n in range(50))
@@ -0,0 +1,138 @@
+"""
+   GraphQL collector: only data a query returned are served from prefetched files, the rest goes through REST
+"""
+import base64
+import json
+import gsiRepository as rP
+from gsiRepository.transport import Response
+from conftest import make_settings, run_tracker
+
+BUILD = {'names': ["bwaMem"], 'wdl': "bwaMem.wdl"}
+
+
+def repo_node(name: str, build: dict | None, text: bool = True) -> dict:
+    return {'name': name, 'url': f'https://github.com/oicr-gsi/{name}', 'pushedAt': "2024-01-01T00:00:00Z",
+            'build': None if build is None else {'text': json.dumps(build) if text else None},
+            'refs': {'pageInfo': {'hasNextPage': False}, 'nodes': [{'name': "1.0.0"}]}}
+
+
+"""
+   Transport with scripted GraphQL responses (a function of the query) and REST answers from a dict of files
+"""
+class FakeTransport:
+    def __init__(self, graphql, files: dict):
+        self.graphql = graphql
+        self.files = files
+        self.rest = []
+
+    def request(self, url: str, headers: dict, method: str = "GET", data: bytes | None = None) -> Response:
+        if url.endswith("/graphql"):
+            return self.graphql(json.loads(data))
+        self.rest.append(url)
+        if "/orgs/" in url:
+            page = 1 if "page=1&" in url else 2
+            repos = [{'name': n, 'html_url': f'https://github.com/oicr-gsi/{n}', 'pushed_at': "2024-01-01T00:00:00Z"}
+                     for n in sorted({r for r, _ in self.files.keys()})] if page == 1 else []
+            return Response(200, {}, json.dumps(repos).encode())
+        repo, path = url.split("/repos/oicr-gsi/")[1].split("/contents/")
+        if (repo, path) not in self.files.keys():
+            return Response(404, {}, json.dumps({'message': "Not Found"}).encode())
+        content = base64.b64encode(self.files[(repo, path)]).decode()
+        return Response(200, {}, json.dumps({'content': content}).encode())
+
+
+def graphql_response(data: dict | None, errors: list = None) -> Response:
+    result = {'data': data} | ({'errors': errors} if errors else {})
+    return Response(200, {'content-type': "application/json; charset=utf-8"}, json.dumps(result).encode())
+
+
+def make_handler(graphql, files: dict) -> rP.graphqlRepo:
+    handler = rP.graphqlRepo("oicr-gsi", "token", max_rate=None)
+    handler.transport = FakeTransport(graphql, files)
+    return handler
+
+
+FILES = {("bwaMem", "vidarrbuild.json"): json.dumps(BUILD).encode(), ("bwaMem", "bwaMem.wdl"): b"version 1.0",
+         ("star", "vidarrbuild.json"): json.dumps({'names': ["star"], 'wdl': "star.wdl"}).encode(),
+         ("star", "star.wdl"): b"version 1.0 star", ("notes", "README.md"): b"notes"}
+
+
+def repo_page(query: dict) -> Response | None:
+    if 'org' not in query['variables'].keys():
+        return None
+    nodes = [repo_node("bwaMem", BUILD), repo_node("star", {'names': ["star"], 'wdl': "star.wdl"}),
+             repo_node("notes", None)]
+    return graphql_response({'organization': {'repositories': {'pageInfo': {'hasNextPage': False, 'endCursor': "x"},
+                                                               'nodes': nodes}}})
+
+
+def test_prefetched_files_are_served():
+    def graphql(query):
+        return repo_page(query) or graphql_response({'r0': {'object': {'text': "version 1.0"}}, 'r1': {'object': None}})
+    handler = make_handler(graphql, FILES)
+    assert sorted(handler.get_repo_list().keys()) == ["bwaMem", "notes", "star"]
+    assert handler.get_file("bwaMem", "bwaMem.wdl") == (b"version 1.0", True)
+    ''' A null object is a definite answer: the file does not exist '''
+    assert handler.get_file("star", "star.wdl") == (None, True)
+    assert handler.get_file("notes", "vidarrbuild.json") == (None, True)
+    assert handler.get_repo_tags("bwaMem") == ["1.0.0"]
+    assert handler.transport.rest == []
+
+
+def test_failed_batch_falls_back_to_rest():
+    def graphql(query):
+        return repo_page(query) or Response(502, {'content-type': "text/html"}, b"<html>Bad Gateway</html>")
+    handler = make_handler(graphql, FILES)
+    handler.get_repo_list()
+    assert handler.get_file("bwaMem", "bwaMem.wdl") == (b"version 1.0", True)
+    assert handler.get_file("star", "star.wdl") == (b"version 1.0 star", True)
+    assert len(handler.transport.rest) == 2
+
+
+def test_errored_repository_falls_back_to_rest():
+    def graphql(query):
+        return repo_page(query) or graphql_response({'r0': {'object': {'text': "version 1.0"}}, 'r1': None},
+                                                    [{'message': "Something went wrong", 'path': ["r1"]}])
+    handler = make_handler(graphql, FILES)
+    handler.get_repo_list()
+    assert handler.get_file("bwaMem", "bwaMem.wdl") == (b"version 1.0", True)
+    assert handler.get_file("star", "star.wdl") == (b"version 1.0 star", True)
+    assert handler.transport.rest == ["https://api.github.com/repos/oicr-gsi/star/contents/star.wdl"]
+
+
+def test_failed_repository_list_falls_back_to_rest():
+    handler = make_handler(lambda query: Response(502, {'content-type': "text/html"}, b"<html>Bad Gateway</html>"),
+                           FILES)
+    assert sorted(handler.get_repo_list().keys()) == ["bwaMem", "notes", "star"]
+    assert handler.get_file("bwaMem", "vidarrbuild.json") == (json.dumps(BUILD).encode(), True)
+
+
+def test_errored_repository_node_is_not_prefetched():
+    def graphql(query):
+        if 'org' not in query['variables'].keys():
+            return graphql_response({})
+        nodes = [repo_node("bwaMem", BUILD, text=False), repo_node("star", {'names': ["star"], 'wdl': "star.wdl"})]
+        nodes[1]['build'] = None
+        return graphql_response({'organization': {'repositories': {
+            'pageInfo': {'hasNextPage': False, 'endCursor': "x"}, 'nodes': nodes}}},
+            [{'message': "timeout", 'path': ["organization", "repositories", "nodes", 1, "build"]}])
+    handler = make_handler(graphql, FILES)
+    handler.get_repo_list()
+    ''' bwaMem: the blob has no text, star: the build object failed - both are read through REST '''
+    assert handler.get_file("bwaMem", "vidarrbuild.json") == (json.dumps(BUILD).encode(), True)
+    assert handler.get_file("star", "vidarrbuild.json")[0] is not None
+
+
+def test_graphql_run_equals_rest_run(analysis_config, mock_github, tmp_path):
+    outputs = {}
+    for collector in ("rest", "graphql"):
+        settings = make_settings(analysis_config[0], mock_github.url)
+        settings['repo']['collector'] = collector
+        result = run_tracker(str(tmp_path), settings, "-r", "HEAD", "--no-cache", "-o", f'{collector}.json',
+                             "-p", f'{collector}.html')
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "using REST" not in result.stdout and "WARNING: GraphQL" not in result.stdout
+        with open(tmp_path / f'{collector}.json', "r") as jf:
+            outputs[collector] = json.load(jf)
+    assert len(outputs['rest']) > 0
+    assert outputs['graphql'] == outputs['rest']
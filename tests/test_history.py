@@ -0,0 +1,87 @@
+"""
+   --history: tags recorded commit by commit (only olives touched by a commit are re-matched) equal a match
+   of the whole tree at every commit of a synthetic analysis-config
+"""
+import json
+import os
+import gsiBenchmark
+import gsiOlive
+import gsiSource
+import gsiWorkflow
+from git import Git
+from conftest import make_settings, run_tracker
+
+INSTANCES = ["research", "clinical"]
+PREFIXES = ["call_ready"]
+AUTHOR = {"GIT_AUTHOR_NAME": "tests", "GIT_AUTHOR_EMAIL": "tests@localhost",
+          "GIT_COMMITTER_NAME": "tests", "GIT_COMMITTER_EMAIL": "tests@localhost"}
+
+
+def write(repo_dir: str, rel_path: str, text: str):
+    os.makedirs(os.path.dirname(os.path.join(repo_dir, rel_path)), exist_ok=True)
+    with open(os.path.join(repo_dir, rel_path), "w") as wf:
+        wf.write(text)
+
+
+def commit(repo_dir: str, message: str) -> str:
+    g = Git(repo_dir)
+    g.add("-A")
+    g.commit("-q", "-m", message, env=AUTHOR)
+    return g.rev_parse("HEAD")
+
+
+def olive(*runs: str) -> str:
+    return "\n".join(["Version 1;", "Input cerberus_fp;", "Olive"] +
+                     [f'  Run {run}\n  With {{ modules = "samtools/1.16" }}' for run in runs]) + "\n"
+
+
+"""
+   Tags of every (workflow, instance) at a commit, matched from scratch
+"""
+def match_tree(repo_dir: str, ref: str) -> dict:
+    source = gsiSource.GitObjectSource(repo_dir, ref)
+    wf_names = gsiWorkflow.extract_wf_names(repo_dir, INSTANCES, PREFIXES, source)
+    olive_files = gsiOlive.collect_olives(repo_dir, INSTANCES, {}, source)
+    olive_data = {inst: gsiOlive.parse_olives(files, 1, None, source) for inst, files in olive_files.items()}
+    olive_info = gsiOlive.match_olives(olive_data, wf_names)
+    return {(wf, inst): set(olive_info[wf][inst]['tags']) for wf in olive_info.keys()
+            for inst in olive_info[wf].keys() if olive_info[wf][inst]['tags']}
+
+
+def test_history_equals_match_at_every_commit(tmp_path):
+    repo_dir = str(tmp_path / "analysis-config")
+    workflows = gsiBenchmark.generate_analysis_config(repo_dir, 4)
+    commits = [Git(repo_dir).rev_parse("HEAD")]
+    wf = workflows[0]
+    ''' An edited olive, a new workflow (with its olive), an olive and a workflow deleted, an olive matching
+        a workflow whose name contains another one '''
+    write(repo_dir, f'shesmu/research/vidarr-{wf}-0.shesmu', olive(f'{wf}_call_ready_v9_9_9'))
+    commits.append(commit(repo_dir, "Edit an olive"))
+    write(repo_dir, "vidarr/research/workflows/newWorkflow_call_ready.vidarrworkflow", "{}")
+    write(repo_dir, "shesmu/research/vidarr-newWorkflow.shesmu", olive("newWorkflow_call_ready_v1_0_0"))
+    commits.append(commit(repo_dir, "Add a workflow"))
+    os.remove(os.path.join(repo_dir, f'shesmu/clinical/vidarr-{workflows[1]}-0.shesmu'))
+    commits.append(commit(repo_dir, "Delete an olive"))
+    os.remove(os.path.join(repo_dir, f'vidarr/research/workflows/{workflows[2]}_call_ready.vidarrworkflow'))
+    commits.append(commit(repo_dir, "Delete a workflow"))
+    write(repo_dir, "vidarr/research/workflows/newWorkflowLong_call_ready.vidarrworkflow", "{}")
+    write(repo_dir, "shesmu/research/vidarr-newWorkflow.shesmu",
+          olive("newWorkflow_call_ready_v1_1_0", "newWorkflowLong_call_ready_v2_0_0"))
+    commits.append(commit(repo_dir, "Add a workflow with a longer name"))
+
+    work_dir = str(tmp_path / "work")
+    os.makedirs(work_dir)
+    result = run_tracker(work_dir, make_settings(repo_dir), "--history", f'{commits[0]}..HEAD', "-t", "timeline.json")
+    assert result.returncode == 0, result.stdout + result.stderr
+    with open(os.path.join(work_dir, "timeline.json"), "r") as tf:
+        timeline = json.load(tf)
+
+    ''' Replay transitions: the state at the start of the range first, then one commit at a time '''
+    tags = {}
+    for ref in commits:
+        for wf_name, transitions in timeline.items():
+            for transition in transitions:
+                if transition['commit'] == ref:
+                    key = (wf_name, transition['instance'])
+                    tags[key] = tags.get(key, set()) - set(transition['removed']) | set(transition['added'])
+        assert {key: value for key, value in tags.items() if value} == match_tree(repo_dir, ref), ref
@@ -0,0 +1,138 @@
+"""
+   Modules of imported wdl files, and re-use of collected repository data when imported repositories change
+"""
+import threading
+import time
+import pytest
+import gsiWorkflow
+import workflow_tracker
+
+ORGANIZATION = "oicr-gsi"
+RAW = f'https://raw.githubusercontent.com/{ORGANIZATION}'
+
+
+"""
+   Repository handler serving files from a dict keyed by (repo, path), counting requests
+"""
+class FakeGithub:
+    organization = ORGANIZATION
+
+    def __init__(self, files: dict, pushed_at: dict):
+        self.files = files
+        self.pushed_at = pushed_at
+        self.requests = []
+
+    def get_file(self, repo: str, path: str, ref: str | None = None) -> tuple:
+        self.requests.append((repo, path))
+        content = self.files.get((repo, path))
+        return (content.encode() if content is not None else None), True
+
+    def get_file_content(self, repo: str, path: str) -> bytes | None:
+        return self.get_file(repo, path)[0]
+
+    def get_latest_tag(self, repo: str) -> str:
+        return "1.0.0"
+
+
+def wdl(modules: str, *imports) -> str:
+    lines = ["version 1.0"] + [f'import "{i}" as sub{n}' for n, i in enumerate(imports)]
+    return "\n".join(lines + ["task run {", "  input {", f'    String modules = "{modules}"', "  }", "}", ""])
+
+
+@pytest.fixture
+def github(monkeypatch) -> FakeGithub:
+    monkeypatch.setattr(workflow_tracker, "settings", {'prefixes': {'call_prefix_a': "call_ready"}})
+    files = {("bwaMem", "vidarrbuild.json"): '{"names": ["bwaMem"], "wdl": "bwaMem.wdl"}',
+             ("bwaMem", "bwaMem.wdl"): wdl("bwa/0.7.17", "tasks/align.wdl", f'{RAW}/sharedTasks/main/merge.wdl'),
+             ("bwaMem", "tasks/align.wdl"): wdl("samtools/1.16"),
+             ("sharedTasks", "vidarrbuild.json"): None,
+             ("sharedTasks", "merge.wdl"): wdl("picard/2.21.2 hg38-bwa-index/0.7.17")}
+    return FakeGithub(files, {"bwaMem": "2024-01-01T00:00:00Z", "sharedTasks": "2024-01-01T00:00:00Z"})
+
+
+REPOS = {"bwaMem": "https://github.com/oicr-gsi/bwaMem", "sharedTasks": "https://github.com/oicr-gsi/sharedTasks"}
+OLIVES = {'bwaMem': {'research': {}}}
+
+
+def test_imported_modules_and_records(github):
+    repo_info, records = workflow_tracker.collect_repos(github, REPOS, OLIVES)
+    assert repo_info['bwaMem']['code_modules'] == ["bwa/0.7.17", "samtools/1.16", "picard/2.21.2"]
+    assert repo_info['bwaMem']['data_modules'] == ["hg38-bwa-index/0.7.17"]
+    assert records['bwaMem']['imports'] == [["bwaMem", None, "tasks/align.wdl"],
+                                            ["sharedTasks", "main", "merge.wdl"]]
+    assert records['bwaMem']['imported_at'] == {"sharedTasks": "2024-01-01T00:00:00Z"}
+
+
+def test_unchanged_imports_are_reused(github):
+    _, records = workflow_tracker.collect_repos(github, REPOS, OLIVES)
+    github.requests = []
+    repo_info, _ = workflow_tracker.collect_repos(github, REPOS, OLIVES, records=records)
+    assert github.requests == []
+    assert repo_info['bwaMem']['code_modules'] == ["bwa/0.7.17", "samtools/1.16", "picard/2.21.2"]
+
+
+def test_pushed_import_invalidates_record(github):
+    _, records = workflow_tracker.collect_repos(github, REPOS, OLIVES)
+    github.files[("sharedTasks", "merge.wdl")] = wdl("picard/3.1.0")
+    github.pushed_at["sharedTasks"] = "2024-02-01T00:00:00Z"
+    incremental, new_records = workflow_tracker.collect_repos(github, REPOS, OLIVES, records=records)
+    full, _ = workflow_tracker.collect_repos(github, REPOS, OLIVES)
+    assert incremental == full
+    assert incremental['bwaMem']['code_modules'] == ["bwa/0.7.17", "samtools/1.16", "picard/3.1.0"]
+    assert new_records['bwaMem']['imported_at'] == {"sharedTasks": "2024-02-01T00:00:00Z"}
+
+
+def test_records_without_imports_are_not_reused(github):
+    _, records = workflow_tracker.collect_repos(github, REPOS, OLIVES)
+    del records['bwaMem']['imported_at']
+    github.requests = []
+    workflow_tracker.collect_repos(github, REPOS, OLIVES, records=records)
+    assert ("bwaMem", "bwaMem.wdl") in github.requests
+
+
+def test_imports_of_other_organizations_are_not_followed():
+    extractor = gsiWorkflow.ModuleExtractor(FakeGithub({}, {}))
+    assert extractor.resolve("bwaMem", None, "bwaMem.wdl", "https://raw.githubusercontent.com/other/x/main/a.wdl") \
+        is None
+    assert extractor.resolve("bwaMem", None, "wdl/bwaMem.wdl", "../tasks/a.wdl") == ("bwaMem", None, "tasks/a.wdl")
+
+
+def test_single_quoted_imports_are_followed(github):
+    github.files[("bwaMem", "bwaMem.wdl")] = wdl("bwa/0.7.17").replace(
+        "version 1.0", "version 1.0\n  import 'tasks/align.wdl' as align")
+    extractor = gsiWorkflow.ModuleExtractor(github)
+    merged = extractor.extract("bwaMem", "bwaMem.wdl", github.files[("bwaMem", "bwaMem.wdl")].encode())
+    assert merged['code_modules'] == ["bwa/0.7.17", "samtools/1.16"]
+    assert merged['imports'] == [["bwaMem", None, "tasks/align.wdl"]]
+
+
+"""
+   Repository handler whose requests block until released, so that concurrent fetches overlap
+"""
+class SlowGithub(FakeGithub):
+    def __init__(self, files: dict, pushed_at: dict):
+        super().__init__(files, pushed_at)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_file(self, repo: str, path: str, ref: str | None = None) -> tuple:
+        self.started.set()
+        self.release.wait(5)
+        return super().get_file(repo, path, ref)
+
+
+def test_concurrent_fetches_of_a_file_are_shared():
+    github = SlowGithub({("sharedTasks", "merge.wdl"): wdl("picard/2.21.2")}, {})
+    extractor = gsiWorkflow.ModuleExtractor(github)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(extractor.fetch("sharedTasks", "main", "merge.wdl")))
+               for _ in range(2)]
+    threads[0].start()
+    assert github.started.wait(5)
+    threads[1].start()
+    time.sleep(0.05)
+    github.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [wdl("picard/2.21.2").encode()] * 2
+    assert github.requests == [("sharedTasks", "merge.wdl")]
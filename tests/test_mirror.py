@@ -0,0 +1,56 @@
+"""
+   Reading files from bare mirrors: a missing file is a definite answer, a broken mirror is not
+"""
+import os
+import pytest
+from git import Git
+import gsiRepository as rP
+
+GIT_ENV = {"GIT_AUTHOR_NAME": "tests", "GIT_AUTHOR_EMAIL": "tests@localhost",
+           "GIT_COMMITTER_NAME": "tests", "GIT_COMMITTER_EMAIL": "tests@localhost"}
+BUILD = b'{"names": ["bwaMem"], "wdl": "bwaMem.wdl"}'
+
+
+@pytest.fixture
+def mirror(tmp_path) -> rP.mirrorRepo:
+    work_dir = tmp_path / "bwaMem"
+    os.makedirs(work_dir / "wdl")
+    (work_dir / "vidarrbuild.json").write_bytes(BUILD)
+    (work_dir / "wdl" / "bwaMem.wdl").write_text("version 1.0")
+    g = Git(str(work_dir))
+    g.init("-q")
+    g.add("-A")
+    g.commit("-q", "-m", "Workflow", env=GIT_ENV)
+    handler = rP.mirrorRepo("oicr-gsi", "token", mirror_dir=str(tmp_path / "mirrors"))
+    os.makedirs(handler.mirror_dir)
+    Git(handler.mirror_dir).clone("--mirror", "--quiet", str(work_dir), handler.mirror_path("bwaMem"))
+    handler.synced = {"bwaMem"}
+    return handler
+
+
+def test_file_is_read(mirror):
+    assert mirror.get_file("bwaMem", "vidarrbuild.json") == (BUILD, True)
+    assert mirror.get_file("bwaMem", "wdl/bwaMem.wdl") == (b"version 1.0", True)
+
+
+def test_missing_file_is_definite(mirror):
+    assert mirror.get_file("bwaMem", "missing.json") == (None, True)
+    assert mirror.get_file("bwaMem", "wdl/missing.wdl") == (None, True)
+    assert mirror.get_file("bwaMem", "wdl") == (None, True)
+
+
+def test_missing_ref_is_not_definite(mirror):
+    assert mirror.get_file("bwaMem", "vidarrbuild.json", "no_such_branch") == (None, False)
+
+
+def test_missing_head_is_not_definite(mirror):
+    Git(mirror.mirror_path("bwaMem")).symbolic_ref("HEAD", "refs/heads/no_such_branch")
+    assert mirror.get_file("bwaMem", "vidarrbuild.json") == (None, False)
+
+
+def test_corrupt_mirror_is_not_definite(mirror):
+    path = mirror.mirror_path("bwaMem")
+    sha = Git(path).rev_parse("HEAD:vidarrbuild.json")
+    os.remove(os.path.join(path, "objects", sha[:2], sha[2:]))
+    assert mirror.get_file("bwaMem", "vidarrbuild.json") == (None, False)
+    assert mirror.get_file("bwaMem", "missing.json") == (None, True)
@@ -0,0 +1,43 @@
+"""
+   The stand-in for Github used by tests and benchmarks: rate limit window and GraphQL queries
+"""
+import json
+import time
+import urllib.error
+import urllib.request
+from gsiBenchmark.mock_github import MockGithub
+
+
+def get(url: str, data: bytes | None = None) -> tuple:
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return err.code, json.loads(err.read())
+
+
+def test_rate_limit_resets():
+    mock = MockGithub("tests", ["bwaMem"], rate_limit=1).start()
+    try:
+        assert get(f'{mock.url}/repos/tests/bwaMem/tags')[0] == 200
+        assert get(f'{mock.url}/repos/tests/bwaMem/tags') == (403, {'message': "API rate limit exceeded"})
+        mock.reset_at = int(time.time()) - 1
+        assert get(f'{mock.url}/repos/tests/bwaMem/tags')[0] == 200
+        assert mock.reset_at > time.time()
+    finally:
+        mock.stop()
+
+
+def test_graphql_files():
+    mock = MockGithub("tests", ["bwaMem"]).start()
+    query = {'query': "", 'variables': {'owner': "tests", 'n0': "bwaMem", 'e0': "HEAD:bwaMem.wdl",
+                                        'n1': "bwaMem", 'e1': "HEAD:missing.wdl", 'n2': "other", 'e2': "HEAD:a.wdl"}}
+    try:
+        status, result = get(f'{mock.url}/graphql', json.dumps(query).encode())
+    finally:
+        mock.stop()
+    assert status == 200
+    assert result['data']['r0']['object']['text'] == mock.content("bwaMem", "bwaMem.wdl")
+    assert result['data']['r1'] == {'object': None}
+    assert result['data']['r2'] is None
+    assert [error['path'] for error in result['errors']] == [["r2"]]
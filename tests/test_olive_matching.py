@@ -0,0 +1,122 @@
+"""
+   match_olives (Aho-Corasick index) against the matcher it replaced
+"""
+import itertools
+import random
+import re
+import pytest
+import gsiOlive
+
+
+"""
+   Matcher used before WorkflowMatcher: two regexes for every workflow x olive x Run name
+"""
+def reference_match_olives(olive_data: dict, workflow_names: dict) -> dict:
+    olive_info = {}
+    for instance in workflow_names.keys():
+        if instance not in olive_data.keys() or olive_data[instance] is None:
+            continue
+        for wf, oli in itertools.product(sorted(workflow_names[instance]), olive_data[instance]):
+            if isinstance(oli, dict) and 'names' in oli.keys():
+                for name in oli['names']:
+                    matched_name = re.search(wf, name)
+                    if matched_name is not None:
+                        matched_again = re.search(wf + r"[_\-.]", name)
+                        if matched_again is not None or len(wf) == len(name):
+                            if wf not in olive_info.keys():
+                                olive_info[wf] = {}
+                            oli_copy = dict(oli, olives=list(oli['olives']))
+                            olive_info[wf][instance] = gsiOlive.merge_info(olive_info[wf][instance], oli_copy) \
+                                if instance in olive_info[wf].keys() else oli_copy
+                            break
+    return olive_info
+
+
+def olive(path: str, names: list, tags: tuple = ("1.0",), modules: tuple = ()) -> dict:
+    return {'olives': [path], 'names': set(names), 'tags': set(tags),
+            'data_modules': set(m for m in modules if m.startswith("hg")),
+            'code_modules': set(m for m in modules if not m.startswith("hg"))}
+
+
+FIXED_WORKFLOWS = {'research': {"bwa", "bwaMem", "bamMergePreprocessing", "star", "starFusion", "rsem"},
+                   'clinical': {"bwaMem", "star", "mutect2", "mutect2-gatk4"}}
+FIXED_OLIVES = {
+    'research': [olive("vidarr-bwa.shesmu", ["bwa"], ("1.0",), ("bwa/0.7",)),
+                 olive("vidarr-bwamem.shesmu", ["bwaMem_call_ready", "bwaMem.v2"], ("2.1",), ("hg38-bwa/1",)),
+                 olive("vidarr-merge.shesmu", ["bamMergePreprocessing_by_tumor_group", "star-lane"], ("2.0.2",)),
+                 olive("vidarr-fusion.shesmu", ["starFusion"], ("1.1",), ("star/2.7", "hg38-star/2")),
+                 olive("vidarr-rsem.shesmu", ["rsemX", "xrsem"], ("0.1",)),
+                 olive("vidarr-nothing.shesmu", ["unknown_workflow"])],
+    'clinical': [olive("vidarr-clinical-bwa.shesmu", ["bwaMem_call_ready_wgs", "star_lane"], ("2.1",)),
+                 olive("vidarr-clinical-mutect.shesmu", ["mutect2-gatk4_matched", "mutect2"], ("1.3",))]}
+
+
+def test_fixed_olives_match_reference():
+    assert gsiOlive.match_olives(FIXED_OLIVES, FIXED_WORKFLOWS) == \
+        reference_match_olives(FIXED_OLIVES, FIXED_WORKFLOWS)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("bwa", {"bwa"}),
+    ("bwaMem", {"bwaMem"}),
+    ("bwaMem_call_ready", {"bwaMem"}),
+    ("bwa_bwaMem.v2", {"bwa", "bwaMem"}),
+    ("bwaMemX", set()),
+    ("xbwa", set()),
+    ("starFusion-lane", {"starFusion"}),
+    ("star.starFusion", {"star"}),
+    ("", set()),
+])
+def test_boundaries_and_overlapping_names(name, expected):
+    assert gsiOlive.WorkflowMatcher(["bwa", "bwaMem", "star", "starFusion"]).match(name) == expected
+
+
+def test_input_is_not_modified():
+    olives = {'research': [olive("a.shesmu", ["bwa"]), olive("b.shesmu", ["bwa_x"])]}
+    gsiOlive.match_olives(olives, {'research': {"bwa"}})
+    assert [o['olives'] for o in olives['research']] == [["a.shesmu"], ["b.shesmu"]]
+
+
+"""
+   Random catalogues: short workflow names over a small alphabet, so names overlap and contain each other,
+   and Run names built from workflow names joined with boundary and other characters
+"""
+def random_catalogue(rnd: random.Random) -> tuple:
+    alphabet = "abAB01"
+    workflow_names = {}
+    olive_data = {}
+    for instance in ("research", "clinical")[:rnd.randint(1, 2)]:
+        workflows = {"".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 4))) for _ in range(rnd.randint(1, 8))}
+        workflows.update("-".join(rnd.sample(sorted(workflows), 1) * 2) for _ in range(rnd.randint(0, 1)))
+        workflow_names[instance] = workflows
+        olives = []
+        for k in range(rnd.randint(0, 8)):
+            names = []
+            for _ in range(rnd.randint(0, 3)):
+                parts = [rnd.choice(sorted(workflows)) if rnd.random() < 0.7 else
+                         "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 3)))
+                         for _ in range(rnd.randint(1, 3))]
+                names.append("".join(p + rnd.choice(["", "_", "-", ".", "x"]) for p in parts).rstrip("x"))
+            olives.append(olive(f'{instance}-{k}.shesmu', names,
+                                {f'{rnd.randint(0, 3)}.{rnd.randint(0, 3)}' for _ in range(rnd.randint(1, 2))},
+                                {rnd.choice(["hg38-a/1", "hg19-b/2", "tool/1.0", "other/2"])
+                                 for _ in range(rnd.randint(0, 2))}))
+        if rnd.random() < 0.1:
+            olives.append("not an olive")
+        olive_data[instance] = olives
+    return olive_data, workflow_names
+
+
+@pytest.mark.parametrize("seed", range(500))
+def test_random_catalogues_match_reference(seed):
+    olive_data, workflow_names = random_catalogue(random.Random(seed))
+    assert gsiOlive.match_olives(olive_data, workflow_names) == reference_match_olives(olive_data, workflow_names)
+
+
+def test_run_names_equal_parsed_names(tmp_path):
+    text = "Olive\n  Run bwaMem_v1_0_0  \n  Run star_call_ready_v2_1_0\n  With { modules = \"star/2.7\" }\n" \
+           "  # Run of nothing\n  Run bcl2fastq_v3_0_0\n"
+    path = tmp_path / "vidarr-test.shesmu"
+    path.write_text(text)
+    assert gsiOlive.olive_run_names([str(path)]) == gsiOlive.parse_olive_text(str(path), text)['names']
+    assert gsiOlive.olive_run_names([str(path)]) == {"star_call_ready", "bcl2fastq"}
@@ -0,0 +1,194 @@
+"""
+   RequestScheduler: retries of rate limited requests, waiting for budget, token rotation and priorities.
+   Time is simulated, waiting on the scheduler's condition moves the clock forward instead of sleeping
+"""
+import threading
+import types
+import pytest
+import gsiRepository.scheduler as scheduler
+from gsiRepository.scheduler import RequestScheduler, PRIORITY_CRITICAL, PRIORITY_NORMAL
+from gsiRepository.transport import Response
+
+START = 1000.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = START
+
+    def time(self) -> float:
+        return self.now
+
+
+"""
+   Condition whose wait() moves the clock by the timeout (a microsecond at least, as real time does move
+   while waiting, even if rounding leaves a bucket a hair short of a token), for tests with a single thread
+"""
+class ClockCondition(type(threading.Condition())):
+    def __init__(self, clock: FakeClock):
+        super().__init__()
+        self.clock = clock
+
+    def wait(self, timeout=None):
+        self.clock.now += max(timeout, 1e-6)
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler, "time", types.SimpleNamespace(time=fake.time))
+    return fake
+
+
+def make_scheduler(clock: FakeClock, tokens: list, **kwargs) -> RequestScheduler:
+    request_scheduler = RequestScheduler(tokens, **kwargs)
+    request_scheduler._condition = ClockCondition(clock)
+    return request_scheduler
+
+
+"""
+   send() for execute: returns the responses in order, records (token, time) of every call
+"""
+def fake_send(clock: FakeClock, responses: list, calls: list):
+    def send(token: str) -> Response:
+        calls.append((token, clock.now))
+        return responses[len(calls) - 1]
+    return send
+
+
+def test_429_with_retry_after_is_retried(clock):
+    calls = []
+    responses = [Response(429, {'retry-after': "30"}), Response(200, {}, b"[]")]
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None)
+    response = request_scheduler.execute(fake_send(clock, responses, calls))
+    assert response.status == 200
+    assert len(calls) == 2
+    assert calls[1][1] - calls[0][1] >= 30
+
+
+def test_exhausted_budget_waits_for_reset(clock):
+    calls = []
+    reset_at = START + 100
+    responses = [Response(403, {'x-ratelimit-remaining': "0", 'x-ratelimit-reset': str(int(reset_at))}),
+                 Response(200, {'x-ratelimit-remaining': "4999", 'x-ratelimit-reset': str(int(reset_at + 3600))})]
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None, max_wait=3600)
+    response = request_scheduler.execute(fake_send(clock, responses, calls))
+    assert response.status == 200
+    assert len(calls) == 2
+    assert calls[1][1] >= reset_at
+
+
+def test_exhausted_budget_gives_up_past_max_wait(clock):
+    calls = []
+    responses = [Response(403, {'x-ratelimit-remaining': "0", 'x-ratelimit-reset': str(int(START + 3000))})]
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None, max_wait=60)
+    response = request_scheduler.execute(fake_send(clock, responses, calls))
+    assert response.status == 403
+    assert len(calls) == 1
+    assert clock.now == START
+
+
+def test_plain_403_is_not_retried(clock):
+    calls = []
+    ''' A permission error: budget left, no Retry-After and no rate limit in the message '''
+    responses = [Response(403, {'x-ratelimit-remaining': "4000"},
+                          b'{"message": "Resource not accessible by personal access token"}')]
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None)
+    response = request_scheduler.execute(fake_send(clock, responses, calls))
+    assert response.status == 403
+    assert len(calls) == 1
+
+
+SECONDARY_LIMIT = (b'{"message": "You have exceeded a secondary rate limit. Please wait a few minutes before '
+                   b'you try again."}')
+
+
+def test_secondary_limit_403_is_retried(clock):
+    calls = []
+    responses = [Response(403, {'x-ratelimit-remaining': "4000"}, SECONDARY_LIMIT), Response(200, {}, b"[]")]
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None)
+    response = request_scheduler.execute(fake_send(clock, responses, calls))
+    assert response.status == 200
+    assert len(calls) == 2
+    assert calls[1][1] - calls[0][1] >= scheduler.SECONDARY_BACKOFF
+
+
+def test_secondary_limit_403_rotates_token(clock):
+    calls = []
+    responses = [Response(403, {'x-ratelimit-remaining': "4000"}, SECONDARY_LIMIT), Response(200, {}, b"[]")]
+    request_scheduler = make_scheduler(clock, ["a", "b"], max_rate=None)
+    assert request_scheduler.execute(fake_send(clock, responses, calls)).status == 200
+    assert [token for token, _ in calls] == ["a", "b"]
+    assert calls[1][1] == START
+
+
+def test_retries_run_out(clock):
+    calls = []
+    responses = [Response(429, {'retry-after': "1"})] * 3
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=None, max_retries=2)
+    assert request_scheduler.execute(fake_send(clock, responses, calls)).status == 429
+    assert len(calls) == 3
+
+
+def test_token_with_most_budget_is_picked(clock):
+    request_scheduler = make_scheduler(clock, ["a", "b", "c"], max_rate=None)
+    reset = str(int(START + 3600))
+    request_scheduler.budget("a", "core").update({'x-ratelimit-remaining': "10", 'x-ratelimit-reset': reset})
+    request_scheduler.budget("b", "core").update({'x-ratelimit-remaining': "500", 'x-ratelimit-reset': reset})
+    request_scheduler.budget("c", "core").update({'x-ratelimit-remaining': "0", 'x-ratelimit-reset': reset})
+    budget = request_scheduler.acquire()
+    assert budget.token == "b"
+    request_scheduler.release(budget, 200, {'x-ratelimit-remaining': "5", 'x-ratelimit-reset': reset}, 0)
+    assert request_scheduler.acquire().token == "a"
+
+
+def test_rate_limited_token_is_rotated(clock):
+    calls = []
+    responses = [Response(429, {'retry-after': "600"}), Response(200, {}, b"[]")]
+    request_scheduler = make_scheduler(clock, ["a", "b"], max_rate=None)
+    assert request_scheduler.execute(fake_send(clock, responses, calls)).status == 200
+    assert [token for token, _ in calls] == ["a", "b"]
+    assert calls[1][1] == START
+
+
+def test_requests_are_paced(clock):
+    calls = []
+    request_scheduler = make_scheduler(clock, ["a"], max_rate=10.0)
+    send = fake_send(clock, [Response(200)] * 31, calls)
+    for _ in range(31):
+        request_scheduler.execute(send)
+    ''' A full bucket lets 10 requests through at once, the rest go at 10 per second '''
+    assert calls[-1][1] - START == pytest.approx(2.1, abs=0.01)
+
+
+def test_critical_requests_go_first(clock):
+    request_scheduler = RequestScheduler(["a"], max_rate=1.0)
+    ''' Empty the bucket, so that the next request has to wait for the clock '''
+    request_scheduler.release(request_scheduler.acquire(), 200, {}, 0)
+    order = []
+    acquired = threading.Condition()
+
+    def acquire(name: str, priority: int):
+        request_scheduler.acquire(priority)
+        with acquired:
+            order.append(name)
+            acquired.notify_all()
+
+    threads = [threading.Thread(target=acquire, args=("normal", PRIORITY_NORMAL), daemon=True)]
+    threads[0].start()
+    with request_scheduler._condition:
+        assert request_scheduler._condition.wait_for(lambda: len(request_scheduler._waiting) == 1, 5)
+    threads.append(threading.Thread(target=acquire, args=("critical", PRIORITY_CRITICAL), daemon=True))
+    threads[1].start()
+    with request_scheduler._condition:
+        assert request_scheduler._condition.wait_for(lambda: len(request_scheduler._waiting) == 2, 5)
+    for expected in (["critical"], ["critical", "normal"]):
+        with request_scheduler._condition:
+            clock.now += 1.0
+            request_scheduler._condition.notify_all()
+        with acquired:
+            assert acquired.wait_for(lambda: len(order) == len(expected), 5)
+            assert order == expected
+    for thread in threads:
+        thread.join(5)
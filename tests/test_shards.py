@@ -0,0 +1,114 @@
+"""
+   Sharded runs (--shard i/N) merged into the output in any order equal a single run
+"""
+import json
+import os
+import pytest
+import gsiBenchmark
+import gsiShard
+from git import Git
+from gsiBenchmark.mock_github import MockGithub
+from conftest import ORGANIZATION, make_settings, run_tracker
+
+N_SHARDS = 3
+
+
+def read(path) -> str:
+    with open(path, "r") as rf:
+        return rf.read()
+
+
+@pytest.fixture(scope="module")
+def runs(analysis_config, mock_github, tmp_path_factory) -> tuple:
+    work_dir = str(tmp_path_factory.mktemp("shards"))
+    settings = make_settings(analysis_config[0], mock_github.url)
+    full = run_tracker(work_dir, settings, "-r", "HEAD", "-o", "full.json", "-p", "full.html")
+    assert full.returncode == 0, full.stdout + full.stderr
+    partials = []
+    for index in range(1, N_SHARDS + 1):
+        shard = run_tracker(work_dir, settings, "-r", "HEAD", "--shard", f'{index}/{N_SHARDS}')
+        assert shard.returncode == 0, shard.stdout + shard.stderr
+        partials.append(os.path.join(work_dir, gsiShard.partial_path("gsi_workflows.json", index, N_SHARDS)))
+    return work_dir, settings, partials
+
+
+def merge(runs, name: str, *partials):
+    work_dir, settings, _ = runs
+    return run_tracker(work_dir, settings, "-o", f'{name}.json', "-p", f'{name}.html', "merge", *partials)
+
+
+def test_full_run_has_data(runs):
+    assert len(json.loads(read(os.path.join(runs[0], "full.json")))) > 0
+
+
+def test_merge_equals_full_run(runs):
+    work_dir, _, partials = runs
+    result = merge(runs, "merged", *reversed(partials))
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert read(os.path.join(work_dir, "merged.json")) == read(os.path.join(work_dir, "full.json"))
+    assert read(os.path.join(work_dir, "merged.html")) == read(os.path.join(work_dir, "full.html"))
+
+
+def test_merge_of_found_partials(runs):
+    work_dir, _, _ = runs
+    ''' Without partials on the command line, shard files next to the output json are merged '''
+    result = merge(runs, "gsi_workflows")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert read(os.path.join(work_dir, "gsi_workflows.json")) == read(os.path.join(work_dir, "full.json"))
+
+
+def test_repeated_shard_is_skipped(runs):
+    work_dir, _, partials = runs
+    result = merge(runs, "repeated", partials[1], partials[0], partials[2], partials[1])
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "WARNING: Shard 2 was loaded already" in result.stdout
+    assert read(os.path.join(work_dir, "repeated.json")) == read(os.path.join(work_dir, "full.json"))
+
+
+def test_missing_shard(runs):
+    work_dir, _, partials = runs
+    result = merge(runs, "missing", partials[2], partials[0])
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert f'WARNING: Missing shards 2 (of {N_SHARDS})' in result.stdout
+    full = json.loads(read(os.path.join(work_dir, "full.json")))
+    missing = json.loads(read(os.path.join(work_dir, "missing.json")))
+    assert set(missing.keys()) <= set(full.keys())
+    assert missing != full
+
+
+"""
+   Mock Github recording paths of requests
+"""
+class RecordingGithub(MockGithub):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paths = []
+
+    def respond(self, path: str, query: dict) -> tuple:
+        with self.lock:
+            self.paths.append(path)
+        return super().respond(path, query)
+
+
+def test_repositories_without_olives_are_not_collected(tmp_path):
+    ''' A workflow which no olive runs is skipped after its vidarrbuild.json, olives of other shards count '''
+    repo_dir = str(tmp_path / "analysis-config")
+    workflows = gsiBenchmark.generate_analysis_config(repo_dir, 6)
+    with open(os.path.join(repo_dir, "vidarr", "research", "workflows", "unusedWorkflow_call_ready.vidarrworkflow"),
+              "w") as wf:
+        wf.write("{}")
+    Git(repo_dir).add("-A")
+    Git(repo_dir).commit("-q", "-m", "Workflow without olives",
+                         env={"GIT_AUTHOR_NAME": "tests", "GIT_AUTHOR_EMAIL": "tests@localhost",
+                              "GIT_COMMITTER_NAME": "tests", "GIT_COMMITTER_EMAIL": "tests@localhost"})
+    mock = RecordingGithub(ORGANIZATION, workflows + ["unusedWorkflow"]).start()
+    try:
+        settings = make_settings(repo_dir, mock.url)
+        for index in range(1, N_SHARDS + 1):
+            shard = run_tracker(str(tmp_path), settings, "-r", "HEAD", "--shard", f'{index}/{N_SHARDS}')
+            assert shard.returncode == 0, shard.stdout + shard.stderr
+    finally:
+        mock.stop()
+    assert [path for path in mock.paths if "/unusedWorkflow/" in path] == \
+           [f'/repos/{ORGANIZATION}/unusedWorkflow/contents/vidarrbuild.json']
+    assert {path.split("/")[3] for path in mock.paths if path.endswith(".wdl")} == set(workflows)
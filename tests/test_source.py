@@ -0,0 +1,19 @@
+"""
+   Reading analysis-config at a ref (-r/--ref)
+"""
+import os
+from conftest import make_settings, run_tracker
+
+
+def test_bad_ref_aborts_the_run(analysis_config, tmp_path):
+    result = run_tracker(str(tmp_path), make_settings(analysis_config[0]), "-r", "nonexistent_ref")
+    assert result.returncode != 0
+    assert "ERROR: Failed to read analysis-config at nonexistent_ref" in result.stdout
+    assert not os.path.exists(tmp_path / "gsi_workflows.json")
+    assert not os.path.exists(tmp_path / "gsi_workflows.html")
+
+
+def test_ref_is_read_without_checkout(analysis_config, mock_github, tmp_path):
+    result = run_tracker(str(tmp_path), make_settings(analysis_config[0], mock_github.url), "-r", "HEAD")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert os.path.exists(tmp_path / "gsi_workflows.json")
@@ -0,0 +1,43 @@
+"""
+   Results store: pruning old runs, on its own and with --db-keep
+"""
+import gsiStore
+from conftest import make_settings, run_tracker
+
+VETTED_DATA = {'bwaMem': {'latest_tag': "2.1.0", 'url': "https://github.com/oicr-gsi/bwaMem",
+                          'data_modules': ["hg38-bwa-index/0.7.17"], 'code_modules': ["bwa/0.7.17"],
+                          'research': {'tags': ["2.0.0", "2.1.0"], 'olives': ["vidarr-bwaMem.shesmu"]}}}
+
+
+def count_rows(conn, table: str) -> int:
+    return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_prune_runs(tmp_path):
+    conn = gsiStore.open_store(str(tmp_path / "results.db"))
+    runs = [gsiStore.record_run(conn, VETTED_DATA) for _ in range(4)]
+    assert gsiStore.prune_runs(conn, 2) == 2
+    assert [r[0] for r in gsiStore.list_runs(conn)] == runs[2:]
+    ''' Rows of removed runs are removed with them '''
+    for table in gsiStore.SNAPSHOT_TABLES.keys():
+        assert conn.execute(f'SELECT COUNT(*) FROM {table} WHERE run_id < ?', (runs[2],)).fetchone()[0] == 0
+    assert count_rows(conn, "tags") == 4
+    assert gsiStore.prune_runs(conn, 2) == 0
+    conn.close()
+
+
+def test_db_keep(analysis_config, mock_github, tmp_path):
+    settings = make_settings(analysis_config[0], mock_github.url)
+    for _ in range(3):
+        result = run_tracker(str(tmp_path), settings, "-r", "HEAD", "--db", "results.db", "--db-keep", "2")
+        assert result.returncode == 0, result.stdout + result.stderr
+    assert "INFO: Removed 1 old run(s) from results.db, 2 kept" in result.stdout
+    conn = gsiStore.open_store(str(tmp_path / "results.db"))
+    assert [r[0] for r in gsiStore.list_runs(conn)] == [2, 3]
+    conn.close()
+
+
+def test_db_keep_should_be_positive(analysis_config, tmp_path):
+    result = run_tracker(str(tmp_path), make_settings(analysis_config[0]), "--db", "results.db", "--db-keep", "0")
+    assert result.returncode != 0
+    assert "--db-keep should be at least 1" in result.stderr
@@ -0,0 +1,125 @@
+"""
+   Version ordering of tags, the latest tag and reading tags from all pages
+"""
+import json
+import pytest
+import gsiRepository as rP
+from gsiRepository.transport import Response
+
+
+@pytest.mark.parametrize("older, newer", [
+    ("1.2.3", "v1.2.4"),
+    ("v1.2.3", "1.2.4"),
+    ("1.9.0", "1.10.0"),
+    ("1.2", "1.2.1"),
+    ("2.0.1", "2.0.1a"),
+    ("2.0.1a", "2.0.1b"),
+    ("2.0.1a", "2.0.2"),
+    ("2.0.1", "2.0.1-hotfix"),
+    ("3.0.0-rc1", "3.0.0"),
+    ("3.0.0-rc1", "3.0.0-rc2"),
+    ("3.0.0-rc2", "3.0.0-rc10"),
+    ("3.0.0-alpha", "3.0.0-beta"),
+    ("3.0.0beta1", "3.0.0"),
+    ("2.9.9", "3.0.0-rc1"),
+    ("3.0.0-SNAPSHOT", "3.0.0"),
+])
+def test_version_order(older, newer):
+    assert rP.version_key(older) < rP.version_key(newer)
+
+
+@pytest.mark.parametrize("tags, latest", [
+    (["1.0.0", "v1.2.3", "1.10.0", "1.9.0"], "1.10.0"),
+    (["v2.0.1", "v2.0.1a", "v2.0.0"], "v2.0.1a"),
+    (["2.10.0", "3.0.0-rc1", "3.0.0-beta"], "2.10.0"),
+    (["3.0.0-rc1", "3.0.0-beta", "2.0.0-rc3"], "3.0.0-rc1"),
+    (["1.0.0", "1.0.0-hotfix"], "1.0.0-hotfix"),
+    ([], None),
+])
+def test_latest(tags, latest):
+    index = rP.TagIndex()
+    index.put("repo", "2024-01-01T00:00:00Z", tags)
+    assert index.latest("repo") == latest
+
+
+@pytest.mark.parametrize("tag, expected", [
+    ("1.10.0", True),
+    ("v1.10.0", True),
+    ("1.10", True),
+    ("1.9.0", False),
+    ("1.10.1", False),
+    ("1.10.0a", False),
+])
+def test_is_latest(tag, expected):
+    index = rP.TagIndex()
+    index.put("repo", "2024-01-01T00:00:00Z", ["1.0.0", "1.9.0", "v1.10.0", "1.11.0-rc1"])
+    assert index.is_latest("repo", tag) is expected
+    assert not index.is_latest("other", tag)
+
+
+def test_known_and_save(tmp_path):
+    index = rP.TagIndex(str(tmp_path / "tag_index.json"))
+    index.put("repo", "2024-01-01T00:00:00Z", ["1.0.0", "1.1.0"])
+    index.put("unpushed", None, ["1.0.0"])
+    index.save()
+    other = rP.TagIndex(str(tmp_path / "tag_index.json"))
+    other.put("another", "2024-02-01T00:00:00Z", ["0.1.0"])
+    other.save()
+    reloaded = rP.TagIndex(str(tmp_path / "tag_index.json"))
+    assert reloaded.known("repo", "2024-01-01T00:00:00Z")
+    assert not reloaded.known("repo", "2024-03-01T00:00:00Z")
+    assert not reloaded.known("unpushed", None)
+    assert reloaded.latest("repo") == "1.1.0"
+    assert reloaded.latest("another") == "0.1.0"
+
+
+"""
+   Transport answering tag requests from a list of tags, 100 per page, and counting requests
+"""
+class TagTransport:
+    def __init__(self, tags: list, fail_page: int | None = None):
+        self.tags = tags
+        self.fail_page = fail_page
+        self.pages = []
+
+    def request(self, url: str, headers: dict) -> Response:
+        query = dict(q.split("=") for q in url.split("?")[1].split("&"))
+        page, per_page = int(query['page']), int(query['per_page'])
+        self.pages.append(page)
+        if page == self.fail_page:
+            return Response(500, {}, json.dumps({'message': "Server Error"}).encode())
+        names = self.tags[(page - 1) * per_page:page * per_page]
+        return Response(200, {}, json.dumps([{'name': t} for t in names]).encode())
+
+
+def repo_with_tags(tags: list, fail_page: int | None = None) -> rP.githubRepo:
+    handler = rP.githubRepo("oicr-gsi", "token", max_rate=None)
+    handler.transport = TagTransport(tags, fail_page)
+    return handler
+
+
+@pytest.mark.parametrize("n_tags, pages", [(0, [1]), (30, [1]), (99, [1]), (100, [1, 2]), (250, [1, 2, 3]),
+                                           (300, [1, 2, 3, 4])])
+def test_tag_pagination(n_tags, pages):
+    tags = [f'v1.{i}.0' for i in range(n_tags)]
+    handler = repo_with_tags(tags)
+    assert handler.get_repo_tags("bwaMem") == tags
+    assert handler.transport.pages == pages
+
+
+def test_latest_tag_beyond_first_page():
+    handler = repo_with_tags([f'1.{i}.0' for i in range(250)] + ["not-a-version"])
+    handler.pushed_at["bwaMem"] = "2024-01-01T00:00:00Z"
+    assert handler.get_latest_tag("bwaMem") == "1.249.0"
+    assert handler.is_latest_tag("bwaMem", "v1.249.0")
+    assert handler.transport.pages == [1, 2, 3]
+    ''' Tags of a repository which was not pushed to are not requested again '''
+    assert handler.get_latest_tag("bwaMem") == "1.249.0"
+    assert handler.transport.pages == [1, 2, 3]
+
+
+def test_failed_page_raises():
+    handler = repo_with_tags([f'1.{i}.0' for i in range(250)], fail_page=2)
+    with pytest.raises(ValueError):
+        handler.get_repo_tags("bwaMem")
+    assert handler.tag_index.latest("bwaMem") is None
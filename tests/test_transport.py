@@ -0,0 +1,45 @@
+"""
+   HttpTransport: a request on a stale keep-alive connection is retried once on a fresh one, failed
+   connections are closed and not returned to the pool
+"""
+import queue
+import pytest
+from gsiRepository.transport import HttpTransport
+
+
+"""
+   Connection whose requests fail with error, recording whether it was closed
+"""
+class FailingConnection:
+    def __init__(self, error: Exception):
+        self.error = error
+        self.closed = False
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def make_transport(stale: FailingConnection, fresh: list) -> HttpTransport:
+    transport = HttpTransport()
+    transport._pools[("http", "github.test")] = queue.LifoQueue()
+    transport._pools[("http", "github.test")].put(stale)
+
+    def connect(scheme: str, host: str) -> FailingConnection:
+        fresh.append(FailingConnection(TimeoutError("timed out")))
+        return fresh[-1]
+    transport._connect = connect
+    return transport
+
+
+def test_failed_retry_closes_fresh_connection():
+    stale = FailingConnection(ConnectionResetError())
+    fresh = []
+    transport = make_transport(stale, fresh)
+    with pytest.raises(TimeoutError):
+        transport.request("http://github.test/orgs/tests/repos", {})
+    assert stale.closed
+    assert len(fresh) == 1 and fresh[0].closed
+    assert transport._pools[("http", "github.test")].empty()
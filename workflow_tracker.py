@@ -6,17 +6,30 @@
    * bring all info together and format into HTML or tsv. Also, dump a json file
 """
 import collections
+import concurrent.futures
 import tomli
 import argparse
+import cProfile
 import json
 import os
+import sqlite3
+import sys
+import time
 from git import Git
 import gsiWorkflow
 import gsiOlive
+import gsiService
+import gsiHistory
+import gsiMetrics
 import gsiRepository as rP
+import gsiShard
+import gsiSource
+import gsiState
+import gsiStore
 import htmlRenderer
 
 settings = {}
+raw_name_table = {'prefixes': None, 'names': {}}
 
 """
      We operate with Workflow entries, which are dataclasses
@@ -54,20 +67,40 @@ def update_source(path: str, main_branch: str):
     except:
         print("failed to update sources")
 
+"""
+   update objects of the local copy of the repo without touching the working tree (used when reading at a ref)
+"""
+def fetch_source(path: str):
+    try:
+        Git(path).fetch()
+    except:
+        print("failed to fetch sources")
+
+"""
+    Return names a Vidarr name may stand for, with each of the known prefixes stripped, as (lowercase, original)
+    pairs. Names are stripped once, the table is rebuilt only if prefixes in settings change
+"""
+def raw_name_candidates(name: str) -> list:
+    prefixes = tuple(settings['prefixes'].values()) if 'prefixes' in settings.keys() else ()
+    if raw_name_table['prefixes'] != prefixes:
+        raw_name_table['prefixes'] = prefixes
+        raw_name_table['names'] = {}
+    if name not in raw_name_table['names'].keys():
+        raw_names = [name.removesuffix(prx).rstrip("_") for prx in prefixes]
+        raw_name_table['names'][name] = [(raw_name.lower(), raw_name) for raw_name in raw_names]
+    return raw_name_table['names'][name]
+
 """
     From the list of names, pick the shortest and strip it of all known prefixes
     also check if we have all lowercase name (if camelCase name found)
 """
 def get_raw_name(names: list, to_match: list):
     for name in names:
-        if 'prefixes' in settings.keys():
-            for prx in settings['prefixes'].values():
-                raw_name = name.removesuffix(prx)
-                raw_name = raw_name.rstrip("_")
-                if raw_name.lower() in to_match:
-                    return raw_name.lower()
-                elif raw_name in to_match:
-                    return raw_name
+        for lower_name, raw_name in raw_name_candidates(name):
+            if lower_name in to_match:
+                return lower_name
+            elif raw_name in to_match:
+                return raw_name
     return None
 
 """
@@ -80,21 +113,541 @@ def join_metadata(olive_data: dict, repo_data: dict, wf: str) -> dict:
     c_modules = set()
     try:
         for inst in (settings['instances'].values()):
-            if inst in olive_info[wf].keys():
-                vetted_olives = [os.path.basename(o) for o in olive_info[wf][inst]['olives']]
+            if inst in olive_data.keys():
+                vetted_olives = sorted([os.path.basename(o) for o in olive_data[inst]['olives']])
                 d_modules = olive_data[inst]['data_modules'].union(repo_data['data_modules'])
                 c_modules = olive_data[inst]['code_modules'].union(repo_data['code_modules'])
                 merged_data[inst] = {'olives': vetted_olives,
-                                     'tags': list(olive_data[inst]['tags'])}
+                                     'tags': sorted(olive_data[inst]['tags'])}
         merged_data['latest_tag'] = repo_data['latest_tag']
         merged_data['url'] = repo_data['url']
-        merged_data['data_modules'] = list(d_modules)
-        merged_data['code_modules'] = list(c_modules)
+        merged_data['data_modules'] = sorted(d_modules)
+        merged_data['code_modules'] = sorted(c_modules)
     except:
         print(f'ERROR: Failed to merge gsiOlive and repo data for {wf}')
 
     return merged_data
 
+"""
+    Load gsiWorkflow names from .vidarrworkflow files without prefixes into a dict keyed by instance
+"""
+def load_workflow_names(repo_dir: str, instances: list, source: gsiSource.GitObjectSource = None) -> dict:
+    prefixes = []
+    if "prefixes" in settings.keys():
+        prefixes = settings['prefixes'].values()
+    return gsiWorkflow.extract_wf_names(repo_dir, instances, prefixes, source)
+
+"""
+    Collect and parse olives, return lists of parsed olives keyed by instance. With a parse cache,
+    only olives whose git blobs were not parsed before are parsed. With a source, olives are read from git objects.
+    With mentioning, only olives which mention any of these names are parsed. With shard (i, N), only olives
+    in this part of the hash partition of their paths (relative to repo_dir) are parsed
+"""
+def load_olive_data(repo_dir: str, instances: list, parse_cache: gsiOlive.OliveParseCache = None,
+                    source: gsiSource.GitObjectSource = None, mentioning: set = None, shard: tuple = None) -> dict:
+    olive_data = {}
+    aliases = settings['aliases'] if 'aliases' in settings.keys() else {}
+    olive_files = gsiOlive.collect_olives(repo_dir, instances, aliases, source)
+    if not isinstance(olive_files, dict):
+        return olive_data
+    olive_workers = collection_workers("olive_workers")
+    if parse_cache is not None:
+        parse_cache.blob_shas.update(source.blob_shas if source else gsiSource.index_blob_shas(repo_dir, ["shesmu"]))
+    for inst in olive_files.keys():
+        if shard is not None:
+            olive_files[inst] = [oli for oli in olive_files[inst]
+                                 if gsiShard.in_shard(os.path.relpath(oli, repo_dir), *shard)]
+        if mentioning is not None:
+            olive_files[inst] = gsiOlive.filter_olives(olive_files[inst], mentioning, source)
+        if (shard is not None or mentioning is not None) and len(olive_files[inst]) == 0:
+            continue
+        olive_data[inst] = gsiOlive.parse_olives(olive_files[inst], olive_workers, parse_cache, source)
+    return olive_data
+
+"""
+    True if wf_id (as returned by get_raw_name) is run by olives of any instance
+"""
+def workflow_in_use(wf_id: str, olive_data: dict) -> bool:
+    return wf_id is not None and (wf_id in olive_data.keys() and len(olive_data[wf_id]) != 0 or
+                                  wf_id.lower() in olive_data.keys() and len(olive_data[wf_id.lower()]) != 0)
+
+"""
+    True if none of the other repositories a workflow imports wdl files from was pushed to since its info was
+    collected. Modules of imported sub-workflows are part of the info, so it can not be re-used otherwise
+"""
+def imports_unchanged(gh_repo: rP.githubRepo, record: dict) -> bool:
+    if 'imported_at' not in record.keys():
+        return False
+    return all(pushed_at is not None and gh_repo.pushed_at.get(repo) == pushed_at
+               for repo, pushed_at in record['imported_at'].items())
+
+"""
+    Collect modules and the latest tag for a single repository, return (wf_id, info, record).
+    wf_id and info are None if the repo is not used by any olive, record keeps vidarrbuild.json
+    and collected info keyed by pushed_at of the repo, so that an unchanged repo can be re-used
+    next time without any requests. The record also keeps wdl files imported from other repos and pushed_at
+    of these repos, collected info is not re-used if any of them was pushed to. With a discovery index, vidarrbuild.json of a repo which was not
+    pushed to since it was last checked comes from the index (repos with no vidarrbuild.json or
+    building unused workflows cost no requests). Errors are handled here, so they stay isolated to the repo
+"""
+def collect_repo_info(gh_repo: rP.githubRepo, repo: str, repo_url: str, olive_data: dict, record: dict = None,
+                      index: rP.DiscoveryIndex = None, extractor: gsiWorkflow.ModuleExtractor = None):
+    print(f'Processing repository [{repo}]...')
+    pushed_at = gh_repo.pushed_at.get(repo)
+    reuse = record is not None and pushed_at is not None and record['pushed_at'] == pushed_at
+    new_record = None
+    try:
+        if reuse:
+            wf_info = record['build']
+        elif index is not None and index.known(repo, pushed_at):
+            wf_info = index.build(repo)
+            gsiMetrics.count("repos_known")
+        else:
+            wf_data, definite = gh_repo.get_file(repo, "vidarrbuild.json")
+            wf_info = json.loads(wf_data) if wf_data is not None else None
+            if index is not None and definite:
+                index.put(repo, pushed_at, wf_info)
+        new_record = {'pushed_at': pushed_at, 'build': wf_info, 'info': None}
+        wf_id = get_raw_name(wf_info['names'], olive_data.keys())
+        if workflow_in_use(wf_id, olive_data):
+            if reuse and record['info'] is not None and imports_unchanged(gh_repo, record):
+                new_record['info'] = record['info']
+                new_record['imports'] = record['imports']
+                new_record['imported_at'] = record['imported_at']
+            else:
+                wf_wdl = gh_repo.get_file_content(repo, wf_info['wdl'])
+                wf_latest = gh_repo.get_latest_tag(repo)
+                extractor = extractor if extractor is not None else gsiWorkflow.ModuleExtractor(gh_repo)
+                wf_modules = extractor.extract(repo, wf_info['wdl'], wf_wdl)
+                new_record['info'] = {'url': repo_url,
+                                      'latest_tag': wf_latest,
+                                      'data_modules': wf_modules['data_modules'],
+                                      'code_modules': wf_modules['code_modules']}
+                new_record['imports'] = wf_modules['imports']
+                new_record['imported_at'] = {i_repo: gh_repo.pushed_at.get(i_repo)
+                                             for i_repo, _, _ in wf_modules['imports'] if i_repo != repo}
+            return wf_id, new_record['info'], new_record
+        else:
+            print(f'WARNING: Skipping [{repo}] as it is not currently in use...')
+    except TypeError:
+        print(f'WARNING: Repo [{repo}] Does not have information expected for a gsiWorkflow')
+    except:
+        print(f'ERROR: Collection of information for [{repo}] failed')
+        new_record = None
+    return None, None, new_record
+
+"""
+    Run collect_repo_info for all repositories using a pool of worker threads. Results are
+    gathered in the order of repo_list, so the returned dict is the same as with a serial loop.
+    Returns repo info keyed by workflow and records keyed by repo
+"""
+def collect_repos(gh_repo: rP.githubRepo, repo_list: dict, olive_data: dict, workers: int = 1,
+                  records: dict = None, index: rP.DiscoveryIndex = None) -> tuple:
+    repo_info = {}
+    new_records = {}
+    records = records if records is not None else {}
+    extractor = gsiWorkflow.ModuleExtractor(gh_repo, max(1, workers))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def collect_timed(repo: str):
+            start = time.time()
+            result = collect_repo_info(gh_repo, repo, repo_list[repo], olive_data, records.get(repo), index,
+                                       extractor)
+            gsiMetrics.repo_time(repo, time.time() - start)
+            return result
+        results = executor.map(collect_timed, repo_list.keys())
+        for repo, (wf_id, info, record) in zip(repo_list.keys(), results):
+            if wf_id is not None:
+                repo_info[wf_id] = info
+            if record is not None:
+                new_records[repo] = record
+    return repo_info, new_records
+
+"""
+    Join repo-derived info and gsiOlive-derived info for all workflows. With previous output and fingerprints,
+    join_metadata runs only for workflows whose inputs changed, other entries are taken from previous output
+"""
+def join_all(olive_info: dict, repo_info: dict, previous_output: dict = None, previous_fp: dict = None) -> tuple:
+    vetted_data = {}
+    fingerprints = {}
+    previous_output = previous_output if previous_output is not None else {}
+    previous_fp = previous_fp if previous_fp is not None else {}
+    for wf_id in olive_info.keys():
+        if wf_id in repo_info.keys():
+            repo_data = repo_info[wf_id]
+        elif wf_id.lower() in repo_info.keys():
+            repo_data = repo_info[wf_id.lower()]
+        else:
+            print(f'ERROR: Was not able to collect data for [{wf_id}]')
+            continue
+        fingerprints[wf_id] = gsiState.fingerprint(olive_info[wf_id], repo_data, settings['instances'])
+        if wf_id in previous_output.keys() and previous_fp.get(wf_id) == fingerprints[wf_id]:
+            vetted_data[wf_id] = previous_output[wf_id]
+        else:
+            vetted_data[wf_id] = join_metadata(olive_info[wf_id], repo_data, wf_id)
+    return vetted_data, fingerprints
+
+"""
+    Number of workers of a kind (workers collecting repositories, olive_workers parsing olives) from the collection
+    section of the settings, 1 if it is not set
+"""
+def collection_workers(key: str = "workers") -> int:
+    if 'collection' in settings.keys() and key in settings['collection'].keys():
+        return settings['collection'][key]
+    return 1
+
+"""
+    Cache of Github responses in the cache directory, None if caching is off
+"""
+def load_response_cache(args) -> rP.ResponseCache | None:
+    if 'cache' in settings.keys() and not args.no_cache:
+        return rP.ResponseCache(settings['cache']['dir'], settings['cache'].get('max_mb', 200) * 1024 * 1024)
+    return None
+
+"""
+    Discovery index in the cache directory, None if caching is off
+"""
+def load_discovery_index(args, file_name: str = "discovery_index.json") -> rP.DiscoveryIndex | None:
+    if 'cache' in settings.keys() and not args.no_cache:
+        return rP.DiscoveryIndex(os.path.join(settings['cache']['dir'], file_name))
+    return None
+
+"""
+    True if there is a Github token (or a list of tokens to rotate) in the repo section of the settings
+"""
+def has_token(repo_settings: dict) -> bool:
+    return 'token' in repo_settings.keys() or 'tokens' in repo_settings.keys() and len(repo_settings['tokens']) > 0
+
+"""
+    Create Github handler for configured collector: rest (default) sends a few requests per repository,
+    graphql fetches data for pages of repositories with a single query, mirror reads data from local
+    bare mirrors of the repositories. With a response cache, the tag index is kept in the same directory
+"""
+def get_repo_handler(repo_settings: dict, response_cache=None) -> rP.githubRepo:
+    org = repo_settings['organization']
+    tokens = repo_settings['tokens'] if 'tokens' in repo_settings.keys() else []
+    token = repo_settings['token'] if 'token' in repo_settings.keys() else tokens[0]
+    collector = repo_settings['collector'] if 'collector' in repo_settings.keys() else "rest"
+    options = {'backend': repo_settings['backend'] if 'backend' in repo_settings.keys() else "http",
+               'timeout': repo_settings['timeout'] if 'timeout' in repo_settings.keys() else 30,
+               'cache': response_cache,
+               'api_url': repo_settings['api_url'] if 'api_url' in repo_settings.keys() else "https://api.github.com",
+               'tokens': tokens,
+               'max_rate': repo_settings['max_rate'] if 'max_rate' in repo_settings.keys() else rP.DEFAULT_MAX_RATE,
+               'max_wait': repo_settings['max_wait'] if 'max_wait' in repo_settings.keys() else 3600,
+               'tag_index': rP.TagIndex(os.path.join(response_cache.cache_dir, "tag_index.json"))
+               if response_cache is not None else rP.TagIndex()}
+    if collector == "graphql":
+        return rP.graphqlRepo(org, token, **options)
+    if collector == "mirror":
+        mirror_dir = repo_settings['mirror_dir'] if 'mirror_dir' in repo_settings.keys() else \
+            "$HOME/.cache/workflowTracker/mirrors"
+        fetch_workers = repo_settings['fetch_workers'] if 'fetch_workers' in repo_settings.keys() else 8
+        return rP.mirrorRepo(org, token, **options, mirror_dir=mirror_dir, fetch_workers=fetch_workers)
+    if collector != "rest":
+        print(f'WARNING: Unknown collector [{collector}], using rest')
+    return rP.githubRepo(org, token, **options)
+
+"""
+    Write joined data: json dump, a snapshot in the results store (if configured) and HTML page
+"""
+def write_outputs(args, vetted_od: dict, commit: str = None):
+    gsiState.write_json(args.output_json, vetted_od)
+
+    ''' Record the run as a snapshot in the results store '''
+    if args.db:
+        try:
+            store = gsiStore.open_store(args.db)
+            run_id = gsiStore.record_run(store, vetted_od, commit)
+            print(f'INFO: Recorded run {run_id} in {args.db}')
+            if args.db_keep:
+                pruned = gsiStore.prune_runs(store, args.db_keep)
+                if pruned > 0:
+                    print(f'INFO: Removed {pruned} old run(s) from {args.db}, {args.db_keep} kept')
+            store.close()
+        except sqlite3.Error as err:
+            print(f'ERROR: Failed to record the run in {args.db}: {err}')
+
+    '''Stream HTML page into the file, row by row, or write a lightweight page with a data sidecar'''
+    if args.report == "lite":
+        htmlRenderer.render_lite(vetted_od, args.output_page)
+    else:
+        htmlRenderer.render2file(vetted_od, args.output_page, args.pretty)
+
+"""
+    Targeted refresh of a single workflow (--workflow) or repository (--repo) in the previous output: only olives
+    mentioning the workflow are parsed, only its repository is requested and only its entry is joined again.
+    Returns False if the entry could not be refreshed, the output is not changed then
+"""
+def refresh_one(args, instances: list, parse_cache: gsiOlive.OliveParseCache = None,
+                source: gsiSource.GitObjectSource = None) -> bool:
+    if not os.path.isfile(args.output_json):
+        print(f'ERROR: There is no previous output {args.output_json}, run a full update first')
+        return False
+    with open(args.output_json, "r") as pj:
+        vetted_data = json.load(pj)
+    repo_dir = settings["repo"]["local_olive_dir"]
+    response_cache = load_response_cache(args)
+    handler = get_repo_handler(settings['repo'], response_cache)
+    repo_url_base = settings['repo']['workflow_repo_url'] if 'workflow_repo_url' in settings['repo'].keys() else \
+        f'https://github.com/{settings["repo"]["organization"]}'
+    wf_names = load_workflow_names(repo_dir, instances, source)
+    all_names = set().union(*wf_names.values()) if wf_names else set()
+
+    ''' Find the workflow for a repository (from its vidarrbuild.json) or the repository of a workflow '''
+    if args.repo:
+        repo = args.repo
+        try:
+            wf_id = get_raw_name(json.loads(handler.get_file_content(repo, "vidarrbuild.json"))['names'], all_names)
+        except:
+            wf_id = None
+        if wf_id is None:
+            print(f'ERROR: Repository [{repo}] does not match any workflow in use')
+            return False
+    else:
+        wf_id = args.workflow
+        repo = wf_id
+        for key in vetted_data.keys():
+            if key.lower() == wf_id.lower() and vetted_data[key]['url']:
+                repo = vetted_data[key]['url'].rstrip("/").split("/")[-1]
+    ''' Keep the url from the list of repositories the previous run used, if it is the same repository '''
+    repo_url = f'{repo_url_base}/{repo}'
+    for key in vetted_data.keys():
+        if key.lower() == wf_id.lower() and vetted_data[key]['url'] and \
+                vetted_data[key]['url'].rstrip("/").split("/")[-1] == repo:
+            repo_url = vetted_data[key]['url']
+    names = {wf for wf in all_names if wf.lower() == wf_id.lower()}
+    if len(names) == 0:
+        print(f'ERROR: Workflow [{wf_id}] is not in use by any instance')
+        return False
+
+    olive_data = load_olive_data(repo_dir, instances, parse_cache, source, names)
+    if parse_cache is not None:
+        parse_cache.save()
+    olive_info = gsiOlive.match_olives(olive_data, {inst: wf_names[inst] & names for inst in wf_names.keys()})
+    repo_info = {}
+    if len(olive_info) > 0:
+        wf_key, info, _ = collect_repo_info(handler, repo, repo_url, olive_info)
+        if wf_key is None:
+            print(f'ERROR: Could not collect data for [{wf_id}] from repository [{repo}], output is not changed')
+            return False
+        repo_info[wf_key] = info
+    refreshed, _ = join_all(olive_info, repo_info)
+
+    for key in [k for k in vetted_data.keys() if k.lower() == wf_id.lower()]:
+        del vetted_data[key]
+    vetted_data.update(refreshed)
+    if len(refreshed) == 0:
+        print(f'WARNING: No olives run [{wf_id}] any more, it is removed from the output')
+    write_outputs(args, collections.OrderedDict(sorted(vetted_data.items())), source.commit if source else None)
+    print(f'INFO: Refreshed [{wf_id}] from repository [{repo}]')
+    return True
+
+"""
+    Commit of analysis-config the data come from
+"""
+def source_commit(repo_dir: str, source: gsiSource.GitObjectSource = None) -> str | None:
+    if source is not None:
+        return source.commit
+    try:
+        return Git(repo_dir).rev_parse("HEAD")
+    except:
+        return None
+
+"""
+    Sharded run (--shard i/N): parse olives and collect repositories in this part of the hash partition and write
+    them into a partial result. Olives are matched and repositories are resolved to workflows by merge_partials,
+    when olives of all shards are known, so here repositories of all workflow names known to Vidarr are collected
+"""
+def run_shard(args, instances: list, shard: tuple, parse_cache: gsiOlive.OliveParseCache = None,
+              source: gsiSource.GitObjectSource = None) -> bool:
+    index, total = shard
+    repo_dir = settings["repo"]["local_olive_dir"]
+    gsiMetrics.stage("workflow_names")
+    wf_names = load_workflow_names(repo_dir, instances, source) if instances else {}
+    if not wf_names:
+        print("ERROR: There are no workflow names to check, fix your settings")
+        return False
+
+    gsiMetrics.stage("olives")
+    olive_data = load_olive_data(repo_dir, instances, parse_cache, source, shard=shard)
+    if parse_cache is not None:
+        parse_cache.save()
+
+    gsiMetrics.stage("repo_list")
+    if 'organization' not in settings['repo'].keys() or not has_token(settings['repo']):
+        print("ERROR: Repo credentials are not configured, no update from github is possible")
+        return False
+    response_cache = load_response_cache(args)
+    handler = get_repo_handler(settings['repo'], response_cache)
+    if isinstance(handler, rP.mirrorRepo):
+        handler.sync_filter = lambda repo: gsiShard.in_shard(repo, index, total)
+    repo_list = handler.get_repo_list()
+    if len(repo_list) == 0:
+        print("ERROR: Could not retrieve the list of repositories, check the queue and token are Ok")
+        return False
+
+    gsiMetrics.stage("repositories")
+    workers = collection_workers()
+    positions = {repo: n for n, repo in enumerate(repo_list.keys())}
+    shard_repos = {repo: url for repo, url in repo_list.items() if gsiShard.in_shard(repo, index, total)}
+    ''' Repositories and olives are split by different hashes, so the workflows run by olives of all shards
+        are candidates. Run names are read from every olive, without parsing the rest of it '''
+    aliases = settings['aliases'] if 'aliases' in settings.keys() else {}
+    olive_files = gsiOlive.collect_olives(repo_dir, instances, aliases, source) or {}
+    candidates = {}
+    for inst in wf_names.keys():
+        if inst not in olive_files.keys():
+            continue
+        matcher = gsiOlive.WorkflowMatcher(wf_names[inst])
+        matched = set()
+        for name in gsiOlive.olive_run_names(olive_files[inst], source):
+            matched.update(matcher.match(name))
+        for wf in matched:
+            candidates.setdefault(wf, []).append(inst)
+    ''' Shards run at the same time, each keeps its own discovery index '''
+    discovery = load_discovery_index(args, f'discovery_index.shard-{index}-of-{total}.json')
+    _, records = collect_repos(handler, shard_repos, candidates, workers, index=discovery)
+    if discovery is not None:
+        discovery.save(shard_repos.keys())
+    handler.tag_index.save()
+    if response_cache is not None:
+        response_cache.prune()
+
+    gsiMetrics.stage("output")
+    partial = {'version': gsiShard.PARTIAL_VERSION,
+               'shard': [index, total],
+               'commit': source_commit(repo_dir, source),
+               'workflow_names': {inst: sorted(names) for inst, names in wf_names.items()},
+               'olives': {inst: [gsiOlive.olive_to_json(oli) for oli in olives if isinstance(oli, dict)]
+                          for inst, olives in olive_data.items() if olives},
+               'repos': [{'repo': repo, 'position': positions[repo], 'names': records[repo]['build']['names'],
+                          'info': records[repo]['info']}
+                         for repo in sorted(records.keys(), key=positions.get) if records[repo]['info'] is not None]}
+    partial_path = args.partial if args.partial else gsiShard.partial_path(args.output_json, index, total)
+    gsiState.write_json(partial_path, partial)
+    print(f'INFO: Shard {index} of {total}: {sum(len(o) for o in partial["olives"].values())} olives and '
+          f'{len(partial["repos"])} repositories written to {partial_path}')
+    return True
+
+"""
+    Merge partial results of a sharded run into the output. Olives of all shards are matched to workflows and
+    repositories are resolved to workflows in the order of the list of repositories, as in a single run, so the
+    output does not depend on the order of partials. Workflows from missing shards are incomplete or missing
+"""
+def merge_partials(args) -> bool:
+    paths = args.partials if args.partials else gsiShard.partial_glob(args.output_json)
+    partials, missing = gsiShard.load_partials(paths)
+    if len(partials) == 0:
+        print("ERROR: There are no partial results to merge")
+        return False
+    if len(missing) > 0:
+        print(f'WARNING: Missing shards {", ".join(map(str, missing))} (of {partials[0]["shard"][1]}), '
+              f'their olives and repositories are not in the output')
+    wf_names = {}
+    olive_data = {}
+    for partial in partials:
+        for inst, names in partial['workflow_names'].items():
+            wf_names.setdefault(inst, set()).update(names)
+        for inst, olives in partial['olives'].items():
+            olive_data.setdefault(inst, []).extend([gsiOlive.olive_from_json(oli) for oli in olives])
+    for inst in olive_data.keys():
+        olive_data[inst].sort(key=lambda oli: os.path.basename(oli['olives'][0]) if oli['olives'] else "")
+    olive_info = gsiOlive.match_olives(olive_data, wf_names)
+
+    repo_info = {}
+    entries = sorted([entry for partial in partials for entry in partial['repos']], key=lambda e: e['position'])
+    for entry in entries:
+        wf_id = get_raw_name(entry['names'], olive_info.keys())
+        if workflow_in_use(wf_id, olive_info):
+            repo_info[wf_id] = entry['info']
+    vetted_data, _ = join_all(olive_info, repo_info)
+    if len(vetted_data) == 0:
+        print("ERROR: Was not able to merge partial results, examine this log and make changes")
+        return False
+    write_outputs(args, collections.OrderedDict(sorted(vetted_data.items())), partials[0]['commit'])
+    print(f'INFO: Merged {len(partials)} shards into {len(vetted_data)} workflows')
+    return True
+
+"""
+    Daemon mode: olive, workflow and repo data are kept in memory, analysis-config and Github are refreshed
+    on their own schedules (only changed olives are parsed and only repositories pushed to are fetched),
+    joined data are served over HTTP and written to the output files whenever they change
+"""
+def build_service(args, instances: list, parse_cache: gsiOlive.OliveParseCache = None) -> gsiService.TrackerService:
+    repo_dir = settings["repo"]["local_olive_dir"]
+    service_settings = settings['service'] if 'service' in settings.keys() else {}
+    workers = collection_workers()
+    response_cache = load_response_cache(args)
+    handler = get_repo_handler(settings['repo'], response_cache)
+    discovery = load_discovery_index(args)
+    state = {'olive_info': {}, 'olive_fp': None, 'repo_list': {}, 'repo_info': {}, 'repo_fp': None,
+             'records': {}, 'output': {}, 'joined': {}, 'commit': None}
+
+    ''' Collect repositories from the last repo list, records make unchanged repositories free '''
+    def collect() -> bool:
+        state['repo_info'], state['records'] = collect_repos(handler, state['repo_list'], state['olive_info'],
+                                                             workers, state['records'], discovery)
+        if discovery is not None and state['repo_list']:
+            discovery.save(state['repo_list'].keys())
+        handler.tag_index.save()
+        repo_fp = gsiState.fingerprint(state['repo_info'])
+        changed = repo_fp != state['repo_fp']
+        state['repo_fp'] = repo_fp
+        return changed
+
+    def refresh_config() -> bool:
+        source = None
+        if args.ref:
+            fetch_source(repo_dir)
+            source = gsiSource.GitObjectSource(repo_dir, args.ref)
+            state['commit'] = source.commit
+        else:
+            update_source(repo_dir, settings["repo"]["main"])
+        wf_names = load_workflow_names(repo_dir, instances, source)
+        olive_data = load_olive_data(repo_dir, instances, parse_cache, source)
+        if parse_cache is not None:
+            parse_cache.save()
+        state['olive_info'] = gsiOlive.match_olives(olive_data, wf_names) if wf_names else {}
+        olive_fp = gsiState.fingerprint(state['olive_info'])
+        changed = olive_fp != state['olive_fp']
+        state['olive_fp'] = olive_fp
+        if changed and state['repo_list']:
+            ''' Workflows may start or stop being used, re-check repositories without listing them again '''
+            collect()
+        return changed
+
+    def refresh_repos() -> bool:
+        state['repo_list'] = handler.get_repo_list()
+        if response_cache is not None:
+            response_cache.prune()
+        return collect()
+
+    def build() -> dict:
+        vetted_data, state['joined'] = join_all(state['olive_info'], state['repo_info'], state['output'],
+                                                state['joined'])
+        state['output'] = vetted_data
+        return collections.OrderedDict(sorted(vetted_data.items()))
+
+    def on_update(vetted_od: dict):
+        if len(vetted_od) > 0:
+            write_outputs(args, vetted_od, state['commit'])
+
+    jobs = [gsiService.Job("analysis-config", service_settings.get('config_interval', 600), refresh_config),
+            gsiService.Job("repositories", service_settings.get('repo_interval', 3600), refresh_repos)]
+    return gsiService.TrackerService(jobs, build, on_update)
+
+"""
+    Finish instrumentation of the run: write metrics files and the profile, if they were requested
+"""
+def finish_run(args, profiler: cProfile.Profile = None):
+    gsiMetrics.finish()
+    if args.metrics or args.prometheus:
+        gsiMetrics.write_metrics(args.metrics, args.prometheus)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f'INFO: Profile written to {args.profile}')
+
 """ 
    ====================== Main entrance point to the script =============================
    pass (or not) the following:
@@ -111,101 +664,218 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--settings', help='Settings file in TOML format', required=False, default="config.toml")
     parser.add_argument('-o', '--output-json', help='Output json', required=False, default="gsi_workflows.json")
     parser.add_argument('-p', '--output-page', help='Output page, HTML', required=False, default="gsi_workflows.html")
+    parser.add_argument('--pretty', help='Indent HTML page for reading', required=False, action='store_true')
+    parser.add_argument('--report', help='HTML report: full table or lightweight page with a data sidecar',
+                        required=False, choices=['full', 'lite'], default="full")
+    parser.add_argument('--no-cache', help='Do not use cached Github responses, parsed olives and the discovery index',
+                        required=False, action='store_true')
+    parser.add_argument('-i', '--incremental', help='Re-process only changed olives and repos', required=False,
+                        action='store_true')
+    parser.add_argument('--state', help='State file for incremental runs', required=False,
+                        default="gsi_workflows.state.json")
+    parser.add_argument('-r', '--ref', help='Read analysis-config at this git ref, without checkout or pull',
+                        required=False, default=None)
+    parser.add_argument('--history', help='Build deployment timeline for a range of analysis-config commits (A..B)',
+                        required=False, default=None)
+    parser.add_argument('-t', '--timeline', help='Output timeline json', required=False, default="gsi_timeline.json")
+    parser.add_argument('--workflow', help='Refresh only this workflow in the previous output', required=False,
+                        default=None)
+    parser.add_argument('--repo', help='Refresh only the workflow of this repository in the previous output',
+                        required=False, default=None)
+    parser.add_argument('--db', help='SQLite results store, each run is recorded there as a snapshot', required=False,
+                        default=None)
+    parser.add_argument('--db-keep', help='Keep only this many newest runs in the results store', required=False,
+                        type=int, default=None)
+    parser.add_argument('--metrics', help='Write run metrics into this json file', required=False, default=None)
+    parser.add_argument('--prometheus', help='Write run metrics into this Prometheus textfile (.prom)',
+                        required=False, default=None)
+    parser.add_argument('--profile', help='Profile the run with cProfile, write stats into this file', required=False,
+                        default=None)
+    parser.add_argument('--shard', help='Process only part i of N of olives and repositories (i/N, i from 1) and '
+                                        'write a partial result', required=False, default=None)
+    parser.add_argument('--partial', help='Partial result of a shard (Default is gsi_workflows.shard-i-of-N.json)',
+                        required=False, default=None)
+    commands = parser.add_subparsers(dest='command')
+    query_parser = commands.add_parser('query', help='Look up data in the SQLite results store')
+    query_parser.add_argument('--db', help='SQLite results store (Default is gsi_workflows.db)', required=False,
+                              default=argparse.SUPPRESS)
+    query_parser.add_argument('--run', help='Run to query (Default is the latest run)', required=False, type=int)
+    query_parser.add_argument('--module', help='Workflows using a module (wildcards allowed)', required=False)
+    query_parser.add_argument('--olive', help='Workflows run by an olive (wildcards allowed)', required=False)
+    query_parser.add_argument('--tag', help='Instances running a tag (wildcards allowed)', required=False)
+    query_parser.add_argument('--workflow', help='All data for a workflow, or limit --tag to a workflow', required=False)
+    query_parser.add_argument('--runs', help='List recorded runs', required=False, action='store_true')
+    query_parser.add_argument('--diff', help='Compare two runs', required=False, nargs=2, type=int,
+                              metavar=('OLD_RUN', 'NEW_RUN'))
+    serve_parser = commands.add_parser('serve', help='Refresh data on schedule and serve them over HTTP')
+    serve_parser.add_argument('--host', help='Address to listen on (Default is 127.0.0.1)', required=False, default=None)
+    serve_parser.add_argument('--port', help='Port to listen on (Default is 8080)', required=False, type=int,
+                              default=None)
+    merge_parser = commands.add_parser('merge', help='Merge partial results of shards into the output')
+    merge_parser.add_argument('partials', help='Partial results (Default is all shard files next to the output json)',
+                              nargs='*')
     args = parser.parse_args()
+    if args.db_keep is not None and args.db_keep < 1:
+        parser.error("--db-keep should be at least 1")
+    shard = None
+    if args.shard:
+        try:
+            shard = gsiShard.parse_shard(args.shard)
+        except ValueError as err:
+            parser.error(str(err))
 
+    if args.command == 'query':
+        ''' Q. Answer a query from the results store, no update is done '''
+        args.db = args.db if args.db else "gsi_workflows.db"
+        sys.exit(gsiStore.run_query(args))
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    gsiMetrics.reset()
+    gsiMetrics.stage("settings_and_source")
     settings_path = args.settings
     output_json = args.output_json
     output_page = args.output_page
     ''' A. Load settings and Update local copy of the repo'''
     settings = load_config(settings_path)
-    try:
-        update_source(settings["repo"]["local_olive_dir"], settings["repo"]["main"])
-    except:
-        print("ERROR: Failed to update local repo copy from the web")
+    instances = list(settings["instances"].values()) if "instances" in settings.keys() else []
+    parse_cache = None
+    if 'cache' in settings.keys() and not args.no_cache:
+        parse_cache = gsiOlive.OliveParseCache(os.path.join(settings['cache']['dir'], "olive_parse_cache.json"))
+
+    if args.command == 'merge':
+        ''' M. Merge partial results of a sharded run, no update is done '''
+        gsiMetrics.stage("merge")
+        merged = merge_partials(args)
+        finish_run(args, profiler)
+        sys.exit(0 if merged else 1)
 
+    if args.command == 'serve':
+        ''' S. Keep data in memory, refresh them on schedule and serve them over HTTP '''
+        service_settings = settings['service'] if 'service' in settings.keys() else {}
+        gsiService.serve(build_service(args, instances, parse_cache),
+                         args.host if args.host else service_settings.get('host', "127.0.0.1"),
+                         args.port if args.port else service_settings.get('port', 8080))
+        finish_run(args, profiler)
+        sys.exit(0)
+
+    if args.history:
+        ''' H. Build a timeline of tags entering or leaving olives across commits instead of the report '''
+        gsiMetrics.stage("history")
+        fetch_source(settings["repo"]["local_olive_dir"])
+        timeline = gsiHistory.build_timeline(settings["repo"]["local_olive_dir"], args.history, instances,
+                                             settings['aliases'] if 'aliases' in settings.keys() else {},
+                                             list(settings['prefixes'].values()) if 'prefixes' in settings.keys() else [],
+                                             parse_cache)
+        if parse_cache is not None:
+            parse_cache.save()
+        gsiState.write_json(args.timeline, collections.OrderedDict(sorted(timeline.items())))
+        finish_run(args, profiler)
+        sys.exit(0)
+
+    source = None
+    if args.ref:
+        fetch_source(settings["repo"]["local_olive_dir"])
+        try:
+            source = gsiSource.GitObjectSource(settings["repo"]["local_olive_dir"], args.ref)
+            print(f'INFO: Reading analysis-config at {args.ref} ({source.commit})')
+        except Exception as err:
+            ''' Never fall back to the working tree, it is neither checked out nor pulled at this ref '''
+            print(f'ERROR: Failed to read analysis-config at {args.ref}: {err}')
+            finish_run(args, profiler)
+            sys.exit(1)
+    else:
+        try:
+            update_source(settings["repo"]["local_olive_dir"], settings["repo"]["main"])
+        except:
+            print("ERROR: Failed to update local repo copy from the web")
+
+    if args.workflow or args.repo:
+        ''' T. Refresh a single entry of the previous output '''
+        gsiMetrics.stage("targeted_refresh")
+        refreshed = refresh_one(args, instances, parse_cache, source)
+        finish_run(args, profiler)
+        sys.exit(0 if refreshed else 1)
+
+    if shard is not None:
+        ''' P. Process a part of olives and repositories and write a partial result, see merge '''
+        completed = run_shard(args, instances, shard, parse_cache, source)
+        finish_run(args, profiler)
+        sys.exit(0 if completed else 1)
+
+    ''' In incremental mode load the state and output of the previous run '''
+    state = None
+    previous_output = {}
+    if args.incremental:
+        state = gsiState.load_state(args.state)
+        if os.path.isfile(output_json):
+            with open(output_json, "r") as pj:
+                previous_output = json.load(pj)
+
+    gsiMetrics.stage("workflow_names")
     ''' B. Load gsiWorkflow names from .vidarrworkflow files without prefixes into a dict keyed by instance '''
-    instances = []
     wf_names = {}
-    olive_files = {}
     if "instances" in settings.keys():
-        for i in settings["instances"].keys():
-            instances.append(settings["instances"][i])
-        prefixes = []
-        if "prefixes" in settings.keys():
-            prefixes = settings['prefixes'].values()
-        wf_names = gsiWorkflow.extract_wf_names(settings["repo"]["local_olive_dir"], instances, prefixes)
+        wf_names = load_workflow_names(settings["repo"]["local_olive_dir"], instances, source)
     else:
         print("ERROR: There are no instances to check, fix your settings")
 
+    gsiMetrics.stage("olives")
     ''' C. collect and process olives, extract modules and tags '''
-    olive_files = {}
-    olive_info = {}
-    if 'aliases' in settings.keys():
-        olive_files = gsiOlive.collect_olives(settings["repo"]["local_olive_dir"], instances, settings['aliases'])
-    else:
-        olive_files = gsiOlive.collect_olives(settings["repo"]["local_olive_dir"], instances, {})
-    olive_info = gsiOlive.extract_olive_info(olive_files, wf_names)
+    olive_data = load_olive_data(settings["repo"]["local_olive_dir"], instances, parse_cache, source)
+    if parse_cache is not None:
+        parse_cache.save()
+    olive_info = gsiOlive.match_olives(olive_data, wf_names) if wf_names else {}
 
     vetted_data = {}
+    fingerprints = {}
+    repo_records = {}
     ''' D. If configured, try getting list of repos from github (a dict keyed by gsiWorkflow name with no prefixes)'''
-    if 'organization' in settings['repo'].keys() and 'token' in settings['repo'].keys():
-        org = settings['repo']['organization']
-        token = settings['repo']['token']
-        myRepo = rP.githubRepo(org, token)
+    gsiMetrics.stage("repo_list")
+    if 'organization' in settings['repo'].keys() and has_token(settings['repo']):
+        response_cache = load_response_cache(args)
+        myRepo = get_repo_handler(settings['repo'], response_cache)
         repo_list = myRepo.get_repo_list()
         if len(repo_list) == 0:
             print("ERROR: Could not retrieve the list of repositories, check the queue and token are Ok")
-        repo_info = {}
         ''' E. use repo list, load vidarrbuild.json and wdl and return a hash with names and modules '''
-        for repo in repo_list.keys():
-            print(f'Processing repository [{repo}]...')
-            try:
-                wf_data = myRepo.get_file_content(repo, "vidarrbuild.json")
-                wf_info = json.loads(wf_data)
-                wf_id = get_raw_name(wf_info['names'], olive_info.keys())
-                if wf_id in olive_info.keys() and len(olive_info[wf_id]) != 0 or \
-                   wf_id.lower() in olive_info.keys() and len(olive_info[wf_id.lower()]) != 0:
-                    wf_wdl = myRepo.get_file_content(repo, wf_info['wdl'])
-                    wf_wdl_lines = str(wf_wdl, encoding='utf-8').split("\n")
-                    wf_latest = myRepo.get_latest_tag(repo)
-                    wf_modules = gsiWorkflow.parse_workflow(repo, wf_wdl_lines)
-                    repo_info[wf_id] = {'url': repo_list[repo],
-                                        'latest_tag': wf_latest,
-                                        'data_modules': wf_modules['data_modules'],
-                                        'code_modules': wf_modules['code_modules']}
-                else:
-                    print(f'WARNING: Skipping [{repo}] as it is not currently in use...')
-            except TypeError:
-                print(f'WARNING: Repo [{repo}] Does not have information expected for a gsiWorkflow')
-            except:
-                print(f'ERROR: Collection of information for [{repo}] failed')
+        gsiMetrics.stage("repositories")
+        workers = collection_workers()
+        discovery = load_discovery_index(args)
+        repo_info, repo_records = collect_repos(myRepo, repo_list, olive_info, workers,
+                                                state['repos'] if state is not None else None, discovery)
 
+        if discovery is not None and len(repo_list) > 0:
+            discovery.save(repo_list.keys())
+        myRepo.tag_index.save()
+        if response_cache is not None:
+            response_cache.prune()
         if len(repo_info) == 0:
             print("ERROR: Information from gsiWorkflow repositories could not be collected")
 
         ''' F. Join two pieces of information, repo-derived info and gsiOlive-derived info '''
-        for wf_id in olive_info.keys():
-            if wf_id in repo_info.keys():
-                vetted_data[wf_id] = join_metadata(olive_info[wf_id], repo_info[wf_id], wf_id)
-            elif wf_id.lower() in repo_info.keys():
-                vetted_data[wf_id] = join_metadata(olive_info[wf_id], repo_info[wf_id.lower()], wf_id)
-            else:
-                print(f'ERROR: Was not able to collect data for [{wf_id}]')
+        gsiMetrics.stage("join")
+        if state is not None:
+            vetted_data, fingerprints = join_all(olive_info, repo_info, previous_output, state['joined'])
+        else:
+            vetted_data, fingerprints = join_all(olive_info, repo_info)
     else:
         print("ERROR: Repo credentials are not configured, no update from github is possible")
 
+    gsiMetrics.stage("output")
     ''' G. Dump the data into json file and generate a HTML page '''
     if len(vetted_data) > 0:
         vetted_od = collections.OrderedDict(sorted(vetted_data.items()))
-        with open(output_json, "w") as wfj:
-            json.dump(vetted_od, wfj)
+        write_outputs(args, vetted_od, source.commit if source else None)
 
-        html_page = htmlRenderer.convert2page(vetted_od)
-        '''Return either HTML table or entire page'''
-        with open(output_page, 'w') as op:
-            op.write(html_page)
+        ''' Record what was processed, so that the next incremental run can start from here '''
+        if state is not None:
+            gsiState.save_state(args.state, {'repos': repo_records, 'joined': fingerprints})
     else:
         print("ERROR: Was not able to collect up-to-date information, examine this log and make changes")
+    finish_run(args, profiler)
 
 """
    ERROR: Was not able to collect data for [pbcmProjectMedipsPipe] - this is due to a repo being Private, not Public